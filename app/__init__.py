@@ -1,6 +1,6 @@
 # app/__init__.py
 
-from flask import Flask
+from flask import Flask, jsonify
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from pymongo import MongoClient
@@ -10,6 +10,8 @@ import os
 from app.models import Product, User
 from app.security_config import init_security
 from app.routes.pdf_routes import init_services as init_pdf_services
+from app.indexes import ensure_indexes, verify_indexes, register_index_commands
+from app.jobs import register_job_commands
 
 db = None
 
@@ -96,6 +98,14 @@ def create_app(testing: bool = False):
             print(f"❌ Erro ao conectar com MongoDB: {e}")
             exit(1)
 
+        # Índices declarados nos modelos (idempotente). Pode ser desligado com
+        # MONGO_ENSURE_INDEXES=false e executado via `flask indexes`.
+        if os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() in ('true', '1'):
+            ensure_indexes(db)
+
+    register_index_commands(app)
+    register_job_commands(app)
+
     # ========================
     # ROTAS / BLUEPRINTS
     # ========================
@@ -106,14 +116,32 @@ def create_app(testing: bool = False):
     from app.routes.product_routes import product_bp
     from app.routes.pdf_routes import pdf_bp
     from app.routes.dashboard_routes import dashboard_bp
+    from app.routes.file_routes import file_bp
 
     app.register_blueprint(user_bp)
     app.register_blueprint(product_bp)
     app.register_blueprint(pdf_bp)
     app.register_blueprint(dashboard_bp, url_prefix="/dashboard")
+    app.register_blueprint(file_bp)
 
     @app.route('/')
     def home():
         return "Backend da QuimiDocs funcionando perfeitamente!"
 
+    @app.route('/ready')
+    def readiness_check():
+        """Readiness: falha (503) se o banco ou algum índice exigido estiver indisponível."""
+        if db is None:
+            return jsonify({"status": "not_ready", "reason": "database"}), 503
+        try:
+            report = verify_indexes(db)
+        except Exception as e:
+            print(f"❌ Erro ao verificar índices: {e}")
+            return jsonify({"status": "not_ready", "reason": "database"}), 503
+        status_code = 200 if report["ok"] else 503
+        return jsonify({
+            "status": "ready" if report["ok"] else "not_ready",
+            "indexes": report["collections"]
+        }), status_code
+
     return app
@@ -0,0 +1,189 @@
+# app/bulk_import.py
+# Importação de usuários em massa (CSV ou JSON lines) para o cadastro de
+# novas plantas. Cada lote é validado de uma vez, confere duplicados com uma
+# única consulta `$in`, gera os hashes em paralelo no pool de app/passwords.py
+# e é gravado com `insert_many` não ordenado. O resultado é produzido linha a
+# linha, para ser enviado ao cliente como NDJSON.
+
+import codecs
+import csv
+import json
+import os
+from itertools import islice
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.models import User
+from app.passwords import PasswordHasherBusy, hash_passwords
+from app.utils import ROLES
+from app.validators import validate_email_address, validate_password, sanitize_input, validate_cpf
+
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", 500))
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", 20000))
+
+# Campos de texto: em JSON lines podem chegar como número, lista...
+TEXT_FIELDS = ('nome_do_usuario', 'email', 'senha', 'nivel', 'cpf', 'empresa', 'setor',
+               'data_de_nascimento', 'planta')
+
+def iter_rows(stream, fmt):
+    """
+    Lê as linhas do arquivo enviado como dicionários, com as mesmas chaves do
+    payload de /register (nome_do_usuario, email, senha, nivel, cpf, ...).
+    `fmt` é 'csv' (com cabeçalho) ou 'jsonl' (um objeto JSON por linha).
+    Linhas JSON inválidas são devolvidas como {"_error": ...}.
+    """
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        for row in csv.DictReader(text):
+            yield {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield {"_error": "JSON inválido"}
+            continue
+        yield row if isinstance(row, dict) else {"_error": "Cada linha deve ser um objeto JSON"}
+
+
+def _validate_row(row):
+    """Retorna (documento_sem_hash, senha) ou lança ValueError com a mensagem do erro."""
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    for field in TEXT_FIELDS:
+        if row.get(field) is not None and not isinstance(row[field], str):
+            raise ValueError(f"Campo '{field}' deve ser texto")
+    senha = row.get('senha')
+    if not validate_password(senha):
+        raise ValueError("Senha deve ter pelo menos 8 caracteres com letras maiúsculas, minúsculas e números")
+    # Sem consulta DNS por linha: o domínio é validado só sintaticamente
+    email = validate_email_address(row.get('email'), check_deliverability=False)
+    if not email:
+        raise ValueError("Endereço de email inválido")
+    username = sanitize_input(row.get('nome_do_usuario'))
+    if not username:
+        raise ValueError("Nome de usuário inválido")
+    role = row.get('nivel') or ROLES['3']
+    if role not in ROLES.values():
+        raise ValueError("Role inválido")
+    cpf = row.get('cpf')
+    if cpf:
+        cpf = validate_cpf(cpf)
+        if not cpf:
+            raise ValueError("CPF inválido")
+
+    user = User(
+        username=username,
+        email=email,
+        password_hash=None,
+        role=role,
+        cpf=cpf or None,
+        empresa=sanitize_input(row.get('empresa')),
+        setor=sanitize_input(row.get('setor')),
+        data_de_nascimento=row.get('data_de_nascimento') or None,
+        planta=sanitize_input(row.get('planta')),
+    )
+    return user.to_dict(), senha
+
+
+def _import_batch(batch, seen_emails, seen_usernames):
+    """Processa um lote de (número_da_linha, linha). Gera um resultado por linha."""
+    results = {}
+    candidates = []
+    for line_number, row in batch:
+        try:
+            doc, senha = _validate_row(row)
+        except (ValueError, TypeError) as e:
+            results[line_number] = {"row": line_number, "status": "error", "msg": str(e)}
+            continue
+        if doc['email'] in seen_emails:
+            results[line_number] = {"row": line_number, "status": "error", "msg": "Email repetido no arquivo"}
+            continue
+        if doc['username'] in seen_usernames:
+            results[line_number] = {"row": line_number, "status": "error", "msg": "Nome de usuário repetido no arquivo"}
+            continue
+        seen_emails.add(doc['email'])
+        seen_usernames.add(doc['username'])
+        candidates.append((line_number, doc, senha))
+
+    # Uma única consulta para todos os duplicados do lote
+    if candidates:
+        existing = User.collection().find(
+            {"$or": [
+                {"email": {"$in": [doc['email'] for _, doc, _ in candidates]}},
+                {"username": {"$in": [doc['username'] for _, doc, _ in candidates]}},
+            ]},
+            {"email": 1, "username": 1, "_id": 0}
+        )
+        taken_emails, taken_usernames = set(), set()
+        for user in existing:
+            taken_emails.add(user.get('email'))
+            taken_usernames.add(user.get('username'))
+        remaining = []
+        for line_number, doc, senha in candidates:
+            if doc['email'] in taken_emails:
+                results[line_number] = {"row": line_number, "status": "error", "msg": "Email já está em uso"}
+            elif doc['username'] in taken_usernames:
+                results[line_number] = {"row": line_number, "status": "error", "msg": "Nome de usuário já existe"}
+            else:
+                remaining.append((line_number, doc, senha))
+        candidates = remaining
+
+    if candidates:
+        try:
+            hashes = hash_passwords(senha for _, _, senha in candidates)
+        except PasswordHasherBusy:
+            for line_number, _, _ in candidates:
+                results[line_number] = {"row": line_number, "status": "error",
+                                        "msg": "Serviço de autenticação sobrecarregado. Reenvie esta linha."}
+            candidates = []
+        docs = []
+        for (_, doc, _), password_hash in zip(candidates, hashes if candidates else ()):
+            doc['password_hash'] = password_hash
+            doc['_id'] = ObjectId()
+            docs.append(doc)
+
+    if candidates:
+        failed = {}
+        try:
+            User.collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Ex.: email cadastrado por outra requisição entre a consulta e o insert
+            for error in e.details.get('writeErrors', []):
+                failed[error['index']] = "Email já está em uso" if error.get('code') == 11000 else error.get('errmsg')
+        for index, (line_number, doc, _) in enumerate(candidates):
+            if index in failed:
+                results[line_number] = {"row": line_number, "status": "error", "msg": failed[index]}
+            else:
+                results[line_number] = {"row": line_number, "status": "created",
+                                        "id": str(doc['_id']), "email": doc['email']}
+
+    for line_number, _ in batch:
+        yield results[line_number]
+
+
+def import_users(rows, batch_size=BULK_IMPORT_BATCH_SIZE, max_rows=BULK_IMPORT_MAX_ROWS):
+    """
+    Importa os usuários de `rows` (iterável de dicionários). Gera um resultado
+    por linha ({"row", "status", ...}) e, por fim, um resumo {"summary": {...}}.
+    """
+    seen_emails, seen_usernames = set(), set()
+    created = errors = 0
+    rows = iter(rows)
+    numbered = enumerate(islice(rows, max_rows), start=1)
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        for result in _import_batch(batch, seen_emails, seen_usernames):
+            if result["status"] == "created":
+                created += 1
+            else:
+                errors += 1
+            yield result
+    # Linhas além do limite não são processadas; o resumo avisa o cliente
+    truncated = next(rows, None) is not None
+    yield {"summary": {"created": created, "errors": errors, "truncated": truncated}}
@@ -0,0 +1,132 @@
+# app/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    """Cálculo em andamento de uma chave (ver TTLCache.get_or_compute)."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Cache em memória, limitado em tamanho (LRU) e com expiração por entrada.
+
+    - Seguro para uso entre threads do mesmo worker.
+    - Cada processo (worker do Gunicorn) mantém sua própria cópia.
+    - Expõe contadores de acertos (hits) e falhas (misses) para monitoramento.
+    - `get_or_compute` agrupa cálculos simultâneos da mesma chave (single-flight).
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._data = OrderedDict()  # chave -> (valor, expira_em)
+        self._inflight = {}  # chave -> _Flight
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Retorna o valor armazenado ou `default` se ausente/expirado."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Armazena um valor; `ttl` sobrescreve a validade padrão do cache."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """
+        Retorna o valor em cache ou o calcula com `compute()` e armazena.
+        Threads que pedem a mesma chave enquanto o cálculo está em andamento
+        esperam por ele em vez de repeti-lo. Se `compute` falhar, a exceção
+        chega a todas elas e nada é armazenado.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            # Outro cálculo pode ter terminado entre o get() e o lock
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                return item[0]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            self.set(key, flight.value, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key):
+        """Remove uma chave do cache (sem erro se ela não existir)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.coalesced = 0
+
+    def stats(self):
+        """Retorna um resumo dos contadores do cache."""
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,461 @@
+# app/dashboard_stats.py
+# Estatísticas do painel materializadas na coleção `dashboard_stats`.
+#
+# Em vez de agregar a coleção de produtos a cada carregamento do painel, as
+# rotas que criam, editam, mudam o status ou excluem produtos aplicam a
+# diferença (`$inc`) da contribuição do produto no documento global e no da
+# empresa. `GET /dashboard/stats` passa a ser uma leitura por _id.
+# `recompute_dashboard_stats` (app/jobs.py) reconstrói tudo a partir dos
+# produtos para corrigir qualquer divergência.
+
+import logging
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne, UpdateOne
+
+from app.cache import TTLCache
+from app.etags import DASHBOARD_SCOPE, bump_change_versions
+from app.models import DashboardStats, Product
+
+GLOBAL_STATS_ID = "global"
+EMPRESA_STATS_PREFIX = "empresa:"
+APPROVED_STATUS = "aprovado"
+
+# Leituras do painel ficam em cache por alguns segundos em cada worker, e
+# carregamentos simultâneos compartilham a mesma consulta
+DASHBOARD_STATS_CACHE_TTL = float(os.getenv("DASHBOARD_STATS_CACHE_TTL", 5))
+_dashboard_cache = TTLCache(maxsize=256, ttl=DASHBOARD_STATS_CACHE_TTL)
+
+# Tipo de perigo -> (campo do produto, rótulo exibido)
+DANGER_TYPES = (
+    ("fisico", "perigos_fisicos", "Físico"),
+    ("saude", "perigos_saude", "À Saúde"),
+    ("meio_ambiente", "perigos_meio_ambiente", "Ao Meio Ambiente"),
+)
+
+# Chaves usadas no lugar de valores nulos (ex.: produto sem status) e de
+# strings vazias, que não são nomes de campo válidos em um caminho
+_NULL_KEY = "%null"
+_EMPTY_KEY = "%empty"
+
+
+def stats_id_for(empresa):
+    return f"{EMPRESA_STATS_PREFIX}{empresa}" if empresa else GLOBAL_STATS_ID
+
+
+def empresa_from_stats_id(stats_id):
+    """Inverso de `stats_id_for` (None para o documento global)."""
+    return None if stats_id == GLOBAL_STATS_ID else stats_id[len(EMPRESA_STATS_PREFIX):]
+
+
+def escape_key(value):
+    """
+    Converte um valor (status, empresa, pictograma...) em nome de campo válido
+    para o MongoDB: '.' separa caminhos e '$' inicial é reservado.
+    """
+    if value is None:
+        return _NULL_KEY
+    if value == "":
+        return _EMPTY_KEY
+    return str(value).replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def unescape_key(key):
+    if key == _NULL_KEY:
+        return None
+    if key == _EMPTY_KEY:
+        return ""
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def _to_number(value):
+    """Equivalente ao `$convert` para double com onError/onNull = 0."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def storage_path(empresa, estado):
+    """
+    Caminho do contador de quantidade armazenada. Usado tanto pelos
+    incrementos quanto pelo recálculo: o `$toUpper` do Mongo só converte
+    letras ASCII ("LíQUIDO"), então a normalização fica sempre no Python.
+    """
+    return f"storage.{escape_key(empresa)}.{escape_key(estado.upper())}"
+
+
+def product_contribution(doc):
+    """
+    Contadores (caminho -> incremento) com que um produto contribui para as
+    estatísticas. Produto None não contribui.
+    """
+    contribution = Counter()
+    if not doc:
+        return contribution
+    contribution["total"] += 1
+    contribution[f"by_status.{escape_key(doc.get('status'))}"] += 1
+    contribution[f"by_company.{escape_key(doc.get('empresa'))}"] += 1
+    contribution[f"by_physical_state.{escape_key(doc.get('estado_fisico'))}"] += 1
+
+    hazards = set()
+    for key, field, _ in DANGER_TYPES:
+        values = doc.get(field) or []
+        if values:
+            contribution[f"danger.{key}"] += 1
+        hazards.update(values)
+    for hazard in hazards:
+        contribution[f"by_pictogram.{escape_key(hazard)}"] += 1
+
+    empresa = doc.get("empresa")
+    estado = doc.get("estado_fisico")
+    quantidade = _to_number(doc.get("quantidade_armazenada"))
+    if empresa and estado and isinstance(estado, str) and quantidade > 0:
+        contribution[storage_path(empresa, estado)] += quantidade
+    return contribution
+
+
+def _is_approved(doc):
+    return bool(doc) and doc.get("status") == APPROVED_STATUS
+
+
+def _stats_operations(stats_id, before, after):
+    """Operações sobre um documento de estatísticas para a troca before -> after."""
+    delta = product_contribution(after)
+    delta.subtract(product_contribution(before))
+    inc = {path: value for path, value in delta.items() if value}
+
+    update = {}
+    if inc:
+        update["$inc"] = inc
+    operations = []
+    stale_last_approved = None
+    if _is_approved(after):
+        update["$max"] = {"last_approved": {"id": after["_id"], "nome": after.get("nome_do_produto")}}
+        if _is_approved(before) and before.get("nome_do_produto") != after.get("nome_do_produto"):
+            operations.append(UpdateOne(
+                {"_id": stats_id, "last_approved.id": after["_id"]},
+                {"$set": {"last_approved.nome": after.get("nome_do_produto")}}
+            ))
+    elif _is_approved(before):
+        stale_last_approved = before["_id"]
+    if update:
+        operations.insert(0, UpdateOne({"_id": stats_id}, update, upsert=True))
+    return operations, stale_last_approved
+
+
+def _refresh_last_approved(stats_id, empresa, removed_id):
+    """Recalcula `last_approved` quando o produto que o ocupava deixou de contar."""
+    query = {"status": APPROVED_STATUS}
+    if empresa:
+        query["empresa"] = empresa
+    doc = Product.collection().find_one(query, {"nome_do_produto": 1}, sort=[("_id", -1)])
+    last = {"id": doc["_id"], "nome": doc.get("nome_do_produto")} if doc else None
+    DashboardStats.collection().update_one(
+        {"_id": stats_id, "last_approved.id": removed_id},
+        {"$set": {"last_approved": last}}
+    )
+
+
+def apply_product_change(before, after):
+    """
+    Atualiza as estatísticas materializadas para a troca de `before` por
+    `after` (None em um dos lados = criação ou exclusão). Falhas são apenas
+    registradas: a escrita do produto já aconteceu e o recálculo periódico
+    corrige a divergência.
+    """
+    if not before and not after:
+        return
+    # Documento global e o(s) da(s) empresa(s) envolvida(s): se a empresa
+    # mudou, a antiga perde o produto e a nova o ganha.
+    targets = {GLOBAL_STATS_ID: [before, after]}
+    if before and before.get("empresa"):
+        targets.setdefault(stats_id_for(before["empresa"]), [None, None])[0] = before
+    if after and after.get("empresa"):
+        targets.setdefault(stats_id_for(after["empresa"]), [None, None])[1] = after
+
+    operations = []
+    stale = []
+    for stats_id, (doc_before, doc_after) in targets.items():
+        ops, removed_id = _stats_operations(stats_id, doc_before, doc_after)
+        operations.extend(ops)
+        if removed_id is not None:
+            empresa = None if stats_id == GLOBAL_STATS_ID else doc_before.get("empresa")
+            stale.append((stats_id, empresa, removed_id))
+    try:
+        if operations:
+            DashboardStats.collection().bulk_write(operations, ordered=True)
+        for stats_id, empresa, removed_id in stale:
+            _refresh_last_approved(stats_id, empresa, removed_id)
+    except Exception as e:
+        logging.error(f"Erro ao atualizar estatísticas do painel: {e}")
+    # O cache do painel não precisa ser limpo aqui: a rota usa as versões de
+    # alteração (incrementadas por quem chama) na chave, então a próxima
+    # leitura já consulta os números novos.
+
+
+def _has_items(field):
+    """1 se o array `field` do produto não estiver vazio, 0 caso contrário."""
+    return {"$cond": [{"$gt": [{"$size": {"$ifNull": [f"${field}", []]}}, 0]}, 1, 0]}
+
+
+def dashboard_facet_pipeline(match=None):
+    """
+    Agregação de uma única passada sobre os produtos que produz todos os
+    números do painel, por empresa. Um `$project` inicial reduz cada produto
+    aos campos usados e já calcula os derivados (perigos sem repetição,
+    indicadores de tipo de perigo, quantidade numérica); o `$facet` reparte
+    esse mesmo fluxo entre os agrupamentos.
+    """
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$project": {
+            "empresa": 1,
+            "status": 1,
+            "estado_fisico": 1,
+            "nome_do_produto": 1,
+            "perigos": {"$setUnion": [{"$ifNull": [f"${field}", []]} for _, field, _ in DANGER_TYPES]},
+            **{key: _has_items(field) for key, field, _ in DANGER_TYPES},
+            "quantidade": {"$convert": {
+                "input": "$quantidade_armazenada", "to": "double", "onError": 0, "onNull": 0
+            }},
+        }},
+        {"$facet": {
+            # Status, estado físico, empresa, total e tipos de perigo saem de um só agrupamento
+            "counts": [{"$group": {
+                "_id": {"empresa": "$empresa", "status": "$status", "estado_fisico": "$estado_fisico"},
+                "count": {"$sum": 1},
+                **{key: {"$sum": f"${key}"} for key, _, _ in DANGER_TYPES},
+            }}],
+            "pictograms": [
+                {"$unwind": "$perigos"},
+                {"$group": {"_id": {"empresa": "$empresa", "pictograma": "$perigos"}, "count": {"$sum": 1}}},
+            ],
+            "storage": [
+                {"$match": {
+                    "empresa": {"$nin": [None, ""]},
+                    "estado_fisico": {"$type": "string", "$ne": ""},
+                    "quantidade": {"$gt": 0},
+                }},
+                {"$group": {
+                    # Estado sem normalizar: build_stats_documents aplica storage_path
+                    "_id": {"empresa": "$empresa", "estado_fisico": "$estado_fisico"},
+                    "quantidade": {"$sum": "$quantidade"},
+                }},
+            ],
+            "last_approved": [
+                {"$match": {"status": APPROVED_STATUS}},
+                {"$sort": {"_id": -1}},
+                {"$group": {"_id": "$empresa", "id": {"$first": "$_id"}, "nome": {"$first": "$nome_do_produto"}}},
+            ],
+        }},
+    ]
+    return pipeline
+
+
+def build_stats_documents(facets):
+    """
+    Monta os documentos de estatísticas (global e por empresa) a partir do
+    resultado de `dashboard_facet_pipeline`, no mesmo formato mantido pelos
+    incrementos de `apply_product_change`.
+    """
+    flat = defaultdict(Counter, {GLOBAL_STATS_ID: Counter()})
+
+    def add(empresa, path, value):
+        flat[GLOBAL_STATS_ID][path] += value
+        if empresa:
+            flat[stats_id_for(empresa)][path] += value
+
+    for row in facets.get("counts", []):
+        key, count = row["_id"], row["count"]
+        empresa = key.get("empresa")
+        add(empresa, "total", count)
+        add(empresa, f"by_status.{escape_key(key.get('status'))}", count)
+        add(empresa, f"by_company.{escape_key(empresa)}", count)
+        add(empresa, f"by_physical_state.{escape_key(key.get('estado_fisico'))}", count)
+        for danger_key, _, _ in DANGER_TYPES:
+            if row.get(danger_key):
+                add(empresa, f"danger.{danger_key}", row[danger_key])
+    for row in facets.get("pictograms", []):
+        key = row["_id"]
+        add(key.get("empresa"), f"by_pictogram.{escape_key(key.get('pictograma'))}", row["count"])
+    for row in facets.get("storage", []):
+        key = row["_id"]
+        add(key["empresa"], storage_path(key["empresa"], key["estado_fisico"]), row["quantidade"])
+
+    last_approved = {}
+    for row in facets.get("last_approved", []):
+        entry = {"id": row["id"], "nome": row.get("nome")}
+        if row.get("_id"):
+            last_approved[stats_id_for(row["_id"])] = entry
+        current = last_approved.get(GLOBAL_STATS_ID)
+        if current is None or entry["id"] > current["id"]:
+            last_approved[GLOBAL_STATS_ID] = entry
+
+    computed_at = datetime.now(timezone.utc)
+    documents = {}
+    for stats_id, counters in flat.items():
+        document = {
+            "_id": stats_id,
+            "total": 0,
+            "last_approved": last_approved.get(stats_id),
+            "computed_at": computed_at,
+        }
+        for path, value in counters.items():
+            node = document
+            *parents, leaf = path.split(".")
+            for part in parents:
+                node = node.setdefault(part, {})
+            node[leaf] = value
+        documents[stats_id] = document
+    return documents
+
+
+def materialize_dashboard_stats(products, stats):
+    """
+    Recalcula e grava todos os documentos de estatísticas com uma única
+    agregação; documentos de empresas sem produtos são removidos.
+    """
+    facets = next(iter(products.aggregate(dashboard_facet_pipeline())), {})
+    documents = build_stats_documents(facets)
+    operations = [ReplaceOne({"_id": stats_id}, doc, upsert=True) for stats_id, doc in documents.items()]
+    stats.bulk_write(operations, ordered=False)
+    removed = stats.delete_many({"_id": {"$nin": list(documents)}}).deleted_count
+    invalidate_dashboard_cache()
+    bump_change_versions(DASHBOARD_SCOPE)
+    return {
+        "documents": len(documents),
+        "removed": removed,
+        "total_products": documents[GLOBAL_STATS_ID]["total"],
+        "documents_by_id": documents,
+    }
+
+
+def _counts(mapping):
+    """{chave escapada: n} -> [(valor, n)] sem zeros, do maior para o menor."""
+    items = [(unescape_key(key), value) for key, value in (mapping or {}).items() if value > 0]
+    return sorted(items, key=lambda item: item[1], reverse=True)
+
+
+def format_dashboard_stats(document):
+    """Converte um documento de estatísticas no formato de resposta de /dashboard/stats."""
+    document = document or {}
+    last_approved = document.get("last_approved") or {}
+    danger = document.get("danger") or {}
+    storage = document.get("storage") or {}
+    return {
+        "total_products": document.get("total", 0),
+        "last_approved_product": (last_approved.get("nome") or "Nome não encontrado") if last_approved else "Nenhum",
+        "products_by_status": [{"_id": k, "count": n} for k, n in _counts(document.get("by_status"))],
+        "products_by_company": [{"_id": k, "count": n} for k, n in _counts(document.get("by_company"))],
+        "products_by_pictogram": [
+            {"pictograma": k, "quantidade_produtos": n} for k, n in _counts(document.get("by_pictogram"))
+        ],
+        "products_by_physical_state": [
+            {"_id": k, "count": n} for k, n in _counts(document.get("by_physical_state"))
+        ],
+        "storage_by_company_and_state": [
+            {
+                "empresa": unescape_key(empresa),
+                "dados_por_estado": [
+                    {"estado_fisico": estado, "quantidade": quantidade}
+                    for estado, quantidade in _counts(states)
+                ],
+            }
+            for empresa, states in sorted(storage.items())
+            if any(value > 0 for value in states.values())
+        ],
+        "danger_classification": [
+            {"tipo": label, "quantidade": danger.get(key, 0)} for key, _, label in DANGER_TYPES
+        ] if document.get("total") else [],
+    }
+
+
+def parse_date_bound(value, end=False):
+    """
+    Converte `from`/`to` (ISO 8601) em datetime UTC. Uma data sem horário no
+    limite final inclui o dia inteiro. Levanta ValueError se for inválida.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def scope_match(empresa=None, local=None, created_from=None, created_to=None):
+    """
+    `$match` inicial do painel filtrado. A ordem (igualdades, depois o
+    intervalo em created_at) segue os índices compostos de Product.
+    """
+    match = {}
+    if empresa:
+        match["empresa"] = empresa
+    if local:
+        match["local_de_armazenamento"] = local
+    if created_from or created_to:
+        match["created_at"] = {}
+        if created_from:
+            match["created_at"]["$gte"] = created_from
+        if created_to:
+            match["created_at"]["$lt"] = created_to
+    return match
+
+
+def _load_materialized(empresa):
+    stats_id = stats_id_for(empresa)
+    document = DashboardStats.collection().find_one({"_id": stats_id})
+    if document and document.get("computed_at"):
+        return document
+    if stats_id != GLOBAL_STATS_ID:
+        # Empresa cujo documento nasceu de incrementos depois do último
+        # recálculo (ou que não tem produtos): vale se o global já foi calculado
+        marker = DashboardStats.collection().find_one({"_id": GLOBAL_STATS_ID}, {"computed_at": 1})
+        if marker and marker.get("computed_at"):
+            return document or {"_id": stats_id, "total": 0}
+    logging.info("Estatísticas do painel ainda não materializadas: recalculando.")
+    documents = materialize_dashboard_stats(Product.collection(), DashboardStats.collection())["documents_by_id"]
+    return documents.get(stats_id) or {"_id": stats_id, "total": 0}
+
+
+def _aggregate_scope(match):
+    facets = next(iter(Product.collection().aggregate(dashboard_facet_pipeline(match))), {})
+    return build_stats_documents(facets)[GLOBAL_STATS_ID]
+
+
+def load_dashboard_stats(empresa=None, local=None, created_from=None, created_to=None, version=None):
+    """
+    Documento de estatísticas do escopo pedido.
+
+    - Sem filtros ou só com empresa: documento materializado (leitura por _id).
+      Se ainda não houver um recálculo completo (`computed_at`), ele é feito
+      agora, pois incrementos aplicados antes disso partiriam de contagens
+      incompletas.
+    - Com local ou período: agregação de uma passada restrita pelo `$match`
+      inicial, com custo proporcional aos produtos do escopo.
+
+    Requisições simultâneas do mesmo worker para o mesmo escopo compartilham a
+    consulta em andamento e o resultado fica em cache por alguns segundos.
+    `version` (versões de alteração lidas para o ETag) entra na chave do
+    cache, para que um ETag novo nunca acompanhe números antigos.
+    """
+    if not local and not created_from and not created_to:
+        key = stats_id_for(empresa) if version is None else (stats_id_for(empresa), version)
+        return _dashboard_cache.get_or_compute(key, lambda: _load_materialized(empresa))
+    match = scope_match(empresa, local, created_from, created_to)
+    key = ("scope", empresa, local, created_from, created_to, version)
+    return _dashboard_cache.get_or_compute(key, lambda: _aggregate_scope(match))
+
+
+def invalidate_dashboard_cache():
+    _dashboard_cache.clear()
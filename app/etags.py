@@ -0,0 +1,94 @@
+# app/etags.py
+# GET condicional (ETag / If-None-Match) para listagens e painel.
+#
+# Cada escrita incrementa um contador de versão por escopo na coleção
+# `change_versions` ("products", "products:<empresa>", ...). O ETag de uma
+# resposta é o hash das versões dos escopos de que ela depende mais os
+# parâmetros da requisição. Se o cliente já tem esse ETag, a rota responde
+# 304 depois de uma única leitura pequena, sem consultar os dados nem
+# serializar JSON.
+#
+# As versões são lidas ANTES dos dados e as escritas incrementam a versão
+# DEPOIS de gravar: no pior caso um ETag antigo acompanha dados novos e o
+# cliente baixa de novo na próxima vez, nunca o contrário.
+
+import hashlib
+import json
+import logging
+from flask import make_response, request
+from pymongo import UpdateOne
+
+from app.models import ChangeVersion
+
+PRODUCTS_SCOPE = "products"
+USERS_SCOPE = "users"
+DASHBOARD_SCOPE = "dashboard"
+
+# Respostas com ETag são revalidadas a cada uso e não vão para caches compartilhados
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def products_scope(empresa=None):
+    """Escopo de versão dos produtos de uma empresa (ou de todos)."""
+    return f"{PRODUCTS_SCOPE}:{empresa}" if empresa else PRODUCTS_SCOPE
+
+
+def product_change_scopes(before, after):
+    """Escopos afetados pela troca de um produto (global e empresas antes/depois)."""
+    scopes = {PRODUCTS_SCOPE}
+    for doc in (before, after):
+        if doc and doc.get("empresa"):
+            scopes.add(products_scope(doc["empresa"]))
+    return scopes
+
+
+def bump_change_versions(*scopes):
+    """Incrementa a versão dos escopos. Falhas são registradas e não interrompem a escrita."""
+    scopes = sorted({scope for scope in scopes if scope})
+    if not scopes:
+        return
+    try:
+        ChangeVersion.collection().bulk_write(
+            [UpdateOne({"_id": scope}, {"$inc": {"v": 1}}, upsert=True) for scope in scopes],
+            ordered=False
+        )
+    except Exception as e:
+        logging.error(f"Erro ao registrar versão de alteração de {scopes}: {e}")
+
+
+def read_change_versions(scopes):
+    """Versões atuais dos escopos, na ordem pedida (0 para escopos nunca alterados)."""
+    docs = ChangeVersion.collection().find({"_id": {"$in": list(scopes)}})
+    versions = {doc["_id"]: doc.get("v", 0) for doc in docs}
+    return tuple(versions.get(scope, 0) for scope in scopes)
+
+
+def compute_etag(scopes, *parts):
+    """
+    Retorna (etag, versões) para uma resposta que depende de `scopes` e de
+    `parts` (parâmetros da requisição, papel do usuário...). Se as versões não
+    puderem ser lidas, retorna (None, None) e a resposta segue sem ETag.
+    """
+    try:
+        versions = read_change_versions(scopes)
+    except Exception as e:
+        logging.error(f"Erro ao ler versões de alteração de {list(scopes)}: {e}")
+        return None, None
+    payload = json.dumps([list(scopes), versions, parts], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32], versions
+
+
+def not_modified(etag):
+    """Resposta 304 se o cliente já tem `etag` (If-None-Match); senão None."""
+    if etag is None or not request.if_none_match.contains(etag):
+        return None
+    response = make_response("", 304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+    return response
@@ -0,0 +1,132 @@
+# app/indexes.py
+
+import logging
+from pymongo.errors import PyMongoError
+
+from app.models import User, Product, PdfMetadata, UserSession, StatsSnapshot
+
+# Modelos cujos índices declarados (atributo `indexes`) a aplicação gerencia
+INDEXED_MODELS = (User, Product, PdfMetadata, UserSession, StatsSnapshot)
+
+
+def index_registry():
+    """Retorna {nome_da_coleção: [IndexModel, ...]} a partir dos modelos."""
+    return {model.collection_name: list(model.indexes) for model in INDEXED_MODELS}
+
+
+# Opções que mudam o comportamento do índice e precisam coincidir com o registro
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _index_spec(index):
+    """Chave e opções relevantes de um índice (do banco ou de IndexModel.document)."""
+    spec = {"key": dict(index["key"])}
+    for option in INDEX_OPTIONS:
+        value = index.get(option)
+        if option in ("unique", "sparse"):
+            value = bool(value)
+        elif option == "partialFilterExpression" and value is not None:
+            value = dict(value)
+        elif option == "expireAfterSeconds" and value is not None:
+            value = int(value)  # o servidor pode devolver como double
+        spec[option] = value
+    return spec
+
+
+def _existing_indexes(collection):
+    """Índices presentes no banco, por nome (ignorando o índice padrão de _id)."""
+    return {
+        index["name"]: _index_spec(index)
+        for index in collection.list_indexes()
+        if index["name"] != "_id_"
+    }
+
+
+def ensure_indexes(database, failed=None):
+    """
+    Cria os índices declarados que ainda não existem. É idempotente: índices
+    já existentes com a mesma definição não são recriados.
+
+    Cada índice é criado com seu próprio comando: um `create_indexes` com
+    vários índices não cria nenhum se um deles falhar (ex.: único sobre dados
+    duplicados). Retorna {coleção: [nomes criados]}; se `failed` for um dict,
+    recebe {coleção: {nome: mensagem de erro}}.
+    """
+    created = {}
+    for collection_name, models in index_registry().items():
+        collection = database[collection_name]
+        existing = _existing_indexes(collection)
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                continue
+            try:
+                created.setdefault(collection_name, []).extend(collection.create_indexes([model]))
+            except PyMongoError as e:
+                # Não derruba a aplicação: verify_indexes() continuará
+                # reportando o índice como ausente.
+                logging.error(f"Erro ao criar o índice '{name}' em '{collection_name}': {e}")
+                if failed is not None:
+                    failed.setdefault(collection_name, {})[name] = str(e)
+        if created.get(collection_name):
+            logging.info(f"Índices criados em '{collection_name}': {', '.join(created[collection_name])}")
+    return created
+
+
+def verify_indexes(database):
+    """
+    Compara os índices do banco com o registro.
+
+    Retorna um relatório no formato:
+        {"ok": bool, "collections": {coleção: {"missing": [...], "mismatched": [...], "extra": [...]}}}
+    `ok` é False se algum índice exigido estiver ausente ou com outra definição
+    (chave ou opções: unique, sparse, filtro parcial, TTL). Índices extras
+    apenas são reportados.
+    """
+    report = {"ok": True, "collections": {}}
+    for collection_name, models in index_registry().items():
+        existing = _existing_indexes(database[collection_name])
+        expected = {m.document["name"]: _index_spec(m.document) for m in models}
+
+        missing = sorted(name for name in expected if name not in existing)
+        mismatched = sorted(
+            name for name, spec in expected.items()
+            if name in existing and existing[name] != spec
+        )
+        extra = sorted(name for name in existing if name not in expected)
+
+        report["collections"][collection_name] = {
+            "missing": missing,
+            "mismatched": mismatched,
+            "extra": extra,
+        }
+        if missing or mismatched:
+            report["ok"] = False
+    return report
+
+
+def register_index_commands(app):
+    """Registra o comando `flask indexes` (aplica e/ou verifica os índices)."""
+    import click
+
+    @app.cli.command("indexes")
+    @click.option("--check", is_flag=True, help="Apenas verifica, sem criar índices.")
+    def indexes_command(check):
+        """Aplica os índices declarados nos modelos e mostra o relatório."""
+        from app import db
+        if db is None:
+            raise click.ClickException("Banco de dados não inicializado.")
+        if not check:
+            failed = {}
+            ensure_indexes(db, failed=failed)
+            for collection_name, errors in failed.items():
+                for name, error in errors.items():
+                    click.echo(f"{collection_name}: falha ao criar '{name}': {error}")
+        report = verify_indexes(db)
+        for collection_name, result in report["collections"].items():
+            click.echo(
+                f"{collection_name}: ausentes={result['missing']} "
+                f"divergentes={result['mismatched']} extras={result['extra']}"
+            )
+        if not report["ok"]:
+            raise SystemExit(1)
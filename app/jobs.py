@@ -0,0 +1,155 @@
+# app/jobs.py
+# Tarefas de manutenção executadas fora do ciclo de requisições
+# (via `flask <comando>` ou agendadores externos).
+
+import logging
+from collections import defaultdict
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.dashboard_stats import materialize_dashboard_stats
+from app.models import DashboardStats, Product, StatsSnapshot
+from app.stats_snapshots import take_snapshot
+
+BACKFILL_BATCH_SIZE = 500
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _write_name_batch(collection, batch, collisions):
+    """
+    Grava um lote de (documento, chave). O índice único `nome_normalizado_1`
+    já existe (criado na inicialização), então chaves repetidas falham com
+    E11000: o restante do lote é aplicado e os documentos recusados vão para
+    `collisions`. Retorna quantos documentos foram atualizados.
+    """
+    operations = [UpdateOne({"_id": doc["_id"]}, {"$set": {"nome_normalizado": key}}) for doc, key in batch]
+    try:
+        return collection.bulk_write(operations, ordered=False).modified_count
+    except BulkWriteError as e:
+        other_errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY_ERROR]
+        if other_errors:
+            raise
+        for err in e.details["writeErrors"]:
+            doc, key = batch[err["index"]]
+            collisions.append({
+                "_id": str(doc["_id"]), "nome_do_produto": doc.get("nome_do_produto"), "nome_normalizado": key
+            })
+        return e.details.get("nModified", 0)
+
+
+def backfill_normalized_names(database, only_missing=True, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Preenche `nome_normalizado` nos produtos existentes.
+
+    Atualiza em lotes com `bulk_write` não ordenado. Produtos cujo nome colide
+    com outro após a normalização são recusados pelo índice único e ficam sem
+    a chave (ainda encontrados pela busca antiga de create_product). Retorna a
+    quantidade de documentos atualizados, as colisões (id e nome) e os grupos
+    de ids duplicados por chave, que precisam de correção manual.
+    """
+    collection = database[Product.collection_name]
+    query = {"nome_normalizado": {"$exists": False}} if only_missing else {}
+    cursor = collection.find(query, {"nome_do_produto": 1, "nome_normalizado": 1})
+
+    updated = 0
+    collisions = []
+    batch = []
+    for doc in cursor:
+        key = Product.normalize_name(doc.get("nome_do_produto"))
+        if key is None or doc.get("nome_normalizado") == key:
+            continue
+        batch.append((doc, key))
+        if len(batch) >= batch_size:
+            updated += _write_name_batch(collection, batch, collisions)
+            batch = []
+    if batch:
+        updated += _write_name_batch(collection, batch, collisions)
+
+    # Detecta colisões entre nomes que só diferiam por caixa/acentos/espaços
+    ids_by_key = defaultdict(list)
+    for doc in collection.find({"nome_normalizado": {"$type": "string"}}, {"nome_normalizado": 1}):
+        ids_by_key[doc["nome_normalizado"]].append(str(doc["_id"]))
+    for collision in collisions:
+        ids_by_key[collision["nome_normalizado"]].append(collision["_id"])
+    duplicates = {key: ids for key, ids in ids_by_key.items() if len(ids) > 1}
+
+    logging.info(f"Backfill de nome_normalizado: {updated} produto(s) atualizado(s).")
+    if collisions:
+        logging.warning(f"Produtos recusados pelo índice único de nome: {collisions}")
+    if duplicates:
+        logging.warning(f"Nomes de produto duplicados após normalização: {duplicates}")
+    return {"updated": updated, "duplicates": duplicates, "collisions": collisions}
+
+
+def recompute_dashboard_stats(database):
+    """
+    Reconstrói as estatísticas materializadas do painel a partir dos produtos
+    (correção de divergências do `$inc` incremental).
+
+    Deve ser agendado periodicamente (ex.: a cada hora) em horário de pouco uso:
+    edições feitas durante a leitura podem ficar de fora até a rodada seguinte.
+    """
+    result = materialize_dashboard_stats(
+        database[Product.collection_name], database[DashboardStats.collection_name]
+    )
+    logging.info(
+        f"Estatísticas do painel recalculadas: {result['documents']} documento(s), "
+        f"{result['removed']} removido(s)."
+    )
+    return result
+
+
+def snapshot_dashboard_stats(database, now=None):
+    """
+    Grava o ponto horário (e diário) do histórico do painel a partir das
+    estatísticas materializadas. Agendar de hora em hora.
+    """
+    series = take_snapshot(
+        database[DashboardStats.collection_name],
+        database[StatsSnapshot.collection_name],
+        products=database[Product.collection_name],
+        now=now,
+    )
+    logging.info(f"Histórico do painel: {series} série(s) gravada(s).")
+    return {"series": series}
+
+
+def register_job_commands(app):
+    """Registra os comandos de manutenção na CLI do Flask."""
+    import click
+
+    @app.cli.command("backfill-names")
+    @click.option("--all", "all_documents", is_flag=True,
+                  help="Recalcula a chave de todos os produtos, não só dos que não a possuem.")
+    def backfill_names_command(all_documents):
+        """Preenche nome_normalizado nos produtos existentes."""
+        from app import db
+        if db is None:
+            raise click.ClickException("Banco de dados não inicializado.")
+        result = backfill_normalized_names(db, only_missing=not all_documents)
+        click.echo(f"Produtos atualizados: {result['updated']}")
+        for collision in result["collisions"]:
+            click.echo(f"Não atualizado (nome repetido) {collision['_id']}: '{collision['nome_do_produto']}'")
+        for key, ids in result["duplicates"].items():
+            click.echo(f"Duplicado '{key}': {', '.join(ids)}")
+        if result["duplicates"]:
+            raise SystemExit(1)
+
+    @app.cli.command("recompute-dashboard-stats")
+    def recompute_dashboard_stats_command():
+        """Recalcula as estatísticas materializadas do painel."""
+        from app import db
+        if db is None:
+            raise click.ClickException("Banco de dados não inicializado.")
+        result = recompute_dashboard_stats(db)
+        click.echo(f"Documentos de estatísticas: {result['documents']} (removidos: {result['removed']})")
+        click.echo(f"Produtos contabilizados: {result['total_products']}")
+
+    @app.cli.command("snapshot-dashboard-stats")
+    def snapshot_dashboard_stats_command():
+        """Grava o ponto horário do histórico do painel (agendar de hora em hora)."""
+        from app import db
+        if db is None:
+            raise click.ClickException("Banco de dados não inicializado.")
+        result = snapshot_dashboard_stats(db)
+        click.echo(f"Séries gravadas: {result['series']}")
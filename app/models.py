@@ -1,74 +1,200 @@
+import re
+import unicodedata
 from datetime import datetime, timezone
 from bson.objectid import ObjectId
+from pymongo import IndexModel, ASCENDING
+
+_MISSING = object()
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _empty_list():
+    return []
+
+
+def _parse_datetime(value):
+    """Converte strings ISO 8601 em datetime; outros valores passam intactos."""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _str_or_none(value):
+    return str(value) if value else None
+
+
+def _or_zero(value):
+    return value or 0
+
+
+class Field:
+    """
+    Declaração de um campo do modelo.
+
+    - default: valor quando o campo não é informado (sem default = obrigatório)
+    - default_factory: chamado quando o valor é omitido ou None (ex.: data atual)
+    - decode: conversão aplicada ao ler do banco (from_dict)
+    - encode: conversão aplicada ao gravar (to_dict)
+    """
+    __slots__ = ('name', 'default', 'default_factory', 'decode', 'encode')
+
+    def __init__(self, name, default=_MISSING, default_factory=None, decode=None, encode=None):
+        self.name = name
+        self.default = default
+        self.default_factory = default_factory
+        self.decode = decode
+        self.encode = encode
+
+    @property
+    def required(self):
+        return self.default is _MISSING and self.default_factory is None
+
+
+def _compile_decoder(fields):
+    """
+    Gera a função de leitura (documento -> objeto) do esquema, com uma
+    atribuição direta por campo em vez de um laço com setattr: é o caminho
+    mais quente da camada de modelos.
+    """
+    namespace = {}
+    lines = ["def decode(cls, data):", "    obj = cls.__new__(cls)", "    get = data.get"]
+    for index, field in enumerate(fields):
+        value = f"get({field.name!r})"
+        if field.decode:
+            namespace[f"decode_{index}"] = field.decode
+            value = f"decode_{index}({value})"
+        if field.default_factory:
+            namespace[f"factory_{index}"] = field.default_factory
+            value = f"({value} or factory_{index}())"
+        lines.append(f"    obj.{field.name} = {value}")
+    lines.append("    return obj")
+    exec("\n".join(lines), namespace)
+    return namespace["decode"]
+
+
+def slots_for(fields):
+    """Nomes dos __slots__ de um modelo a partir do seu esquema."""
+    return tuple(field.name for field in fields)
 
-class User:
-    collection_name = 'users'
 
-    def __init__(self, username, email, password_hash, role,
-                 cpf=None, empresa=None, setor=None, data_de_nascimento=None, planta=None,
-                 _id=None,created_at=None,last_access=None):
-        self.username = username
-        self.email = email
-        self.password_hash = password_hash
-        self.role = role
-        self.cpf = cpf
-        self.empresa = empresa
-        self.setor = setor
-        self.data_de_nascimento = data_de_nascimento
-        self.planta = planta
-        self._id = _id
-        self.created_at = created_at if created_at is not None else datetime.now(timezone.utc)
-        self.last_access = last_access
+class Model:
+    """
+    Base dos modelos: um único esquema (`fields`) define construtor,
+    codificação para o MongoDB, leitura, projeções e campos obrigatórios.
+
+    As subclasses declaram `fields` e `__slots__ = slots_for(fields)`: as
+    instâncias não têm `__dict__`, o que reduz a memória por objeto. Em
+    listagens, prefira trabalhar direto com os documentos e `projection()`,
+    sem construir objetos.
+    """
+    __slots__ = ()
+    fields = ()
+    collection_name = None
+    indexes = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_names = tuple(f.name for f in cls.fields)
+        cls._factories = tuple((f.name, f.default_factory) for f in cls.fields if f.default_factory)
+        cls._encoders = tuple((f.name, f.encode) for f in cls.fields if f.encode and f.name != '_id')
+        if cls.fields:
+            cls._decode = staticmethod(_compile_decoder(cls.fields))
+
+    def __init__(self, *args, **kwargs):
+        fields = self.fields
+        if len(args) > len(fields):
+            raise TypeError(f"{type(self).__name__}() recebeu argumentos posicionais demais")
+        for field, value in zip(fields, args):
+            setattr(self, field.name, value)
+        for field in fields[len(args):]:
+            value = kwargs.pop(field.name, _MISSING)
+            if value is _MISSING:
+                if field.required:
+                    raise TypeError(f"{type(self).__name__}() sem o argumento obrigatório '{field.name}'")
+                value = None if field.default is _MISSING else field.default
+            setattr(self, field.name, value)
+        if kwargs:
+            raise TypeError(f"{type(self).__name__}() recebeu argumentos inesperados: {', '.join(kwargs)}")
+        for name, factory in self._factories:
+            if not getattr(self, name):
+                setattr(self, name, factory())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Monta o objeto a partir de um documento do banco (campos ausentes viram None/padrão)."""
+        return cls._decode(cls, data)
 
     def to_dict(self):
-        user_dict = {
-            "username": self.username,
-            "email": self.email,
-            "password_hash": self.password_hash,
-            "role": self.role,
-            "cpf": self.cpf,
-            "empresa": self.empresa,
-            "setor": self.setor,
-            "data_de_nascimento": self.data_de_nascimento,
-            "planta": self.planta,
-            "created_at": self.created_at,
-            "last_access": self.last_access
-        }
+        """Documento para gravação; `_id` só é incluído (como string) se definido."""
+        doc = {name: getattr(self, name) for name in self._field_names if name != '_id'}
+        for name, encode in self._encoders:
+            doc[name] = encode(doc[name])
         if self._id:
-            user_dict["_id"] = str(self._id)   # 👈 Convertendo para string
-        return user_dict
+            doc["_id"] = str(self._id)
+        return doc
 
     @classmethod
-    def from_dict(cls, data):
-         # Este trecho cria a variável 'created_at_data'
-        created_at_data = data.get("created_at")
-        if isinstance(created_at_data, str):
-            try:
-                # Tenta converter a string de data para um objeto datetime
-                created_at_data = datetime.fromisoformat(created_at_data)
-            except (ValueError, TypeError):
-                # Se a conversão falhar, ignora (mantém como None ou o valor original)
-                pass
-        last_access_data = data.get("last_access") # ✅ 4. Lógica para buscar o last_access
-        if isinstance(last_access_data, str):
-            try:
-                last_access_data = datetime.fromisoformat(last_access_data)
-            except (ValueError, TypeError):
-                pass
-        return cls(
-            username=data.get('username'),
-            email=data.get('email'),
-            password_hash=data.get('password_hash'),
-            role=data.get('role'),
-            cpf=data.get('cpf'),
-            empresa=data.get('empresa'),
-            setor=data.get('setor'),
-            data_de_nascimento=data.get('data_de_nascimento'),
-            planta=data.get('planta'),
-            _id=data.get('_id'),
-            created_at=created_at_data,
-            last_access=last_access_data
-        )
+    def projection(cls, *names, exclude=()):
+        """Projeção do MongoDB com os campos pedidos (ou todos os do esquema, menos `exclude`)."""
+        names = names or cls._field_names
+        unknown = [n for n in names if n not in cls._field_names]
+        if unknown:
+            raise ValueError(f"Campos desconhecidos em {cls.__name__}: {', '.join(unknown)}")
+        return {name: 1 for name in names if name not in exclude}
+
+    @classmethod
+    def missing_fields(cls, data):
+        """Campos obrigatórios do esquema ausentes ou vazios em `data`."""
+        return [f.name for f in cls.fields if f.required and not data.get(f.name)]
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {getattr(self, '_id', None)}>"
+
+
+class User(Model):
+    collection_name = 'users'
+
+    # Índices exigidos pela aplicação (aplicados por app/indexes.py)
+    indexes = [
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+        # Listagem do admin: ordenação/prefixo por username e filtros por empresa e papel
+        IndexModel([("username", ASCENDING), ("_id", ASCENDING)], name="username_1__id_1"),
+        # Keyset de `sort=email` percorre (email, _id)
+        IndexModel([("email", ASCENDING), ("_id", ASCENDING)], name="email_1__id_1"),
+        IndexModel([("empresa", ASCENDING), ("username", ASCENDING), ("_id", ASCENDING)],
+                   name="empresa_1_username_1__id_1"),
+        IndexModel([("role", ASCENDING), ("username", ASCENDING), ("_id", ASCENDING)],
+                   name="role_1_username_1__id_1"),
+    ]
+
+    # A ordem dos campos é a ordem dos argumentos posicionais do construtor
+    fields = (
+        Field('username'),
+        Field('email'),
+        Field('password_hash'),
+        Field('role'),
+        Field('cpf', None),
+        Field('empresa', None),
+        Field('setor', None),
+        Field('data_de_nascimento', None),
+        Field('planta', None),
+        Field('_id', None),
+        Field('created_at', default_factory=_now, decode=_parse_datetime),
+        Field('last_access', None, decode=_parse_datetime),
+        # Controle de concorrência otimista (app/versioning.py)
+        Field('version', 0, decode=_or_zero),
+    )
+    __slots__ = slots_for(fields)
 
     @classmethod
     def collection(cls):
@@ -76,95 +202,187 @@ class User:
         return db[cls.collection_name]
 
 
-class Product:
+class Product(Model):
     collection_name = 'products'
 
-    def __init__(self, codigo, nome_do_produto, fornecedor,
-                 estado_fisico, local_de_armazenamento, substancias,
-                 palavra_de_perigo, categoria, status, created_by_user_id,quantidade_armazenada=None,unidade_embalagem=None,
-                 perigos_fisicos=None, perigos_saude=None, perigos_meio_ambiente=None,
-                 pdf_url=None, pdf_s3_key=None, empresa=None,file_hash=None, _id=None, created_at=None):
-        self.codigo = codigo
-        self.quantidade_armazenada = quantidade_armazenada
-        self.unidade_embalagem = unidade_embalagem
-        self.nome_do_produto = nome_do_produto
-        self.fornecedor = fornecedor
-        self.estado_fisico = estado_fisico
-        self.local_de_armazenamento = local_de_armazenamento
-        self.substancias = substancias or []
-        self.perigos_fisicos = perigos_fisicos or []
-        self.perigos_saude = perigos_saude or []
-        self.perigos_meio_ambiente = perigos_meio_ambiente or []
-        self.palavra_de_perigo = palavra_de_perigo
-        self.categoria = categoria
-        self.status = status
-        self.created_by_user_id = created_by_user_id
-        self.pdf_url = pdf_url
-        self.pdf_s3_key = pdf_s3_key
-        self.empresa = empresa
-        self.file_hash = file_hash
-        self._id = _id
-        self.created_at = created_at if created_at is not None else datetime.now(timezone.utc)
+    # Índices exigidos pela aplicação (aplicados por app/indexes.py).
+    # Os compostos com _id sustentam as ordenações paginadas de GET /products.
+    indexes = [
+        IndexModel([("file_hash", ASCENDING)], name="file_hash_1"),
+        IndexModel([("created_by_user_id", ASCENDING)], name="created_by_user_id_1"),
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_1__id_1"),
+        IndexModel([("codigo", ASCENDING), ("_id", ASCENDING)], name="codigo_1__id_1"),
+        IndexModel([("nome_do_produto", ASCENDING), ("_id", ASCENDING)], name="nome_do_produto_1__id_1"),
+        # Filtros do painel (/dashboard/stats): igualdade em empresa/local e
+        # intervalo em created_at, nessa ordem
+        IndexModel([("empresa", ASCENDING), ("local_de_armazenamento", ASCENDING), ("created_at", ASCENDING)],
+                   name="empresa_1_local_de_armazenamento_1_created_at_1"),
+        IndexModel([("empresa", ASCENDING), ("created_at", ASCENDING)], name="empresa_1_created_at_1"),
+        IndexModel([("created_at", ASCENDING)], name="created_at_1"),
+        # Unicidade do nome independente de maiúsculas, acentos e espaços.
+        # Parcial para não conflitar com documentos antigos ainda sem a chave.
+        IndexModel(
+            [("nome_normalizado", ASCENDING)],
+            name="nome_normalizado_1",
+            unique=True,
+            partialFilterExpression={"nome_normalizado": {"$type": "string"}}
+        ),
+    ]
+
+    # A ordem dos campos é a ordem dos argumentos posicionais do construtor
+    fields = (
+        Field('codigo'),
+        Field('nome_do_produto'),
+        Field('fornecedor'),
+        Field('estado_fisico'),
+        Field('local_de_armazenamento'),
+        Field('substancias', default_factory=_empty_list),
+        Field('palavra_de_perigo'),
+        Field('categoria'),
+        Field('status'),
+        Field('created_by_user_id', encode=_str_or_none),
+        Field('quantidade_armazenada', None),
+        Field('unidade_embalagem', None),
+        Field('perigos_fisicos', default_factory=_empty_list),
+        Field('perigos_saude', default_factory=_empty_list),
+        Field('perigos_meio_ambiente', default_factory=_empty_list),
+        Field('pdf_url', None),
+        Field('pdf_s3_key', None),
+        Field('empresa', None),
+        Field('file_hash', None),
+        Field('_id', None),
+        Field('created_at', default_factory=_now, decode=_parse_datetime, encode=_isoformat),
+        # Controle de concorrência otimista (app/versioning.py)
+        Field('version', 0, decode=_or_zero),
+    )
+    __slots__ = slots_for(fields)
 
     def to_dict(self):
-        product_dict = {
-            "codigo": self.codigo,
-            "quantidade_armazenada": self.quantidade_armazenada, 
-            "unidade_embalagem": self.unidade_embalagem,     
-            "nome_do_produto": self.nome_do_produto,
-            "fornecedor": self.fornecedor,
-            "estado_fisico": self.estado_fisico,
-            "local_de_armazenamento": self.local_de_armazenamento,
-            "substancias": self.substancias,
-            "perigos_fisicos": self.perigos_fisicos,
-            "perigos_saude": self.perigos_saude,
-            "perigos_meio_ambiente": self.perigos_meio_ambiente,
-            "palavra_de_perigo": self.palavra_de_perigo,
-            "categoria": self.categoria,
-            "status": self.status,
-            "created_by_user_id": str(self.created_by_user_id) if self.created_by_user_id else None,  # 👈 fix
-            "pdf_url": self.pdf_url,
-            "pdf_s3_key": self.pdf_s3_key,
-            "empresa": self.empresa,
-            "file_hash": self.file_hash,
-            "created_at": self.created_at.isoformat() if isinstance(self.created_at, datetime) else self.created_at
-        }
-        if self._id:
-            product_dict["_id"] = str(self._id)  # 👈 fix
+        product_dict = super().to_dict()
+        product_dict["nome_normalizado"] = self.normalize_name(self.nome_do_produto)
         return product_dict
 
+    @staticmethod
+    def normalize_name(name):
+        """
+        Chave usada para comparar nomes de produtos: sem acentos, em caixa
+        baixa (casefold) e com espaços colapsados.
+        Ex.: "  Álcool   ETÍLICO " -> "alcool etilico"
+        """
+        if not name or not isinstance(name, str):
+            return None
+        decomposed = unicodedata.normalize('NFKD', name)
+        without_accents = ''.join(c for c in decomposed if not unicodedata.combining(c))
+        return re.sub(r'\s+', ' ', without_accents.casefold()).strip() or None
+
     @classmethod
-    def from_dict(cls, data):
-        created_at_data = data.get("created_at")
-        if isinstance(created_at_data, str):
-            try:
-                created_at_data = datetime.fromisoformat(created_at_data)
-            except ValueError:
-                pass
-
-        return cls(
-            codigo=data.get('codigo'),
-            quantidade_armazenada=data.get('quantidade_armazenada'), # Novo campo
-            unidade_embalagem=data.get('unidade_embalagem'),         # Novo campo
-            nome_do_produto=data.get('nome_do_produto'),
-            fornecedor=data.get('fornecedor'),
-            estado_fisico=data.get('estado_fisico'),
-            local_de_armazenamento=data.get('local_de_armazenamento'),
-            substancias=data.get('substancias', []),
-            perigos_fisicos=data.get('perigos_fisicos', []),
-            perigos_saude=data.get('perigos_saude', []),
-            perigos_meio_ambiente=data.get('perigos_meio_ambiente', []),
-            palavra_de_perigo=data.get('palavra_de_perigo'),
-            categoria=data.get('categoria'),
-            status=data.get('status'),
-            created_by_user_id=data.get('created_by_user_id'),
-            pdf_url=data.get('pdf_url'),
-            pdf_s3_key=data.get('pdf_s3_key'),
-            empresa=data.get('empresa'),
-            file_hash=data.get('file_hash'),
-            _id=data.get('_id'),
-            created_at=created_at_data
-        )
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class PdfMetadata:
+    """Metadados dos PDFs enviados via /upload (coleção `pdf_metadata`)."""
+    collection_name = 'pdf_metadata'
+
+    indexes = [
+        IndexModel([("associated_product_id", ASCENDING)], name="associated_product_id_1"),
+    ]
+
+    @classmethod
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class Counter:
+    """
+    Sequências atômicas (ex.: código FDS dos produtos).
+    Cada documento tem o formato {"_id": <nome da sequência>, "seq": <último valor alocado>}.
+    """
+    collection_name = 'counters'
+
+    @classmethod
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class DashboardStats:
+    """
+    Estatísticas do painel mantidas incrementalmente (app/dashboard_stats.py).
+    Um documento global ({"_id": "global"}) e um por empresa
+    ({"_id": "empresa:<nome>"}); a leitura é sempre por _id.
+    """
+    collection_name = 'dashboard_stats'
+
+    @classmethod
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class ChangeVersion:
+    """
+    Versões de alteração usadas nos ETags (app/etags.py).
+    Formato: {"_id": <escopo, ex.: "products" ou "products:<empresa>">, "v": <n>}.
+    """
+    collection_name = 'change_versions'
+
+    @classmethod
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class StatsSnapshot:
+    """
+    Fotografias periódicas das estatísticas do painel, por empresa (empresa
+    None = todas), para gráficos de tendência (app/stats_snapshots.py).
+    Há dois níveis: "hour" (expira via `expires_at`) e "day" (mantido).
+    """
+    collection_name = 'stats_snapshots'
+
+    indexes = [
+        IndexModel([("empresa", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)],
+                   name="empresa_1_granularity_1_bucket_1", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ]
+
+    @classmethod
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class TokenVersion:
+    """
+    Versão mínima aceita dos tokens JWT de cada usuário que teve os tokens
+    revogados (troca de papel, senha ou exclusão).
+    Formato: {"_id": <user_id>, "v": <versão>}. Usuários nunca revogados não
+    aparecem aqui, por isso a coleção é pequena e lida inteira pelos workers.
+    """
+    collection_name = 'token_versions'
+
+    @classmethod
+    def collection(cls):
+        from . import db
+        return db[cls.collection_name]
+
+
+class UserSession:
+    """
+    Sessões de refresh token (coleção `sessions`). Guarda apenas o hash do
+    token; o documento é removido pelo MongoDB ao atingir `expires_at`.
+    """
+    collection_name = 'sessions'
+
+    indexes = [
+        IndexModel([("token_hash", ASCENDING)], name="token_hash_1", unique=True),
+        IndexModel([("previous_hash", ASCENDING)], name="previous_hash_1", sparse=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_1"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_1", expireAfterSeconds=0),
+    ]
 
     @classmethod
     def collection(cls):
@@ -0,0 +1,111 @@
+# app/pagination.py
+
+import base64
+from bson import json_util
+
+# Cabeçalho HTTP onde as listagens paginadas devolvem o cursor da próxima página.
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def parse_limit(raw_value, default, maximum):
+    """
+    Converte o parâmetro `limit` da query string em inteiro entre 1 e `maximum`.
+    Lança ValueError para valores não numéricos.
+    """
+    if raw_value in (None, ''):
+        return default
+    limit = int(raw_value)
+    if limit < 1:
+        raise ValueError("limit deve ser maior que zero")
+    return min(limit, maximum)
+
+
+def parse_sort(raw_value, allowed_keys, default):
+    """
+    Interpreta o parâmetro `sort` (ex.: 'nome_do_produto' ou '-codigo').
+
+    `allowed_keys` mapeia o nome público para o campo no MongoDB; apenas
+    chaves dessa lista (cobertas por índices) são aceitas.
+    Retorna (campo, direção) com direção 1 ou -1.
+    """
+    raw_value = (raw_value or default).strip()
+    direction = -1 if raw_value.startswith('-') else 1
+    key = raw_value.lstrip('-+')
+    if key not in allowed_keys:
+        raise ValueError(f"Ordenação inválida: '{key}'. Use uma de: {', '.join(sorted(allowed_keys))}")
+    return allowed_keys[key], direction
+
+
+def parse_fields(raw_value, allowed_fields, required=()):
+    """
+    Monta a projeção do MongoDB a partir do parâmetro `fields=a,b,c`.
+    Retorna None (documento completo) quando o parâmetro não é informado.
+    """
+    if not raw_value:
+        return None
+    fields = [f.strip() for f in raw_value.split(',') if f.strip()]
+    invalid = [f for f in fields if f not in allowed_fields]
+    if invalid:
+        raise ValueError(f"Campos inválidos: {', '.join(invalid)}")
+    projection = {allowed_fields[f]: 1 for f in fields}
+    for field in required:
+        projection[field] = 1
+    return projection
+
+
+def encode_cursor(sort_field, direction, doc):
+    """Gera o token opaco que aponta para o documento seguinte a `doc`."""
+    payload = {"s": sort_field, "d": direction, "id": doc["_id"]}
+    if sort_field != '_id':
+        payload["v"] = doc.get(sort_field)
+    raw = json_util.dumps(payload).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_field, direction):
+    """
+    Decodifica um token gerado por `encode_cursor` e o transforma no filtro
+    de keyset correspondente. Lança ValueError se o token for inválido ou
+    tiver sido gerado para outra ordenação.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Cursor de paginação inválido")
+
+    if not isinstance(payload, dict) or payload.get("s") != sort_field or payload.get("d") != direction:
+        raise ValueError("Cursor de paginação não corresponde à ordenação solicitada")
+
+    op = "$lt" if direction == -1 else "$gt"
+    last_id = payload.get("id")
+    if sort_field == '_id':
+        return {"_id": {op: last_id}}
+    last_value = payload.get("v")
+    return {"$or": [
+        {sort_field: {op: last_value}},
+        {sort_field: last_value, "_id": {op: last_id}},
+    ]}
+
+
+def keyset_page(collection, query, projection, sort_field, direction, limit, cursor_token=None):
+    """
+    Executa uma consulta paginada por keyset.
+
+    Busca `limit + 1` documentos para saber se existe próxima página sem
+    precisar de `count_documents`. Retorna (documentos, próximo_cursor|None).
+    """
+    if cursor_token:
+        keyset = decode_cursor(cursor_token, sort_field, direction)
+        query = {"$and": [query, keyset]} if query else keyset
+
+    sort = [(sort_field, direction)]
+    if sort_field != '_id':
+        sort.append(('_id', direction))
+
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort_field, direction, docs[-1])
+    return docs, next_cursor
@@ -0,0 +1,219 @@
+# app/passwords.py
+# Hash e verificação de senhas fora da thread da requisição.
+#
+# O KDF é propositalmente lento; executá-lo na thread do worker faz uma
+# rajada de logins travar o worker inteiro (inclusive health checks). Aqui o
+# trabalho vai para um ProcessPoolExecutor limitado: quando há tarefas demais
+# pendentes, a requisição é recusada na hora (503 + Retry-After) em vez de
+# entrar numa fila sem fim.
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Método/parâmetros do KDF no formato do Werkzeug (ex.: "scrypt:32768:8:1",
+# "pbkdf2:sha256:600000"). Hashes antigos são refeitos no próximo login.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# 0 executa o hash na própria thread (útil em desenvolvimento)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# Tarefas aceitas além das que já estão executando
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", max(PASSWORD_HASH_WORKERS, 1) * 4))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 2))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(PASSWORD_HASH_WORKERS, 1) + PASSWORD_HASH_QUEUE_LIMIT)
+
+
+class PasswordHasherBusy(Exception):
+    """Fila de hashing cheia (ou tarefa expirou): o cliente deve tentar de novo."""
+
+    def __init__(self, retry_after=PASSWORD_HASH_RETRY_AFTER):
+        super().__init__("Serviço de autenticação sobrecarregado")
+        self.retry_after = retry_after
+
+
+def _get_pool():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            # "spawn": processos limpos, sem herdar threads/conexões do worker
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _release_when_done(futures):
+    """
+    Devolve a vaga da fila só quando todas as tarefas terminarem ou forem
+    canceladas. Liberar no timeout deixaria o KDF ainda rodando (ou na fila
+    do pool) fora da conta de PASSWORD_HASH_QUEUE_LIMIT.
+    """
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            pending[0] -= 1
+            if pending[0]:
+                return
+        _slots.release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _submit_all(fn, calls):
+    """Envia `fn(*args)` ao pool para cada args. A vaga já adquirida passa a ser liberada pelas tarefas."""
+    futures = []
+    try:
+        for args in calls:
+            futures.append(_get_pool().submit(fn, *args))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        if not futures:
+            _slots.release()
+        else:
+            _release_when_done(futures)
+        raise
+    _release_when_done(futures)
+    return futures
+
+
+def _cancel(futures):
+    """Cancela o que ainda não começou a executar (o restante termina e libera a vaga)."""
+    for future in futures:
+        future.cancel()
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        logging.warning("Fila de hashing de senhas cheia: requisição recusada.")
+        raise PasswordHasherBusy()
+    if PASSWORD_HASH_WORKERS <= 0:
+        try:
+            return fn(*args)
+        finally:
+            _slots.release()
+    futures = []
+    try:
+        futures = _submit_all(fn, [args])
+        return futures[0].result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        logging.warning("Hash de senha excedeu o tempo limite.")
+        _cancel(futures)
+        raise PasswordHasherBusy()
+    except BrokenProcessPool:
+        logging.error("Pool de hashing de senhas quebrado; será recriado.")
+        _discard_pool()
+        raise PasswordHasherBusy()
+
+
+def hash_password(password):
+    """Gera o hash da senha com PASSWORD_HASH_METHOD."""
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def hash_passwords(passwords):
+    """
+    Gera os hashes de várias senhas (importações em massa) em sub-lotes de
+    PASSWORD_HASH_WORKERS senhas, um por processo do pool. Cada sub-lote ocupa
+    sua própria vaga da fila: um login que chega durante a importação espera
+    no máximo um sub-lote no pool, não o lote inteiro. Se nenhuma vaga abrir
+    em PASSWORD_HASH_TIMEOUT, o restante do lote é recusado.
+    """
+    passwords = list(passwords)
+    size = max(PASSWORD_HASH_WORKERS, 1)
+    hashes = []
+    for start in range(0, len(passwords), size):
+        hashes.extend(_hash_chunk(passwords[start:start + size]))
+    return hashes
+
+
+def _hash_chunk(passwords):
+    # A importação pode esperar por uma vaga; logins não (acquire sem bloqueio)
+    if not _slots.acquire(timeout=PASSWORD_HASH_TIMEOUT):
+        logging.warning("Fila de hashing de senhas cheia: lote recusado.")
+        raise PasswordHasherBusy()
+    calls = [(password, PASSWORD_HASH_METHOD) for password in passwords]
+    if PASSWORD_HASH_WORKERS <= 0:
+        try:
+            return [generate_password_hash(*args) for args in calls]
+        finally:
+            _slots.release()
+    futures = []
+    try:
+        futures = _submit_all(generate_password_hash, calls)
+        deadline = time.monotonic() + PASSWORD_HASH_TIMEOUT
+        return [future.result(timeout=max(0, deadline - time.monotonic())) for future in futures]
+    except FutureTimeoutError:
+        logging.warning("Hash de senhas em lote excedeu o tempo limite.")
+        _cancel(futures)
+        raise PasswordHasherBusy()
+    except BrokenProcessPool:
+        logging.error("Pool de hashing de senhas quebrado; será recriado.")
+        _discard_pool()
+        raise PasswordHasherBusy()
+
+
+def verify_password(password_hash, password):
+    """Confere a senha contra o hash armazenado."""
+    return _run(check_password_hash, password_hash, password)
+
+
+def parse_method(method):
+    """
+    Normaliza um método do Werkzeug preenchendo os parâmetros omitidos com os
+    padrões da biblioteca: "scrypt" -> ("scrypt", 32768, 8, 1),
+    "pbkdf2:sha256" -> ("pbkdf2", "sha256", DEFAULT_PBKDF2_ITERATIONS).
+    None se não reconhecido.
+    """
+    name, *args = (method or "").split(":")
+    try:
+        if name == "scrypt":
+            n, r, p = (int(a) for a in args) if args else (2 ** 15, 8, 1)
+            return ("scrypt", n, r, p)
+        if name == "pbkdf2":
+            hash_name = args[0] if args else "sha256"
+            iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+            return ("pbkdf2", hash_name, iterations)
+    except ValueError:
+        return None
+    return None
+
+
+def needs_rehash(password_hash):
+    """
+    True se o hash foi gerado com algoritmo ou parâmetros (custo) diferentes
+    dos de PASSWORD_HASH_METHOD. Parâmetros omitidos no hash ou na política
+    valem como os padrões do Werkzeug.
+    """
+    stored = parse_method((password_hash or "").split("$", 1)[0])
+    return stored is None or stored != parse_method(PASSWORD_HASH_METHOD)
+
+
+def shutdown():
+    """Encerra o pool (usado em testes e benchmarks)."""
+    _discard_pool()
@@ -1,17 +1,48 @@
 # app/routes/dashboard_routes.py
 
-from flask import jsonify, Blueprint
-from flask_jwt_extended import jwt_required
+from flask import jsonify, Blueprint, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
 from flask_cors import cross_origin
 # Importa os modelos e utils necessários
-from app.models import Product, User # Manter 'User' se for necessário para 'role_required', mas os dados de estatística serão removidos
-from app.utils import ROLES, role_required
+from app.dashboard_stats import format_dashboard_stats, load_dashboard_stats, parse_date_bound
+from app.etags import DASHBOARD_SCOPE, compute_etag, not_modified, products_scope, with_etag
+from app.stats_snapshots import SERIES_INTERVALS, default_interval, load_series
+from datetime import datetime, timedelta, timezone
+from app.utils import ROLES, role_required, load_principal
 import traceback
 
 # Cria o Blueprint para as rotas do dashboard
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Valor de `empresa=` que pede o painel de todas as empresas
+ALL_COMPANIES = "*"
+
+
+def _dashboard_scope(args):
+    """
+    Escopo do painel a partir da query string:
+    - empresa: padrão = empresa do usuário logado; `*` = todas
+    - local: local_de_armazenamento
+    - from / to: período de cadastro (created_at), em ISO 8601
+    """
+    empresa = args.get('empresa')
+    if empresa is None:
+        principal = load_principal(get_jwt_identity()) or {}
+        empresa = principal.get('empresa')
+    elif empresa == ALL_COMPANIES:
+        empresa = None
+    created_from = parse_date_bound(args.get('from'))
+    created_to = parse_date_bound(args.get('to'), end=True)
+    if created_from and created_to and created_from >= created_to:
+        raise ValueError("período vazio")
+    return {
+        "empresa": empresa or None,
+        "local": args.get('local') or None,
+        "created_from": created_from,
+        "created_to": created_to,
+    }
+
 @dashboard_bp.route('/stats', methods=['GET', 'OPTIONS'])
 @cross_origin()
 @jwt_required()
@@ -20,193 +51,34 @@ def get_dashboard_stats():
     """
     Retorna estatísticas agregadas e dados para gráficos para o painel de controle,
     focando em dados de Produto conforme o novo layout (2 Cards + 5 Gráficos).
+
+    Os números vêm do documento materializado em `dashboard_stats`, mantido
+    pelas rotas de produtos (ver app/dashboard_stats.py): uma leitura por _id
+    em vez de agregar a coleção de produtos a cada carregamento. Filtros de
+    local e período agregam apenas os produtos do escopo.
+
+    Com If-None-Match, responde 304 após ler só as versões de alteração do
+    escopo (sem consultar estatísticas nem gerar JSON).
     """
     try:
-        # --- ESTATÍSTICAS SIMPLES (CARDS MANTIDOS) ---
-        
-        # 1. NÚMERO DE PRODUTOS CADASTRADOS (Card 1)
-        total_products = Product.collection().count_documents({})
-        
-        # 2. ÚLTIMO PRODUTO APROVADO (Card 2)
-        # Nota: O layout atual usa "Último Produto Aprovado". Se você quiser "Último Produto Cadastrado",
-        # basta remover o filtro {"status": "aprovado"}. Mantendo o original por segurança.
-        last_approved_product_doc = Product.collection().find_one(
-            {"status": "aprovado"},
-            sort=[('_id', -1)]
-        )
-        last_approved_product_name = (
-            last_approved_product_doc.get("nome_do_produto", "Nome não encontrado")
-            if last_approved_product_doc else "Nenhum"
-        )
-        
-            
-        # --- DADOS PARA GRÁFICOS (5 GRÁFICOS RESTANTES) ---
-
-        # 1. GRÁFICO: Contagem de Produtos por Status
-        product_status_pipeline = [
-            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        products_by_status = list(Product.collection().aggregate(product_status_pipeline))
-
-        # 2. GRÁFICO: QTADE DE PRODUTOS CADASTRADOS POR EMPRESA
-        products_by_company_pipeline = [
-            {"$group": {"_id": "$empresa", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        products_by_company = list(Product.collection().aggregate(products_by_company_pipeline))
-        
-        # 3. GRÁFICO: QUANTIDADE DE PRODUTOS POR GHS
-        products_by_pictogram_pipeline = [
-            # 1. Combina os arrays e garante que cada perigo seja contado apenas uma vez por produto
-            {"$project": {
-                "todos_os_perigos": {
-                    "$setUnion": [
-                        {"$ifNull": ["$perigos_fisicos", []]},
-                        {"$ifNull": ["$perigos_saude", []]},
-                        {"$ifNull": ["$perigos_meio_ambiente", []]}
-                    ]
-                }
-            }},
-            # 2. Desconstrói o array 'todos_os_perigos' para contar cada perigo individualmente
-            {"$unwind": "$todos_os_perigos"},
-            # 3. Agrupa pelo nome do perigo e conta
-            {"$group": {"_id": "$todos_os_perigos", "count": {"$sum": 1}}},
-            # 4. Renomeia o campo _id para 'pictograma' e remove o _id antigo
-            {"$project": {"_id": 0, "pictograma": "$_id", "quantidade_produtos": "$count"}},
-            # 5. Ordena pela quantidade em ordem decrescente (opcional)
-            {"$sort": {"quantidade_produtos": -1}}
-        ]
-        products_by_pictogram = list(Product.collection().aggregate(products_by_pictogram_pipeline))
-        
-        # 4. GRÁFICO: ESTADO FÍSICO (Pizza)
-        physical_state_pipeline = [
-            {"$group": {"_id": "$estado_fisico", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ]
-        products_by_physical_state = list(Product.collection().aggregate(physical_state_pipeline))
-
-        # 5. GRÁFICO: CLASSIFICAÇÃO DE PERIGO POR PRODUTO
-        danger_classification_pipeline = [
-            # 1. Cria campos booleanos para indicar a presença de cada tipo de perigo.
-            #    Um produto é contado na categoria se o array respectivo não for vazio.
-            {"$addFields": {
-                "is_perigo_fisico": {
-                    "$cond": [{"$gt": [{"$size": {"$ifNull": ["$perigos_fisicos", []]}}, 0]}, 1, 0]
-                },
-                "is_perigo_saude": {
-                    "$cond": [{"$gt": [{"$size": {"$ifNull": ["$perigos_saude", []]}}, 0]}, 1, 0]
-                },
-                "is_perigo_meio_ambiente": {
-                    "$cond": [{"$gt": [{"$size": {"$ifNull": ["$perigos_meio_ambiente", []]}}, 0]}, 1, 0]
-                },
-            }},
-
-            # 2. Agrupa (acumula) a soma total de produtos que possuem cada tipo de perigo.
-            #    Como só há um grupo (null), ele soma os indicadores (1 ou 0) de todos os documentos.
-            {"$group": {
-                "_id": None, # Agrupa todos os documentos em um só resultado
-                "Físico": {"$sum": "$is_perigo_fisico"},
-                "À Saúde": {"$sum": "$is_perigo_saude"},
-                "Ao Meio Ambiente": {"$sum": "$is_perigo_meio_ambiente"},
-            }},
-
-            # 3. Reestrutura para o formato de array (Labels e Data)
-            #    Este formato é ideal para ser consumido por um gráfico de barras simples no frontend.
-            {"$project": {
-                "_id": 0,
-                "dados": [
-                    {"tipo": "Físico", "quantidade": "$Físico"},
-                    {"tipo": "À Saúde", "quantidade": "$À Saúde"},
-                    {"tipo": "Ao Meio Ambiente", "quantidade": "$Ao Meio Ambiente"},
-                ]
-            }},
-
-            # 4. Desconstrói o array "dados" para ter um documento por categoria (opcional, mas limpa a saída)
-            {"$unwind": "$dados"},
-
-            # 5. Finaliza e Projeta os campos finais (tipo, quantidade)
-            {"$project": {
-                "_id": 0,
-                "tipo": "$dados.tipo",
-                "quantidade": "$dados.quantidade",
-            }}
-        ]
-
-        danger_classification = list(Product.collection().aggregate(danger_classification_pipeline))
-        
-        # 6. GRÁFICO: Quantidade Armazenada por Empresa por Estado Físico
-        storage_by_company_and_state_pipeline = [
-            # 1. Pré-filtragem e Conversão (Essencial)
-            {"$match": {
-                # Garante que 'empresa' e 'estado_fisico' existam
-                "empresa": {"$exists": True, "$ne": None, "$ne": ""},
-                "estado_fisico": {"$exists": True, "$ne": None, "$ne": ""},
-                "quantidade_armazenada": {"$exists": True, "$ne": None}
-            }},
-            {"$addFields": {
-                # Tenta converter para número (double). Se falhar ou for null/vazio, usa 0.
-                "quantidade_armazenada_num": {
-                    "$convert": {
-                        "input": "$quantidade_armazenada",
-                        "to": "double",
-                        "onError": 0,
-                        "onNull": 0
-                    }
-                },
-                # ** NOVO: Normaliza o estado físico para MAIÚSCULAS para garantir agrupamento correto **
-                "estado_fisico_normalizado": {"$toUpper": "$estado_fisico"} 
-            }},
-            # Remove documentos com quantidade zero APÓS a conversão.
-            {"$match": {"quantidade_armazenada_num": {"$gt": 0}}}, 
-            
-            # 2. Agrupamento Principal
-            {"$group": {
-                # ** ATUALIZADO: Agrupa por empresa e pelo estado físico NORMALIZADO **
-                "_id": {"empresa": "$empresa", "estado": "$estado_fisico_normalizado"}, 
-                "total_quantidade": {"$sum": "$quantidade_armazenada_num"} 
-            }},
-            # 3. Ordenação
-            {"$sort": {"_id.empresa": 1, "total_quantidade": -1}},
-
-            # 4. Reestruturação para o Gráfico de Barras Agrupadas
-            {"$group": {
-                "_id": "$_id.empresa", 
-                "dados_por_estado": {
-                    "$push": {
-                        # ** ATUALIZADO: Usa o campo normalizado para o estado físico no resultado **
-                        "estado_fisico": "$_id.estado", 
-                        "quantidade": "$total_quantidade"
-                    }
-                }
-            }},
-            # 5. Renomear e Finalizar
-            {"$project": {
-                "_id": 0,
-                "empresa": "$_id",
-                "dados_por_estado": 1
-            }}
-        ]
-                
-        storage_by_company_and_state = list(Product.collection().aggregate(storage_by_company_and_state_pipeline))
-
-
-        # --- ESTRUTURA FINAL DOS DADOS ---
-        stats = {
-            # Estatísticas Simples
-            "total_products": total_products,
-            "last_approved_product": last_approved_product_name,
-            
-            # Dados para Gráficos
-            "products_by_status": products_by_status, 
-            "products_by_company": products_by_company, 
-            "products_by_pictogram": products_by_pictogram, 
-            "products_by_physical_state": products_by_physical_state, 
-            "storage_by_company_and_state": storage_by_company_and_state,
-            "danger_classification": danger_classification 
-        }
+        scope = _dashboard_scope(request.args)
+    except ValueError:
+        return jsonify({"msg": "Filtro de período inválido. Use datas ISO 8601 em 'from' e 'to'."}), 400
 
-        return jsonify(stats), 200
+    try:
+        etag, versions = compute_etag((products_scope(scope["empresa"]), DASHBOARD_SCOPE), sorted(scope.items()))
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        stats = format_dashboard_stats(load_dashboard_stats(**scope, version=versions))
+        stats["scope"] = {
+            "empresa": scope["empresa"],
+            "local": scope["local"],
+            "from": scope["created_from"].isoformat() if scope["created_from"] else None,
+            "to": scope["created_to"].isoformat() if scope["created_to"] else None,
+        }
+        return with_etag(jsonify(stats), etag), 200
 
     except Exception as e:
         # ---------------------------------------
@@ -225,4 +97,48 @@ def get_dashboard_stats():
             "status": "error",
             "message": f"Erro interno ao processar estatísticas: {str(e)}",
             "detail": traceback.format_exc().splitlines()[-1] # Retorna a última linha do erro
-        }), 500 # Define o código de status HTTP para 500
\ No newline at end of file
+        }), 500 # Define o código de status HTTP para 500
+
+
+# Período padrão da série de tendências
+TRENDS_DEFAULT_DAYS = 30
+
+
+@dashboard_bp.route('/trends', methods=['GET', 'OPTIONS'])
+@cross_origin()
+@jwt_required()
+@role_required([ROLES['1'], ROLES['2']])
+def get_dashboard_trends():
+    """
+    Série histórica do painel (total, status, pictogramas GHS, estado físico
+    e quantidade armazenada) a partir de `stats_snapshots`.
+
+    Parâmetros: empresa (como em /stats), from/to (padrão: últimos 30 dias) e
+    interval = hour | day | week | month (padrão conforme o período).
+    """
+    try:
+        scope = _dashboard_scope(request.args)
+    except ValueError:
+        return jsonify({"msg": "Filtro de período inválido. Use datas ISO 8601 em 'from' e 'to'."}), 400
+
+    end = scope["created_to"] or datetime.now(timezone.utc)
+    start = scope["created_from"] or end - timedelta(days=TRENDS_DEFAULT_DAYS)
+    if start >= end:
+        return jsonify({"msg": "Filtro de período inválido. Use datas ISO 8601 em 'from' e 'to'."}), 400
+    interval = request.args.get('interval') or default_interval(start, end)
+    if interval not in SERIES_INTERVALS:
+        return jsonify({"msg": f"Intervalo inválido. Use: {', '.join(SERIES_INTERVALS)}."}), 400
+
+    try:
+        points = load_series(scope["empresa"], start, end, interval)
+    except Exception as e:
+        logging.error(f"Erro ao carregar tendências do painel: {e}")
+        return jsonify({"status": "error", "message": f"Erro interno ao processar tendências: {str(e)}"}), 500
+
+    return jsonify({
+        "empresa": scope["empresa"],
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "interval": interval,
+        "points": points,
+    }), 200
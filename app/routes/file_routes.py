@@ -0,0 +1,38 @@
+# app/routes/file_routes.py
+# Entrega dos arquivos gravados pelo backend de armazenamento local
+# (STORAGE_BACKEND=local). Com S3 o download vai direto ao bucket pela URL
+# pré-assinada e esta rota não é usada.
+
+import os
+from flask import Blueprint, jsonify, request, send_file
+
+from app.storage import LocalStorage, get_storage
+
+file_bp = Blueprint('files', __name__)
+
+
+@file_bp.route('/files/<path:key>', methods=['GET', 'HEAD'])
+def serve_file(key):
+    """
+    Serve o arquivo se o token de `LocalStorage.presign` for válido.
+    `send_file` com `conditional=True` responde a Range (206) e If-Modified-Since
+    (304), e o servidor WSGI pode usar sendfile para o corpo da resposta.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        return jsonify({"message": "Arquivo não encontrado"}), 404
+
+    disposition = storage.verify_token(key, request.args.get('token', ''))
+    if disposition is None:
+        return jsonify({"message": "Link de download inválido ou expirado"}), 403
+
+    try:
+        path = storage.path_for(key)
+    except ValueError:
+        return jsonify({"message": "Arquivo não encontrado"}), 404
+    if not os.path.isfile(path):
+        return jsonify({"message": "Arquivo não encontrado"}), 404
+
+    response = send_file(path, mimetype='application/pdf', conditional=True, max_age=0)
+    response.headers['Content-Disposition'] = disposition
+    return response
@@ -8,7 +8,6 @@ import logging
 import re
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
-import boto3
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from datetime import datetime, timezone
@@ -16,11 +15,16 @@ import uuid
 from flask_jwt_extended import get_jwt_identity
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
-from app.models import User, Product
-from app.utils import ROLES, role_required
+from app.models import Product
+from app.utils import ROLES, role_required, load_principal
 from app.security_config import limiter
 from flask_jwt_extended import jwt_required
-from app.utils import get_aws_client
+from app.upload_pipeline import UploadRejected, upload_pdf
+from app.storage import get_storage
+from app.routes.product_routes import invalidate_download_cache
+from app.streaming import STREAM_BATCH_SIZE, stream_json_array, wants_stream
+from app.etags import PRODUCTS_SCOPE, bump_change_versions, compute_etag, not_modified, with_etag
+from app.versioning import bump_version
 
 load_dotenv()
 
@@ -57,10 +61,9 @@ pdf_bp = Blueprint("pdf", __name__)
 
 CORS(pdf_bp, resources={r"/*": {"origins": "*"}})
 
-# Variáveis globais que serão inicializadas pela função init_services
-# Elas começam como None e recebem as conexões ativas quando o app inicia.
-s3_client = None
-s3_bucket_name = os.getenv("AWS_BUCKET_NAME")
+# Variável global que será inicializada pela função init_services.
+# Ela começa como None e recebe a conexão ativa quando o app inicia.
+# O S3 é acessado pelo serviço compartilhado de app/storage.py.
 pdf_metadata_collection = None
 
 
@@ -73,17 +76,15 @@ def init_services():
     Esta função é chamada uma vez quando a aplicação Flask é iniciada.
     """
     # A palavra-chave 'global' nos permite modificar as variáveis declaradas fora desta função.
-    global s3_client, pdf_metadata_collection
+    global pdf_metadata_collection
     
     logging.info("Inicializando conexões com serviços externos (MongoDB, S3)...")
 
-    # 1. Conexão com AWS S3: Só tenta conectar se ainda não houver um cliente.
-    if not s3_client:
-        s3_client = get_aws_client('s3')
-        if s3_client:
-            logging.info("Cliente AWS S3 inicializado com sucesso.")
-        else:
-            logging.error("Falha ao inicializar o cliente AWS S3. Verifique as credenciais e configurações no .env.")
+    # 1. Serviço de armazenamento (S3 ou disco local): criado uma vez por processo.
+    if get_storage():
+        logging.info("Serviço de armazenamento inicializado com sucesso.")
+    else:
+        logging.error("Falha ao inicializar o cliente AWS S3. Verifique as credenciais e configurações no .env.")
 
     # 2. Conexão com MongoDB: Só tenta conectar se a coleção não estiver definida.
     if not pdf_metadata_collection:
@@ -116,6 +117,14 @@ def is_valid_objectid(id_str):
         return False
 
 
+def _serialize_pdf_row(p_data):
+    """Prepara um produto com PDF para a resposta de /pdfs."""
+    p_data['_id'] = str(p_data['_id'])
+    if 'pdf_url' in p_data:
+        p_data['url_download'] = p_data.pop('pdf_url')
+    return p_data
+
+
 # ============================================================
 # ROTAS
 # ============================================================
@@ -134,7 +143,8 @@ def upload_file(product_id):
     if not is_valid_objectid(product_id):
         return jsonify({"error": "ID de produto inválido"}), 400
 
-    if s3_client is None or s3_bucket_name is None:
+    storage = get_storage()
+    if storage is None:
         logging.error("Configuração do AWS S3 inválida no momento da requisição.")
         return jsonify({"error": "Configuração do serviço de armazenamento inválida"}), 500
 
@@ -156,9 +166,13 @@ def upload_file(product_id):
         unique_s3_file_name = f"{uuid.uuid4()}{file_extension}"
         file_key = f"uploads/{unique_s3_file_name}"
 
-        s3_client.upload_fileobj(file, s3_bucket_name, file_key)
+        # Validação (assinatura PDF/tamanho), hash e envio em uma única leitura
+        try:
+            upload = upload_pdf(file, file_key, storage=storage)
+        except UploadRejected as e:
+            return jsonify({"error": e.message}), e.status_code
 
-        file_url = f"https://{s3_bucket_name}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{file_key}"
+        file_url = upload["url"]
 
         # 2. Criação dos metadados (como já estava)
         current_user_id = get_jwt_identity()
@@ -172,30 +186,39 @@ def upload_file(product_id):
             "url": file_url,
             "uploaded_at": datetime.now(timezone.utc),
             "uploaded_by_user_id": ObjectId(current_user_id),
-            "associated_product_id": ObjectId(product_id) 
+            "associated_product_id": ObjectId(product_id),
+            "file_hash": upload["file_hash"],
+            "size": upload["size"]
         }
 
         insert_result = pdf_metadata_collection.insert_one(pdf_document_metadata)
         
         # ALTERAÇÃO 3: Atualizar o documento do produto com a URL do PDF.
-        # Esta é a etapa crucial que estava faltando.
+        # Esta é a etapa crucial que estava faltando. A troca do arquivo também
+        # incrementa a versão: edições baseadas na versão anterior recebem 409.
         update_result = Product.collection().update_one(
             {"_id": ObjectId(product_id)},
-            {"$set": {
+            bump_version({"$set": {
                 "pdf_url": file_url,
                 "pdf_s3_key": file_key,
                 "pdf_metadata_id": insert_result.inserted_id,
+                "file_hash": upload["file_hash"],
                 "updated_at": datetime.now(timezone.utc)
-            }}
+            }})
         )
 
+        if update_result.matched_count:
+            bump_change_versions(PRODUCTS_SCOPE)
+
         # Se nenhum produto foi encontrado com o ID fornecido
         if update_result.matched_count == 0:
             logging.warning(f"Upload bem-sucedido, mas produto com ID {product_id} não foi encontrado para associação.")
             # Opcional: deletar o arquivo do S3 e os metadados se o produto não existe
-            s3_client.delete_object(Bucket=s3_bucket_name, Key=file_key)
+            storage.delete(file_key)
             pdf_metadata_collection.delete_one({"_id": insert_result.inserted_id})
             return jsonify({"error": "Produto não encontrado"}), 404
+        # O produto passou a apontar para outro arquivo: descarta o link em cache
+        invalidate_download_cache(product_id)
 
         return jsonify({
             "message": "Arquivo enviado e associado ao produto com sucesso",
@@ -227,20 +250,24 @@ def get_pdfs():
         return jsonify({"error": "Erro de autenticação"}), 401
 
     try:
-        current_user_data = User.collection().find_one(
-            {"_id": ObjectId(current_user_id_str)},
-            {"username": 1, "role": 1, "active": 1}
-        )
+        # Já carregado por role_required nesta requisição (sem nova consulta)
+        current_user = load_principal(current_user_id_str)
 
-        if not current_user_data or not current_user_data.get('active', True):
+        if not current_user or not current_user.get('active', True):
             return jsonify({"error": "Usuário não autorizado"}), 403
 
-        current_user = User.from_dict(current_user_data)
+        # O conteúdo depende dos produtos e, para analistas, de quem pergunta
+        etag, _ = compute_etag(
+            (PRODUCTS_SCOPE,), current_user['role'], current_user_id_str, sorted(request.args.items(multi=True))
+        )
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
 
         query_filter = {"pdf_url": {"$exists": True, "$ne": None}}
         projection = {}
 
-        if current_user.role == ROLES['3']:
+        if current_user['role'] == ROLES['3']:
             query_filter["status"] = "aprovado"
             projection = {
                 "_id": 1,
@@ -248,23 +275,22 @@ def get_pdfs():
                 "qtade_maxima_armazenada": 1,
                 "pdf_url": 1
             }
-        elif current_user.role == ROLES['2']:
+        elif current_user['role'] == ROLES['2']:
             query_filter["$or"] = [
                 {"status": "aprovado"},
                 {"created_by_user_id": current_user_id_str}
             ]
         # ADMIN=1 vê todos
 
-        products_with_pdfs = []
         products_cursor = Product.collection().find(query_filter, projection)
 
-        for p_data in products_cursor:
-            p_data['_id'] = str(p_data['_id'])
-            if 'pdf_url' in p_data:
-                p_data['url_download'] = p_data.pop('pdf_url')
-            products_with_pdfs.append(p_data)
+        if wants_stream(request.args):
+            products_cursor = products_cursor.batch_size(STREAM_BATCH_SIZE)
+            return with_etag(stream_json_array(_serialize_pdf_row(p_data) for p_data in products_cursor), etag)
+
+        products_with_pdfs = [_serialize_pdf_row(p_data) for p_data in products_cursor]
 
-        return jsonify(products_with_pdfs), 200
+        return with_etag(jsonify(products_with_pdfs), etag), 200
 
     except Exception as e:
         logging.error(f"Erro ao buscar PDFs: {type(e).__name__}")
@@ -285,11 +311,9 @@ def delete_pdf(pdf_id):
         if not pdf_data:
             return jsonify({"error": "PDF não encontrado"}), 404
 
-        if s3_client and 's3_file_key' in pdf_data:
-            try:
-                s3_client.delete_object(Bucket=s3_bucket_name, Key=pdf_data['s3_file_key'])
-            except Exception as e:
-                logging.error(f"Erro ao deletar do S3: {type(e).__name__}")
+        storage = get_storage()
+        if storage and 's3_file_key' in pdf_data:
+            storage.delete(pdf_data['s3_file_key'])
 
         result = pdf_metadata_collection.delete_one({"_id": ObjectId(pdf_id)})
 
@@ -312,15 +336,16 @@ def health_check():
         if pdf_metadata_collection:
             pdf_metadata_collection.find_one()
 
-        if s3_client and s3_bucket_name:
-            s3_client.head_bucket(Bucket=s3_bucket_name)
+        storage = get_storage()
+        if storage:
+            storage.head()
 
         return jsonify({
             "status": "healthy",
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "services": {
                 "mongodb": "connected" if pdf_metadata_collection else "disconnected",
-                "aws_s3": "connected" if s3_client else "disconnected"
+                "aws_s3": "connected" if storage else "disconnected"
             }
         }), 200
 
@@ -4,20 +4,94 @@ from flask_jwt_extended import get_jwt_identity, jwt_required
 import logging
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timezone
 import re
 import json
+from itertools import islice
 from app.models import Product, User
-from app.utils import ROLES, role_required, get_aws_client
-import boto3, uuid, os
+from app.utils import ROLES, role_required, load_principal
+from app.cache import TTLCache
+from app.sequences import next_product_code, peek_next_product_code
+from app.upload_pipeline import UploadRejected, upload_pdf
+from app.storage import get_storage
+from app.streaming import STREAM_BATCH_SIZE, stream_json_array, wants_stream
+from app.dashboard_stats import apply_product_change
+from app.etags import USERS_SCOPE, PRODUCTS_SCOPE, bump_change_versions, compute_etag, not_modified, \
+    product_change_scopes, with_etag
+from app.versioning import bump_version, current_version, parse_expected_version, versioned_filter
+from app.pagination import NEXT_CURSOR_HEADER, keyset_page, parse_fields, parse_limit, parse_sort
+import uuid, os
 from datetime import datetime, timezone
-import hashlib # 👈 Adicione esta linha para calcular o hash dos arquivos
 from werkzeug.utils import secure_filename # 👈 Adicione esta linha para limpar nomes de arquivos
 
 product_bp = Blueprint('product', __name__)
 
-s3_client = None
-s3_bucket_name = os.getenv("AWS_BUCKET_NAME")
+
+# Cache de nomes de criadores (user_id -> username), compartilhado entre requisições
+_creator_name_cache = TTLCache(
+    maxsize=int(os.getenv("CREATOR_NAME_CACHE_SIZE", 4096)),
+    ttl=int(os.getenv("CREATOR_NAME_CACHE_TTL", 300))
+)
+
+# Links de download: a URL pré-assinada vale DOWNLOAD_URL_EXPIRES segundos e é
+# reaproveitada enquanto restar mais que DOWNLOAD_URL_SAFETY_MARGIN de validade,
+# para que o cliente nunca receba um link prestes a expirar.
+DOWNLOAD_URL_EXPIRES = 600
+DOWNLOAD_URL_SAFETY_MARGIN = int(os.getenv("DOWNLOAD_URL_SAFETY_MARGIN", 120))
+_presigned_url_cache = TTLCache(
+    maxsize=int(os.getenv("DOWNLOAD_URL_CACHE_SIZE", 2048)),
+    ttl=max(0, DOWNLOAD_URL_EXPIRES - DOWNLOAD_URL_SAFETY_MARGIN)
+)
+# product_id -> pdf_s3_key ("" quando o produto não tem arquivo)
+_product_key_cache = TTLCache(
+    maxsize=int(os.getenv("PRODUCT_KEY_CACHE_SIZE", 4096)),
+    ttl=int(os.getenv("PRODUCT_KEY_CACHE_TTL", 60))
+)
+
+# Produtos antigos ainda sem `nome_normalizado` (até `flask backfill-names`
+# terminar). Vira False na primeira vez que nenhum for encontrado.
+_legacy_names_pending = True
+
+# Paginação da listagem de produtos
+PRODUCTS_PAGE_SIZE = int(os.getenv("PRODUCTS_PAGE_SIZE", 100))
+PRODUCTS_MAX_PAGE_SIZE = int(os.getenv("PRODUCTS_MAX_PAGE_SIZE", 500))
+
+# Chaves de ordenação aceitas (nome público -> campo). Todas são campos
+# obrigatórios do produto e possuem índice composto com _id.
+PRODUCT_SORT_KEYS = {
+    "id": "_id",
+    "codigo": "codigo",
+    "nome_do_produto": "nome_do_produto",
+    "status": "status",
+}
+
+# Campos que podem ser pedidos via `fields=` (nome público -> campo)
+PRODUCT_LIST_FIELDS = {
+    "id": "_id",
+    "codigo": "codigo",
+    "nome_do_produto": "nome_do_produto",
+    "fornecedor": "fornecedor",
+    "estado_fisico": "estado_fisico",
+    "local_de_armazenamento": "local_de_armazenamento",
+    "quantidade_armazenada": "quantidade_armazenada",
+    "unidade_embalagem": "unidade_embalagem",
+    "substancias": "substancias",
+    "perigos_fisicos": "perigos_fisicos",
+    "perigos_saude": "perigos_saude",
+    "perigos_meio_ambiente": "perigos_meio_ambiente",
+    "palavra_de_perigo": "palavra_de_perigo",
+    "categoria": "categoria",
+    "status": "status",
+    "empresa": "empresa",
+    "pdf_url": "pdf_url",
+    "created_by": "created_by_user_id",
+    "created_by_user_id": "created_by_user_id",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "version": "version",
+}
 
 # ============================================================
 # HELPERS
@@ -32,7 +106,97 @@ def _serialize_dt(value):
     return value
 
 
-def _serialize_product(doc):
+def _creator_name(user, fallback):
+    return user.get("username") or user.get("name") or fallback
+
+
+def _resolve_creator_names(user_ids):
+    """
+    Resolve o nome de exibição de vários criadores de uma só vez.
+
+    Consulta primeiro o cache em memória e busca os IDs restantes com uma
+    única consulta `$in` na coleção de usuários. IDs sem usuário correspondente
+    são resolvidos para o próprio ID (mesmo comportamento de antes).
+    """
+    names = {}
+    missing = set()
+    for raw_id in user_ids:
+        if not raw_id:
+            continue
+        key = str(raw_id)
+        if key in names or key in missing:
+            continue
+        cached = _creator_name_cache.get(key)
+        if cached is not None:
+            names[key] = cached
+        else:
+            missing.add(key)
+
+    if missing:
+        found = {}
+        lookup_failed = False
+        oids = [ObjectId(key) for key in missing if ObjectId.is_valid(key)]
+        if oids:
+            try:
+                cursor = User.collection().find({"_id": {"$in": oids}}, {"username": 1, "name": 1})
+                for user in cursor:
+                    user_key = str(user.get("_id"))
+                    found[user_key] = _creator_name(user, user_key)
+            except Exception as e:
+                logging.error(f"Erro ao resolver nomes de criadores: {e}")
+                lookup_failed = True
+        for key in missing:
+            names[key] = found.get(key, key)
+            # Após uma falha da consulta o ID é só um substituto: não vai para o cache
+            if not (lookup_failed and ObjectId.is_valid(key)):
+                _creator_name_cache.set(key, names[key])
+
+    return names
+
+
+def invalidate_creator_name(user_id):
+    """Descarta o nome em cache de um criador (ex.: após renomear o usuário)."""
+    _creator_name_cache.invalidate(str(user_id))
+
+
+def invalidate_download_cache(product_id, file_key=None):
+    """Descarta o link em cache de um produto (chamar ao trocar ou remover o PDF)."""
+    _product_key_cache.invalidate(str(product_id))
+    if file_key:
+        _presigned_url_cache.invalidate(file_key)
+
+
+def _find_product_by_name(product_name):
+    """
+    Produto com o mesmo nome normalizado. Enquanto houver produtos antigos sem
+    a chave, eles são conferidos também pela busca antiga (regex sem
+    distinção de maiúsculas), que o índice único ainda não cobre.
+    """
+    global _legacy_names_pending
+    products = Product.collection()
+    found = products.find_one({"nome_normalizado": Product.normalize_name(product_name)}, {"_id": 1})
+    if found or not _legacy_names_pending:
+        return found
+    legacy = {"nome_normalizado": {"$exists": False}}
+    if products.find_one(legacy, {"_id": 1}) is None:
+        _legacy_names_pending = False
+        return None
+    return products.find_one(
+        {**legacy, "nome_do_produto": {"$regex": f"^{re.escape(product_name)}$", "$options": "i"}},
+        {"_id": 1}
+    )
+
+
+def _record_product_change(before, after):
+    """
+    Propaga uma escrita de produto: estatísticas do painel e versões usadas
+    nos ETags (nessa ordem, depois da gravação do produto).
+    """
+    apply_product_change(before, after)
+    bump_change_versions(*product_change_scopes(before, after))
+
+
+def _serialize_product(doc, creator_names=None):
     if not doc:
         return {}
 
@@ -48,18 +212,13 @@ def _serialize_product(doc):
     if "updated_at" in p:
         p["updated_at"] = _serialize_dt(p["updated_at"])
 
-    # Nome do criador
+    # Nome do criador (resolvido em lote por _serialize_products ou, para um
+    # único documento, aqui mesmo)
     created_by_user_id = p.get("created_by_user_id")
     if created_by_user_id:
-        try:
-            _oid = created_by_user_id if isinstance(created_by_user_id, ObjectId) else ObjectId(created_by_user_id)
-            user = User.collection().find_one({"_id": _oid})
-            if user:
-                p["created_by"] = user.get("username") or user.get("name") or str(created_by_user_id)
-            else:
-                p["created_by"] = str(created_by_user_id)
-        except Exception:
-            p["created_by"] = str(created_by_user_id)
+        if creator_names is None:
+            creator_names = _resolve_creator_names([created_by_user_id])
+        p["created_by"] = creator_names.get(str(created_by_user_id), str(created_by_user_id))
 
     # 🎯 CORREÇÃO FINAL: Garante que o campo original seja sempre uma string
     if "created_by_user_id" in p and p["created_by_user_id"]:
@@ -67,6 +226,30 @@ def _serialize_product(doc):
 
     return p
 
+
+def _serialize_products(docs):
+    """
+    Serializa uma página de produtos resolvendo todos os criadores com uma
+    única consulta, em vez de uma busca por produto.
+    """
+    docs = list(docs)
+    creator_names = _resolve_creator_names(doc.get("created_by_user_id") for doc in docs)
+    return [_serialize_product(doc, creator_names) for doc in docs]
+
+
+def _iter_serialized_products(cursor, batch_size=None):
+    """
+    Serializa um cursor de produtos em lotes, para o modo streaming: cada lote
+    resolve seus criadores com uma consulta e nada além dele fica em memória.
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    iterator = iter(cursor)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield from _serialize_products(batch)
+
 # ============================================================
 # TEST ROUTE
 # ============================================================
@@ -81,19 +264,9 @@ def test_products():
 @product_bp.route('/products/next-code', methods=['GET'])
 @role_required([ROLES['1'], ROLES['2']])
 def get_next_product_code():
+    """Mostra o próximo código FDS (apenas leitura: o código é alocado na criação)."""
     try:
-        last_product = Product.collection().find_one(sort=[('_id', -1)])
-        last_code_number = 0
-
-        if last_product and 'codigo' in last_product:
-            match = re.search(r'FDS(\d+)', last_product['codigo'])
-            if match:
-                last_code_number = int(match.group(1))
-
-        new_code_number = last_code_number + 1
-        new_codigo = f"FDS{new_code_number:06d}"
-
-        return jsonify({"next_code": new_codigo}), 200
+        return jsonify({"next_code": peek_next_product_code()}), 200
 
     except Exception as e:
         return jsonify({"msg": f"Erro ao gerar o próximo código do produto: {str(e)}"}), 500
@@ -171,40 +344,12 @@ def create_product():
             "msg": f"O nome do produto ('{product_name}') não corresponde ao nome do arquivo ('{filename_without_ext}')."
         }), 409
 
-    if Product.collection().find_one({"nome_do_produto": {"$regex": f"^{re.escape(product_name)}$", "$options": "i"}}):
+    # Busca pela chave normalizada (índice único); a unicidade também é garantida
+    # pelo banco no insert, mesmo com requisições concorrentes.
+    if _find_product_by_name(product_name):
         return jsonify({"msg": f"Já existe um produto cadastrado com o nome '{product_name}'."}), 409
 
-    try:
-        sha256_hash = hashlib.sha256()
-        for byte_block in iter(lambda: pdf_file.read(4096), b""):
-            sha256_hash.update(byte_block)
-        file_hash = sha256_hash.hexdigest()
-        pdf_file.seek(0)
-        if Product.collection().find_one({"file_hash": file_hash}):
-            return jsonify({"msg": "Este arquivo FDS já foi cadastrado para outro produto."}), 409
-    except Exception as e:
-        return jsonify({"msg": f"Erro ao processar o arquivo para verificação: {str(e)}"}), 500
-
-    # 4️⃣ Geração do código do produto
-    try:
-        last_product = Product.collection().find_one(sort=[('_id', -1)])
-        last_code_number = 0
-        if last_product and 'codigo' in last_product:
-            match = re.search(r'FDS(\d+)', last_product['codigo'])
-            if match:
-                last_code_number = int(match.group(1))
-        new_code_number = last_code_number + 1
-        new_codigo = f"FDS{new_code_number:06d}"
-    except Exception as e:
-        return jsonify({"msg": f"Erro ao gerar o código interno do produto: {str(e)}"}), 500
-
-    # 5️⃣ Upload do PDF para o S3
-    try:
-        s3_key_from_s3, pdf_url_from_s3 = upload_to_s3(pdf_file, product_name)
-    except Exception as e:
-        return jsonify({"msg": f"Erro ao enviar arquivo para o S3: {str(e)}"}), 500
-
-    # 6️⃣ Montagem do novo produto e VALIDAÇÃO DO NÚMERO CAS
+    # 4️⃣ VALIDAÇÃO DO NÚMERO CAS (antes do upload, para não enviar arquivos em vão)
     substancias = []
     if 'substancias' in data and isinstance(data['substancias'], list):
         for s in data['substancias']:
@@ -225,6 +370,31 @@ def create_product():
                 'concentracao': s.get('concentracao', ''),
             })
 
+    # 5️⃣ Upload do PDF: validação, hash SHA-256 e envio ao S3 em uma única leitura
+    try:
+        upload = upload_pdf(pdf_file, _product_pdf_key(product_name))
+    except UploadRejected as e:
+        return jsonify({"msg": e.message}), e.status_code
+    except Exception as e:
+        return jsonify({"msg": f"Erro ao enviar arquivo para o S3: {str(e)}"}), 500
+
+    file_hash = upload["file_hash"]
+    try:
+        if Product.collection().find_one({"file_hash": file_hash}, {"_id": 1}):
+            _discard_upload(upload["key"])
+            return jsonify({"msg": "Este arquivo FDS já foi cadastrado para outro produto."}), 409
+    except Exception as e:
+        _discard_upload(upload["key"])
+        return jsonify({"msg": f"Erro ao processar o arquivo para verificação: {str(e)}"}), 500
+
+    # 6️⃣ Geração do código do produto (alocado só depois das validações,
+    # para que requisições rejeitadas não consumam números da sequência)
+    try:
+        new_codigo = next_product_code()
+    except Exception as e:
+        _discard_upload(upload["key"])
+        return jsonify({"msg": f"Erro ao gerar o código interno do produto: {str(e)}"}), 500
+
     new_product = Product(
         codigo=new_codigo,
         quantidade_armazenada=data.get('quantidade_armazenada'),
@@ -241,8 +411,8 @@ def create_product():
         categoria=data.get('categoria'),
         status=data.get('status') or 'pendente',
         created_by_user_id=creator_user_id,
-        pdf_url=pdf_url_from_s3,
-        pdf_s3_key=s3_key_from_s3,
+        pdf_url=upload["url"],
+        pdf_s3_key=upload["key"],
         empresa=data.get('empresa'),
         file_hash=file_hash,
     )
@@ -255,6 +425,7 @@ def create_product():
         result = Product.collection().insert_one(product_dict)
         new_product._id = result.inserted_id
         product_dict["_id"] = new_product._id
+        _record_product_change(None, product_dict)
         serialized = _serialize_product(product_dict)
 
         return jsonify({
@@ -263,7 +434,11 @@ def create_product():
             "id": serialized["id"]
         }), 201
 
+    except DuplicateKeyError:
+        _discard_upload(upload["key"])
+        return jsonify({"msg": f"Já existe um produto cadastrado com o nome '{product_name}'."}), 409
     except Exception as e:
+        _discard_upload(upload["key"])
         return jsonify({"msg": f"Erro ao criar o produto: {str(e)}"}), 500
 # ============================================================
 # LIST PRODUCTS
@@ -271,16 +446,58 @@ def create_product():
 @product_bp.route('/products', methods=['GET'])
 @role_required([ROLES['1'], ROLES['2']])
 def list_products():
+    """
+    Lista produtos com paginação por keyset.
+
+    Parâmetros opcionais da query string:
+    - status: filtra pelo status do produto
+    - limit: tamanho da página (padrão PRODUCTS_PAGE_SIZE, máximo PRODUCTS_MAX_PAGE_SIZE)
+    - next: cursor opaco devolvido no cabeçalho X-Next-Cursor da página anterior
+    - sort: uma das chaves de PRODUCT_SORT_KEYS, com '-' para ordem decrescente
+    - fields: lista separada por vírgulas dos campos desejados
+    - stream=1: exporta todos os produtos do filtro como um array JSON enviado
+      incrementalmente (ignora limit/next)
+
+    Responde 304 a If-None-Match quando nenhum produto (nem nome de criador)
+    mudou desde o ETag informado, sem consultar os produtos.
+    """
     try:
+        etag, _ = compute_etag((PRODUCTS_SCOPE, USERS_SCOPE), sorted(request.args.items(multi=True)))
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
         status_filter = request.args.get('status')
         query = {}
         if status_filter:
             query['status'] = status_filter
 
-        cursor = Product.collection().find(query).sort([('_id', -1)])
-        products = [_serialize_product(doc) for doc in cursor]
-
-        return jsonify(products), 200
+        try:
+            sort_field, direction = parse_sort(request.args.get('sort'), PRODUCT_SORT_KEYS, '-id')
+            required = {'_id', sort_field}
+            if 'created_by' in (request.args.get('fields') or '').split(','):
+                required.add('created_by_user_id')
+            projection = parse_fields(request.args.get('fields'), PRODUCT_LIST_FIELDS, required)
+
+            if wants_stream(request.args):
+                sort = [(sort_field, direction)] if sort_field == '_id' else [(sort_field, direction), ('_id', direction)]
+                cursor = Product.collection().find(query, projection).sort(sort).batch_size(STREAM_BATCH_SIZE)
+                return with_etag(stream_json_array(_iter_serialized_products(cursor)), etag)
+
+            limit = parse_limit(request.args.get('limit'), PRODUCTS_PAGE_SIZE, PRODUCTS_MAX_PAGE_SIZE)
+            docs, next_cursor = keyset_page(
+                Product.collection(), query, projection,
+                sort_field, direction, limit, request.args.get('next')
+            )
+        except ValueError as e:
+            return jsonify({"msg": str(e)}), 400
+
+        products = _serialize_products(docs)
+
+        response = with_etag(jsonify(products), etag)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return response, 200
 
     except Exception as e:
         return jsonify({"msg": f"Erro ao listar produtos: {str(e)}"}), 500
@@ -334,19 +551,26 @@ def update_product(product_id):
         return jsonify({"msg": "Dados do produto (productData) não encontrados ou em formato inválido."}), 400
 
     try:
-        doc = Product.collection().find_one({"_id": _id})
-        if not doc:
-            return jsonify({"msg": "Produto não encontrado."}), 404
-
-        # ... (Sua lógica de permissão continua a mesma e está correta) ...
-        user_role = User.collection().find_one({"_id": current_oid}, {"role": 1})
-        role_value = user_role.get("role") if user_role else None
+        expected_version = parse_expected_version(data.get('version'))
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Versão do produto inválida."}), 400
 
+    upload = None
+    previous_key = None
+    stored = False
+    try:
+        # Papel já carregado por role_required nesta requisição
+        principal = load_principal(current_user_id)
+        role_value = principal.get("role") if principal else None
+
+        # As regras de permissão fazem parte do filtro: analista só edita os
+        # próprios produtos ainda não aprovados. Leitura, verificação e escrita
+        # acontecem em uma única operação atômica.
+        query = {"_id": _id}
         if role_value == ROLES['2']:
-            if str(doc.get("created_by_user_id")) != str(current_oid):
-                return jsonify({"msg": "Você não tem permissão para editar este produto."}), 403
-            if doc.get("status") == "aprovado":
-                return jsonify({"msg": "Produto aprovado não pode ser editado por analista."}), 403
+            query["created_by_user_id"] = {"$in": [current_oid, str(current_oid)]}
+            query["status"] = {"$ne": "aprovado"}
+        query = versioned_filter(query, expected_version)
 
         # Prepara o documento de atualização com os dados recebidos do formulário
         fields_allowed = {
@@ -355,22 +579,34 @@ def update_product(product_id):
             'perigos_meio_ambiente', 'palavra_de_perigo', 'categoria', 'empresa'
         }
         update_doc = {k: v for k, v in data.items() if k in fields_allowed}
+        if update_doc.get('nome_do_produto'):
+            update_doc['nome_do_produto'] = update_doc['nome_do_produto'].strip()
+            update_doc['nome_normalizado'] = Product.normalize_name(update_doc['nome_do_produto'])
 
         # 2. 📂 ADIÇÃO: Lógica para tratar o upload de um novo arquivo
         # Verificamos se um novo arquivo foi enviado na requisição.
-        if 'file' in request.files:
-            pdf_file = request.files['file']
-            # Garante que o arquivo tem um nome e não está vazio
-            if pdf_file and pdf_file.filename != '':
-                # Lógica para fazer upload do novo arquivo para o S3
-                # (Você precisará deletar o antigo se a sua regra de negócio exigir)
-                # Exemplo:
-                # delete_from_s3(doc.get('pdf_s3_key')) # Deleta o antigo
-                s3_key, pdf_url = upload_to_s3(pdf_file, update_doc['nome_do_produto'])
-                
-                # Adiciona as novas URLs ao documento de atualização
-                update_doc['pdf_url'] = pdf_url
-                update_doc['pdf_s3_key'] = s3_key
+        pdf_file = request.files.get('file')
+        if pdf_file and pdf_file.filename != '':
+            # Só a troca de arquivo precisa ler o produto antes: o nome compõe a
+            # chave do PDF e as permissões são conferidas antes do envio ao S3.
+            doc = Product.collection().find_one(
+                {"_id": _id},
+                {"nome_do_produto": 1, "pdf_s3_key": 1, "created_by_user_id": 1, "status": 1, "version": 1}
+            )
+            denied = _update_denied(doc, role_value, current_oid, expected_version)
+            if denied:
+                return denied
+            previous_key = doc.get('pdf_s3_key')
+            product_name = update_doc.get('nome_do_produto') or doc.get('nome_do_produto')
+            try:
+                upload = upload_pdf(pdf_file, _product_pdf_key(product_name))
+            except UploadRejected as e:
+                return jsonify({"msg": e.message}), e.status_code
+
+            # Adiciona as novas URLs ao documento de atualização
+            update_doc['pdf_url'] = upload["url"]
+            update_doc['pdf_s3_key'] = upload["key"]
+            update_doc['file_hash'] = upload["file_hash"]
 
         # 3. ➕ ADIÇÃO: Lógica de status (se o admin estiver editando)
         # Permite que o admin altere o status na mesma requisição de edição.
@@ -380,20 +616,75 @@ def update_product(product_id):
 
         update_doc["updated_at"] = datetime.now(timezone.utc)
 
-        Product.collection().update_one({"_id": _id}, {"$set": update_doc})
+        # O documento anterior alimenta a diferença aplicada às estatísticas do
+        # painel; o atualizado é montado localmente, sem outra leitura.
+        before = Product.collection().find_one_and_update(
+            query,
+            bump_version({"$set": update_doc}),
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            if upload and upload["key"] != previous_key:
+                _discard_upload(upload["key"])
+            # Só no caminho de falha: descobre qual condição do filtro não casou
+            doc = Product.collection().find_one(
+                {"_id": _id}, {"created_by_user_id": 1, "status": 1, "version": 1}
+            )
+            return _update_denied(doc, role_value, current_oid, expected_version) or _version_conflict(doc)
+
+        # A partir daqui o produto já aponta para o novo arquivo
+        stored = True
+        updated = _after_update(before, update_doc)
+        _record_product_change(before, updated)
+        if upload:
+            invalidate_download_cache(_id, before.get('pdf_s3_key'))
 
-        updated = Product.collection().find_one({"_id": _id})
         return jsonify({
             "msg": "Produto atualizado com sucesso.",
             "product": _serialize_product(updated)
         }), 200
 
+    except DuplicateKeyError:
+        if upload and upload["key"] != previous_key:
+            _discard_upload(upload["key"])
+        return jsonify({"msg": f"Já existe um produto cadastrado com o nome '{update_doc.get('nome_do_produto')}'."}), 409
     except Exception as e:
         # Adiciona logging para depuração no futuro
-        current_app.logger.error(f"Erro ao atualizar produto {_id}: {e}")
+        logging.error(f"Erro ao atualizar produto {_id}: {e}")
+        if upload and not stored and upload["key"] != previous_key:
+            _discard_upload(upload["key"])
         return jsonify({"msg": f"Erro ao atualizar produto: {str(e)}"}), 500
 
 
+def _after_update(before, update_doc):
+    """Documento resultante de aplicar `$set: update_doc` (e a nova versão) a `before`."""
+    return {**before, **update_doc, "version": current_version(before) + 1}
+
+
+def _update_denied(doc, role_value, current_oid, expected_version=None):
+    """
+    Resposta de erro (404/403/409) se `doc` não puder ser editado pelo
+    usuário atual, ou None se a edição for permitida.
+    """
+    if not doc:
+        return jsonify({"msg": "Produto não encontrado."}), 404
+    if role_value == ROLES['2']:
+        if str(doc.get("created_by_user_id")) != str(current_oid):
+            return jsonify({"msg": "Você não tem permissão para editar este produto."}), 403
+        if doc.get("status") == "aprovado":
+            return jsonify({"msg": "Produto aprovado não pode ser editado por analista."}), 403
+    if expected_version is not None and current_version(doc) != expected_version:
+        return _version_conflict(doc)
+    return None
+
+
+def _version_conflict(doc):
+    return jsonify({
+        "msg": "O produto foi alterado por outra pessoa. Recarregue os dados e tente novamente.",
+        "version": current_version(doc)
+    }), 409
+
+
 # ============================================================
 # UPDATE STATUS
 # ============================================================
@@ -412,14 +703,27 @@ def update_product_status(product_id):
         return jsonify({"msg": "Status inválido. Use: aprovado, rejeitado ou pendente."}), 400
 
     try:
-        result = Product.collection().update_one(
-            {"_id": _id},
-            {"$set": {"status": status, "updated_at": datetime.now(timezone.utc)}}
-        )
-        if result.matched_count == 0:
-            return jsonify({"msg": "Produto não encontrado."}), 404
+        expected_version = parse_expected_version(data.get("version"))
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Versão do produto inválida."}), 400
 
-        updated = Product.collection().find_one({"_id": _id})
+    try:
+        update_doc = {"status": status, "updated_at": datetime.now(timezone.utc)}
+        before = Product.collection().find_one_and_update(
+            versioned_filter({"_id": _id}, expected_version),
+            bump_version({"$set": update_doc}),
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            doc = None
+            if expected_version is not None:
+                doc = Product.collection().find_one({"_id": _id}, {"version": 1})
+            if not doc:
+                return jsonify({"msg": "Produto não encontrado."}), 404
+            return _version_conflict(doc)
+
+        updated = _after_update(before, update_doc)
+        _record_product_change(before, updated)
         return jsonify({
             "msg": f"Status atualizado para '{status}' com sucesso.",
             "product": _serialize_product(updated)
@@ -450,23 +754,18 @@ def delete_product(product_id):
         # 2. Verificar se há um arquivo no S3 para apagar
         s3_key = product_to_delete.get("pdf_s3_key")
         if s3_key:
-            try:
-                # Inicializa o cliente S3 (pode ser global ou dentro da função)
-                s3 = boto3.client("s3")
-                bucket_name = os.getenv("AWS_BUCKET_NAME")
-                
-                # 3. Mandar o comando para apagar o objeto do S3
-                s3.delete_object(Bucket=bucket_name, Key=s3_key)
+            # 3. Remove o objeto pelo serviço de armazenamento compartilhado.
+            # Se der erro ao apagar do S3, o serviço registra o erro e seguimos
+            # para apagar do DB.
+            storage = get_storage()
+            if storage and storage.delete(s3_key):
                 logging.info(f"Arquivo {s3_key} excluído do S3 com sucesso.")
 
-            except Exception as s3_error:
-                # Se der erro ao apagar do S3, logamos o erro mas continuamos
-                # para apagar do DB. Ou você pode optar por parar a operação aqui.
-                logging.error(f"Erro ao excluir arquivo {s3_key} do S3: {s3_error}")
-                # return jsonify({"msg": "Erro ao remover arquivo associado no S3."}), 500
-
         # 4. Apagar o registro do MongoDB
         result = Product.collection().delete_one({"_id": _id})
+        invalidate_download_cache(_id, s3_key)
+        if result.deleted_count:
+            _record_product_change(product_to_delete, None)
         
         # Esta verificação se torna um pouco redundante se já fizemos o find_one, mas é segura
         if result.deleted_count == 0:
@@ -477,6 +776,15 @@ def delete_product(product_id):
     except Exception as e:
         return jsonify({"msg": f"Erro ao excluir produto: {str(e)}"}), 500
 
+@product_bp.route('/products/download/cache-stats', methods=['GET'])
+@role_required([ROLES['1']])
+def download_cache_stats():
+    """Contadores dos caches usados por /products/<id>/download (somente deste worker)."""
+    return jsonify({
+        "presigned_urls": _presigned_url_cache.stats(),
+        "product_keys": _product_key_cache.stats(),
+    }), 200
+
 # ==============================================================================
 # ROTA PARA GERAR LINK DE DOWNLOAD/VISUALIZAÇÃO DE FDS
 # ==============================================================================
@@ -497,68 +805,42 @@ def download_fds(product_id):
     try:
         # 1. VALIDAÇÃO DO PRODUTO
         # ========================
-        
-        # Busca a identidade do usuário (geralmente o ID) a partir do token JWT.
-        user_id = get_jwt_identity()
 
-        # Busca no banco de dados (MongoDB) o documento do produto pelo seu ID.
-        # ObjectId(product_id) converte a string da URL para o formato de ID do MongoDB.
-        product = Product.collection().find_one({"_id": ObjectId(product_id)})
+        # A chave do PDF de cada produto fica em cache por alguns segundos;
+        # só consultamos o MongoDB (apenas o campo pdf_s3_key) em caso de falha.
+        file_key = _product_key_cache.get(product_id)
+        if file_key is None:
+            product = Product.collection().find_one({"_id": ObjectId(product_id)}, {"pdf_s3_key": 1})
 
-        # Se nenhum produto for encontrado com o ID fornecido, retorna um erro 404 (Não Encontrado).
-        if not product:
-            return jsonify({"msg": "Produto não encontrado"}), 404
+            # Se nenhum produto for encontrado com o ID fornecido, retorna um erro 404 (Não Encontrado).
+            if not product:
+                return jsonify({"msg": "Produto não encontrado"}), 404
+            file_key = product.get("pdf_s3_key") or ""
+            _product_key_cache.set(product_id, file_key)
 
         # 2. VERIFICAÇÃO DO ARQUIVO PDF
         # ==============================
 
-        # Pega o caminho (chave) do arquivo PDF armazenado no S3 a partir do documento do produto.
-        file_key = product.get("pdf_s3_key")
-
         # Se o produto não tiver uma chave de PDF associada, significa que não há arquivo para baixar.
         if not file_key:
             return jsonify({"msg": "Arquivo FDS não encontrado para este produto"}), 404
 
-        # 3. INICIALIZAÇÃO DO CLIENTE S3
-        # ===============================
-        
-        # A variável s3_client é global. Verificamos se ela já foi inicializada.
-        global s3_client
-        if not s3_client:
-            # Se não foi, chama a função auxiliar para criar um novo cliente S3.
-            s3_client = get_aws_client('s3')
-            # Se a inicialização falhar (ex: credenciais erradas), loga um erro e retorna uma resposta 500.
-            if not s3_client:
-                logging.error("Falha ao inicializar o cliente AWS S3 no momento da requisição.")
+        # 3. LINK TEMPORÁRIO (PRESIGNED URL)
+        # ===================================
+
+        # Reaproveita o link já assinado enquanto ele ainda tiver validade suficiente.
+        presigned_url = _presigned_url_cache.get(file_key)
+        if presigned_url is None:
+            # O serviço (e o cliente S3) é criado uma vez por worker e reaproveitado.
+            storage = get_storage()
+            if not storage:
+                logging.error("Serviço de armazenamento indisponível no momento da requisição.")
                 return jsonify({"msg": "Erro interno: Serviço de armazenamento não configurado"}), 500
 
-        # 4. GERAÇÃO DO LINK TEMPORÁRIO (PRESIGNED URL)
-        # ===============================================
-
-        # Loga uma informação útil no console do servidor para depuração.
-        logging.info(f"Gerando presigned URL para bucket '{s3_bucket_name}' e chave '{file_key}'")
-
-        # Esta é a função principal que pede ao S3 para criar uma URL de acesso temporário.
-        presigned_url = s3_client.generate_presigned_url(
-            # O método 'get_object' especifica que a URL será usada para buscar (visualizar/baixar) um objeto.
-            ClientMethod='get_object',
-            # 'Params' contém os detalhes do pedido que será feito quando a URL for acessada.
-            Params={
-                'Bucket': s3_bucket_name,  # O nome do seu bucket no S3.
-                'Key': file_key,          # O caminho completo do arquivo dentro do bucket.
-                
-                # ✅ ALTERAÇÃO PRINCIPAL: Controle de como o arquivo é apresentado.
-                # 'ResponseContentDisposition': 'inline' instrui o S3 a dizer ao navegador
-                # para tentar ABRIR/EXIBIR o arquivo na própria aba, em vez de forçar o download.
-                'ResponseContentDisposition': 'inline',
-
-                # 'ResponseContentType': 'application/pdf' garante que o navegador saiba que
-                # o arquivo é um PDF, ajudando-o a usar o visualizador correto.
-                'ResponseContentType': 'application/pdf'
-            },
-            # Define o tempo de validade do link em segundos. Aqui, 600 segundos = 10 minutos.
-            ExpiresIn=600
-        )
+            # 'inline' instrui o navegador a ABRIR/EXIBIR o arquivo na própria aba,
+            # em vez de forçar o download; o link vale DOWNLOAD_URL_EXPIRES segundos.
+            presigned_url = storage.presign(file_key, expires_in=DOWNLOAD_URL_EXPIRES, disposition='inline')
+            _presigned_url_cache.set(file_key, presigned_url)
 
         # 5. RETORNO DA RESPOSTA
         # =======================
@@ -576,19 +858,17 @@ def download_fds(product_id):
 
 
 
-def upload_to_s3(file_obj, product_name): # 👈 Alteramos o segundo argumento
-    s3 = boto3.client(
-        "s3",
-        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-        region_name=os.getenv("AWS_REGION")
-    )
+def _discard_upload(key):
+    """Remove um PDF recém-enviado quando a criação do produto não se concretiza."""
+    storage = get_storage()
+    if storage:
+        storage.delete(key)
 
-    bucket_name = os.getenv("AWS_BUCKET_NAME")
-    
+
+def _product_pdf_key(product_name):
     # ✅ NOVO: Lógica para criar um nome de arquivo seguro a partir do nome do produto
     # Ex: "Óleo Lubrificante / XPTO" -> "oleo_lubrificante_xpto"
-    clean_name = secure_filename(product_name).replace(' ', '_').lower()
+    clean_name = secure_filename(product_name or '').replace(' ', '_').lower()
     
     # Adicionamos um sufixo único para evitar qualquer chance de colisão de nomes
     unique_suffix = str(uuid.uuid4())[:8] 
@@ -596,11 +876,4 @@ def upload_to_s3(file_obj, product_name): # 👈 Alteramos o segundo argumento
     # O nome do arquivo final será algo como: "oleo_lubrificante_xpto_a1b2c3d4.pdf"
     unique_filename = f"{clean_name}_{unique_suffix}.pdf"
     
-    key = f"uploads/{unique_filename}"
-
-    s3.upload_fileobj(file_obj, bucket_name, key)
-
-    url = f"https://{bucket_name}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{key}"
-    return key, url
-
-
+    return f"uploads/{unique_filename}"
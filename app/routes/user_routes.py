@@ -2,14 +2,28 @@
 
 from flask import request, jsonify, Blueprint
 from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.passwords import PasswordHasherBusy, hash_password, verify_password, needs_rehash
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timezone
+import os
+import shutil
+import tempfile
 
 # Importa a classe User do módulo models
 from app.models import User
 # Importa o decorador role_required e a constante ROLES do módulo utils
-from app.utils import ROLES, role_required
+from app.utils import ROLES, role_required, invalidate_principal
+from app.token_versions import bump_token_version, revoke_tokens
+from app.versioning import bump_version, current_version, parse_expected_version, versioned_filter
+from app.etags import USERS_SCOPE, bump_change_versions
+from app.write_behind import last_access_buffer
+from app.sessions import create_session, rotate_session, list_sessions, revoke_session, revoke_user_sessions
+from app.routes.product_routes import invalidate_creator_name
+from app.streaming import STREAM_BATCH_SIZE, stream_json_array, stream_ndjson, wants_stream
+from app.bulk_import import import_users, iter_rows
+from app.pagination import NEXT_CURSOR_HEADER, keyset_page, parse_fields, parse_limit, parse_sort
 
 # user_routes.py (adições necessárias)
 from flask_limiter.util import get_remote_address
@@ -19,6 +33,15 @@ from app.security_config import RATE_LIMITS, get_limiter_key, limiter
 # Configurar o limiter após criar o blueprint
 user_bp = Blueprint('user', __name__)
 
+
+@user_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    """Fila de hashing cheia: pede ao cliente que tente novamente em instantes."""
+    response = jsonify({"msg": "Serviço de autenticação sobrecarregado. Tente novamente em instantes."})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 # Rota de registro de usuário
 #CODIGO ANTES
 '''
@@ -37,38 +60,9 @@ def register():
     senha = data.get('senha')
 '''
 #CODIGO DEPOIS
-#Sistema completo de validação e sanitização de dados de entrada.
+#Sistema completo de validação e sanitização de dados de entrada (app/validators.py).
 import re
-from email_validator import validate_email, EmailNotValidError
-
-def validate_email_address(email):
-    """Valida endereço de email"""
-    try:
-        v = validate_email(email)
-        return v.email
-    except EmailNotValidError:
-        return None
-
-def validate_password(password):
-    """Valida força da senha"""
-    # 🎯 CORREÇÃO: Adicionada verificação para senha vazia
-    if not password or len(password) < 8:
-        return False
-    if not re.search(r'[A-Z]', password):
-        return False
-    if not re.search(r'[a-z]', password):
-        return False
-    if not re.search(r'[0-9]', password):
-        return False
-    return True
-
-def sanitize_input(input_str, max_length=255):
-    """Remove caracteres potencialmente perigosos e espaços em branco desnecessários"""
-    if not input_str or not isinstance(input_str, str):
-        return None
-    cleaned = re.sub(r'[<>\(\)\&\|\;\`\$]', '', input_str)
-    # 🎯 CORREÇÃO: Adicionado .strip() para remover espaços em branco
-    return cleaned[:max_length].strip() if cleaned else None
+from app.validators import validate_email_address, validate_password, sanitize_input
 
 @user_bp.route('/register', methods=['POST'])
 @limiter.limit("100 per hour")  # Limita a 2 registros por hora por IP
@@ -126,7 +120,7 @@ def register():
     planta = data.get('planta')
 
     # Gera o hash da senha antes de armazenar
-    hashed_password = generate_password_hash(senha)
+    hashed_password = hash_password(senha)
 
     # Cria uma nova instância de User e insere no banco de dados com todos os campos
     new_user = User(
@@ -160,6 +154,24 @@ def register():
         }
     }), 201
 
+# Campos copiados para as claims do access token (ou que o invalidam)
+TOKEN_CLAIM_FIELDS = frozenset({'role', 'password_hash', 'empresa', 'username'})
+
+
+def _issue_access_token(user_data):
+    """
+    Cria o access token JWT com a identidade do usuário (ID do MongoDB).
+    Papel, estado, empresa e versão vão nas claims: role_required autoriza sem ir ao banco.
+    """
+    return create_access_token(identity=str(user_data['_id']), additional_claims={
+        "username": user_data.get('username'),
+        "role": user_data.get('role'),
+        "active": user_data.get('active', True),
+        "empresa": user_data.get('empresa'),
+        "tv": user_data.get('token_version', 0)
+    })
+
+
 # Rota de login (sem alterações necessárias aqui para este problema)
 @user_bp.route('/login', methods=['POST'])
 @limiter.limit(RATE_LIMITS['login'])  # Limita a 5 tentativas de login por minuto por IP
@@ -179,51 +191,244 @@ def login():
     user_data = User.collection().find_one({"email": email})
 
     # Verifica se o usuário existe e se a senha está correta
-    if not user_data or not check_password_hash(user_data['password_hash'], senha):
+    if not user_data or not verify_password(user_data['password_hash'], senha):
         return jsonify({"msg": "Email ou senha inválidos"}), 401
 
     # Converte o dicionário do MongoDB para um objeto User
     user = User.from_dict(user_data)
 
 
-     # Atualiza o campo last_access no banco
+    # last_access é gravado em lote, fora da requisição (app/write_behind.py)
     current_time = datetime.now(timezone.utc)
-    User.collection().update_one(
-        {"_id": user._id}, # ✅ CORRETO: `user._id` agora está acessível
-        {"$set": {"last_access": current_time}}
-    )
+    last_access_buffer.record(user._id, current_time)
     user.last_access = current_time
+
+    # Hash gerado com parâmetros antigos: refaz com os atuais (a senha está em mãos)
+    if needs_rehash(user_data['password_hash']):
+        try:
+            User.collection().update_one(
+                {"_id": user._id},
+                {"$set": {"password_hash": hash_password(senha)}}
+            )
+        except PasswordHasherBusy:
+            pass  # tenta de novo no próximo login
     
 
-    # Cria um token de acesso JWT com a identidade do usuário (ID do MongoDB)
-    access_token = create_access_token(identity=str(user._id))
-    return jsonify(access_token=access_token, user={'id': str(user._id), 'username': user.username, 'email': user.email, 'role': user.role}), 200
+    access_token = _issue_access_token(user_data)
+    # Refresh token da sessão: renova o access token sem repetir o login
+    refresh_token, _ = create_session(user._id, request.headers.get('User-Agent'), get_remote_address())
+    return jsonify(access_token=access_token, refresh_token=refresh_token, user={'id': str(user._id), 'username': user.username, 'email': user.email, 'role': user.role}), 200
+
+@user_bp.route('/token/refresh', methods=['POST'])
+@limiter.limit(RATE_LIMITS['token_refresh'])
+def refresh_access_token():
+    """
+    Troca um refresh token válido por um novo access token e um novo refresh
+    token (rotação). Não verifica senha: é o caminho barato para renovar a sessão.
+    """
+    data = request.get_json(silent=True) or {}
+    refresh_token, session = rotate_session(data.get('refresh_token'))
+    if session is None:
+        return jsonify({"msg": "Sessão inválida ou expirada. Faça login novamente."}), 401
+
+    # Lê papel/versão atuais: mudanças feitas pelo admin valem no novo token
+    user_data = User.collection().find_one(
+        {"_id": session['user_id']},
+        {"username": 1, "role": 1, "active": 1, "empresa": 1, "token_version": 1}
+    )
+    if not user_data or not user_data.get('active', True):
+        revoke_session(session['_id'])
+        return jsonify({"msg": "Sessão inválida ou expirada. Faça login novamente."}), 401
+
+    return jsonify(access_token=_issue_access_token(user_data), refresh_token=refresh_token), 200
+
+
+# --- Sessões (Administrador) ---
+
+@user_bp.route('/sessions', methods=['GET'])
+@role_required([ROLES['1']])
+def get_sessions():
+    """Lista as sessões ativas; `?user_id=` filtra por usuário."""
+    user_id = request.args.get('user_id')
+    if user_id is not None and not ObjectId.is_valid(user_id):
+        return jsonify({"msg": "ID de usuário inválido"}), 400
+    return jsonify([
+        {
+            "id": str(doc['_id']),
+            "user_id": str(doc['user_id']),
+            "created_at": doc['created_at'].isoformat(),
+            "last_used_at": doc['last_used_at'].isoformat(),
+            "expires_at": doc['expires_at'].isoformat(),
+            "user_agent": doc.get('user_agent'),
+            "ip": doc.get('ip'),
+        }
+        for doc in list_sessions(user_id)
+    ]), 200
+
+
+@user_bp.route('/sessions/<session_id>', methods=['DELETE'])
+@role_required([ROLES['1']])
+def delete_session(session_id):
+    """Revoga uma sessão: o refresh token deixa de funcionar imediatamente."""
+    if not ObjectId.is_valid(session_id):
+        return jsonify({"msg": "ID de sessão inválido"}), 400
+    if not revoke_session(session_id):
+        return jsonify({"msg": "Sessão não encontrada"}), 404
+    return jsonify({"msg": "Sessão revogada com sucesso"}), 200
+
+
+@user_bp.route('/users/<user_id>/sessions', methods=['DELETE'])
+@role_required([ROLES['1']])
+def delete_user_sessions(user_id):
+    """Revoga todas as sessões do usuário."""
+    if not ObjectId.is_valid(user_id):
+        return jsonify({"msg": "ID de usuário inválido"}), 400
+    revoked = revoke_user_sessions(user_id)
+    return jsonify({"msg": f"{revoked} sessão(ões) revogada(s)"}), 200
 
 # --- Rotas CRUD para Usuários (Administrador) ---
 
 
-# Get User by ID (sem alterações necessárias aqui para este problema)
+# Listagem de usuários (grid do administrador)
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", 100))
+USERS_MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", 500))
+
+# Chaves de ordenação aceitas (nome público -> campo), cobertas por índices com _id
+USER_SORT_KEYS = {
+    "id": "_id",
+    "username": "username",
+    "email": "email",
+}
+
+# Campos exibidos no grid (nome público -> campo). Hash de senha, versão de
+# token e demais campos internos nunca saem do banco nesta rota.
+USER_LIST_FIELDS = {
+    "id": "_id",
+    "username": "username",
+    "email": "email",
+    "role": "role",
+    "cpf": "cpf",
+    "empresa": "empresa",
+    "setor": "setor",
+    "data_de_nascimento": "data_de_nascimento",
+    "planta": "planta",
+    "created_at": "created_at",
+    "last_access": "last_access",
+    "version": "version",
+}
+USER_LIST_PROJECTION = User.projection(*USER_LIST_FIELDS.values())
+
+# Campos pesquisados por prefixo com `q=`
+USER_SEARCH_FIELDS = ("username", "email", "empresa")
+
+
+def _serialize_user_row(user_data):
+    """Converte um documento da coleção de usuários na linha exibida pelo admin."""
+    row = {}
+    for public_name, field in USER_LIST_FIELDS.items():
+        if field not in user_data:
+            continue
+        value = user_data[field]
+        if field == "_id":
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        row[public_name] = value
+    return row
+
+
+def _users_query(args):
+    """Filtro da listagem a partir de `q` (prefixo), `role` e `empresa`."""
+    query = {}
+    role = args.get('role')
+    if role:
+        if role not in ROLES.values():
+            raise ValueError("Role inválido")
+        query['role'] = role
+    empresa = args.get('empresa')
+    if empresa:
+        query['empresa'] = empresa
+    search = (args.get('q') or '').strip()
+    if search:
+        # Regex ancorada no início e sem flags: o MongoDB a resolve como um
+        # intervalo no índice do campo, sem varrer a coleção.
+        prefix = {"$regex": "^" + re.escape(search)}
+        query['$or'] = [{field: prefix} for field in USER_SEARCH_FIELDS]
+    return query
+
+
 @user_bp.route('/users', methods=['GET'])
 @role_required([ROLES['1']])
 def get_users():
-    users_cursor = User.collection().find({})
-    users_list = []
-    for user_data in users_cursor:
-        user = User.from_dict(user_data)
-        users_list.append({
-            "id": str(user._id),
-            "username": user.username,
-            "email": user.email,
-            "role": user.role,
-            "cpf": user.cpf, # <--- Certifique-se que esses campos estão aqui
-            "empresa": user.empresa,
-            "setor": user.setor,
-            "data_de_nascimento": user.data_de_nascimento,
-            "planta": user.planta,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-            "last_access": user.last_access.isoformat() if user.last_access else None,
-        })
-    return jsonify(users_list), 200
+    """
+    Lista usuários com paginação por keyset.
+
+    Parâmetros opcionais da query string:
+    - q: prefixo de username, email ou empresa (diferencia maiúsculas)
+    - role, empresa: filtros exatos
+    - limit: tamanho da página (padrão USERS_PAGE_SIZE, máximo USERS_MAX_PAGE_SIZE)
+    - next: cursor opaco devolvido no cabeçalho X-Next-Cursor da página anterior
+    - sort: uma das chaves de USER_SORT_KEYS, com '-' para ordem decrescente
+    - fields: lista separada por vírgulas dos campos desejados
+    - stream=1: exporta todos os usuários do filtro (ignora limit/next)
+    """
+    try:
+        query = _users_query(request.args)
+        sort_field, direction = parse_sort(request.args.get('sort'), USER_SORT_KEYS, 'username')
+        projection = parse_fields(request.args.get('fields'), USER_LIST_FIELDS, {'_id', sort_field}) \
+            or USER_LIST_PROJECTION
+
+        if wants_stream(request.args):
+            # Exportação completa: envia o array incrementalmente a partir do cursor
+            sort = [(sort_field, direction)] if sort_field == '_id' else [(sort_field, direction), ('_id', direction)]
+            users_cursor = User.collection().find(query, projection).sort(sort).batch_size(STREAM_BATCH_SIZE)
+            return stream_json_array(_serialize_user_row(user_data) for user_data in users_cursor)
+
+        limit = parse_limit(request.args.get('limit'), USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE)
+        docs, next_cursor = keyset_page(
+            User.collection(), query, projection,
+            sort_field, direction, limit, request.args.get('next')
+        )
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    response = jsonify([_serialize_user_row(user_data) for user_data in docs])
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response, 200
+
+@user_bp.route('/users/import', methods=['POST'])
+@role_required([ROLES['1']])
+@limiter.limit(RATE_LIMITS['bulk_import'])
+def import_users_route():
+    """
+    Importa usuários em massa a partir de um arquivo CSV (com cabeçalho) ou
+    JSON lines, enviado no campo `file` ou como corpo da requisição.
+    O formato vem de `?format=csv|jsonl` ou da extensão do arquivo.
+    A resposta é NDJSON: uma linha por registro ({"row", "status", ...}) e um
+    resumo final, enviados à medida que cada lote é gravado.
+    """
+    upload = request.files.get('file')
+    filename = (upload.filename if upload else '') or ''
+    fmt = (request.args.get('format') or filename.rsplit('.', 1)[-1]).lower()
+    if fmt in ('json', 'ndjson'):
+        fmt = 'jsonl'
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"msg": "Formato inválido. Envie um arquivo .csv ou .jsonl"}), 400
+
+    # Copia o arquivo antes de responder: a resposta é enviada aos poucos e o
+    # upload original pode ser fechado pelo servidor antes do fim da leitura.
+    spooled = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    shutil.copyfileobj(upload.stream if upload else request.stream, spooled)
+    spooled.seek(0)
+
+    def results():
+        try:
+            yield from import_users(iter_rows(spooled, fmt))
+        finally:
+            spooled.close()
+
+    return stream_ndjson(results())
 
 # Update User (sem alterações necessárias aqui para este problema, mas se 'planta' e outros campos
 # também pudessem ser atualizados, eles precisariam ser adicionados aqui)
@@ -233,20 +438,27 @@ def get_users():
 def update_user(user_id):
     """
     Atualiza um usuário existente pelo ID. Apenas para administradores.
+
+    A alteração é feita em uma única ida ao banco (`find_one_and_update`
+    devolvendo o documento já atualizado). Se o payload trouxer `version`, a
+    edição só é aplicada se o usuário ainda estiver nessa versão (409 caso
+    contrário).
     """
     try:
-        user_data_from_db = User.collection().find_one({"_id": ObjectId(user_id)})
+        user_oid = ObjectId(user_id)
     except Exception:
         return jsonify({"msg": "ID de usuário inválido"}), 400
 
-    if not user_data_from_db:
-        return jsonify({"msg": "Usuário não encontrado"}), 404
-
     # 🔑 Tentar obter o JSON, e retornar 400 se for nulo ou inválido
     data = request.get_json(silent=True)
     if not data or not isinstance(data, dict):
         return jsonify({"msg": "Dados de requisição inválidos ou ausentes"}), 400
 
+    try:
+        expected_version = parse_expected_version(data.get('version'))
+    except (TypeError, ValueError):
+        return jsonify({"msg": "Versão inválida"}), 400
+
     update_data = {}
 
     # Mapeamento do payload para os campos do banco de dados
@@ -266,17 +478,14 @@ def update_user(user_id):
     for payload_key, db_key in payload_to_db_map.items():
         if payload_key in data:
             if db_key == 'email':
-                # Validação e verificação de e-mail duplicado
+                # Validação e verificação de e-mail duplicado. A consulta (só
+                # quando o e-mail é enviado) protege mesmo sem o índice único
+                # `email_1`; com ele, a corrida entre duas edições também vira 409.
                 email_bruto = data.get('email')
                 email_validado = validate_email_address(email_bruto)
                 if not email_validado:
                     return jsonify({"msg": "Endereço de email inválido"}), 400
-
-                existing_user_with_email = User.collection().find_one({
-                    "email": email_validado,
-                    "_id": {"$ne": ObjectId(user_id)}
-                })
-                if existing_user_with_email:
+                if User.collection().find_one({"email": email_validado, "_id": {"$ne": user_oid}}, {"_id": 1}):
                     return jsonify({"msg": "Email já está em uso por outro usuário"}), 409
                 update_data['email'] = email_validado
 
@@ -288,7 +497,7 @@ def update_user(user_id):
 
             elif db_key == 'password_hash':
                 # Hashing da senha
-                update_data['password_hash'] = generate_password_hash(data['senha'])
+                update_data['password_hash'] = hash_password(data['senha'])
             
             else:
                 update_data[db_key] = data[payload_key]
@@ -296,8 +505,41 @@ def update_user(user_id):
     if not update_data:
         return jsonify({"msg": "Nenhum dado para atualizar"}), 400
 
-    User.collection().update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-    updated_user_data = User.collection().find_one({"_id": ObjectId(user_id)})
+    query = versioned_filter({"_id": user_oid}, expected_version)
+    try:
+        if TOKEN_CLAIM_FIELDS.intersection(update_data):
+            # Papel, senha, empresa ou nome mudaram: revoga os tokens já emitidos,
+            # cujas claims (ex.: empresa padrão do painel) ficaram desatualizadas
+            updated_user_data = bump_token_version(user_oid, update_data, query=query)
+        else:
+            updated_user_data = User.collection().find_one_and_update(
+                query,
+                bump_version({"$set": update_data}),
+                return_document=ReturnDocument.AFTER
+            )
+    except DuplicateKeyError:
+        return jsonify({"msg": "Email já está em uso por outro usuário"}), 409
+
+    if updated_user_data is None:
+        # Só no caminho de falha: distingue usuário inexistente de versão desatualizada
+        current = None
+        if expected_version is not None:
+            current = User.collection().find_one({"_id": user_oid}, {"version": 1})
+        if current is None:
+            return jsonify({"msg": "Usuário não encontrado"}), 404
+        return jsonify({
+            "msg": "O usuário foi alterado por outra pessoa. Recarregue os dados e tente novamente.",
+            "version": current_version(current)
+        }), 409
+
+    if 'password_hash' in update_data:
+        revoke_user_sessions(user_id)
+    # Papel/estado em cache deixam de valer imediatamente neste worker
+    invalidate_principal(user_id)
+    if 'username' in update_data:
+        # Nome do criador aparece na listagem de produtos (ETag de /products)
+        invalidate_creator_name(user_id)
+        bump_change_versions(USERS_SCOPE)
     updated_user = User.from_dict(updated_user_data)
 
     return jsonify({
@@ -311,7 +553,8 @@ def update_user(user_id):
             "empresa": updated_user.empresa,
             "setor": updated_user.setor,
             "data_de_nascimento": updated_user.data_de_nascimento,
-            "planta": updated_user.planta
+            "planta": updated_user.planta,
+            "version": updated_user.version
         }
     }), 200
 
@@ -324,10 +567,18 @@ def delete_user(user_id):
     Deleta um usuário pelo ID. Apenas para administradores.
     """
     try:
-        result = User.collection().delete_one({"_id": ObjectId(user_id)})
+        deleted = User.collection().find_one_and_delete(
+            {"_id": ObjectId(user_id)}, projection={"token_version": 1}
+        )
     except Exception:
         return jsonify({"msg": "ID de usuário inválido"}), 400
         
-    if result.deleted_count == 0:
+    if deleted is None:
         return jsonify({"msg": "Usuário não encontrado"}), 404
+    # Tokens ainda válidos do usuário excluído deixam de ser aceitos
+    revoke_tokens(user_id, deleted.get('token_version', 0) + 1)
+    revoke_user_sessions(user_id)
+    invalidate_principal(user_id)
+    invalidate_creator_name(user_id)
+    bump_change_versions(USERS_SCOPE)
     return jsonify({"msg": "Usuário deletado com sucesso"}), 200
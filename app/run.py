@@ -60,7 +60,8 @@ CORS(app, resources={
             "X-RateLimit-Remaining", 
             "X-RateLimit-Reset",
             "X-RateLimit-Policy",
-            "Retry-After"
+            "Retry-After",
+            "X-Next-Cursor"
         ],
         "supports_credentials": True,
         "max_age": 600
@@ -102,8 +102,10 @@ def register_error_handlers(app):
 # Limites específicos por rota (podem ser aplicados nos decorators @limiter.limit)
 RATE_LIMITS = {
     'login': "5 per minute",
+    'token_refresh': "30 per minute",
     'register': "3 per hour", 
     'upload': "10 per hour",
+    'bulk_import': "10 per hour",
     'delete': "5 per hour",
     'general': "100 per hour",
     'health': "30 per minute"
@@ -1,6 +1,8 @@
 # app/security_middleware.py
 import time
 import hashlib
+import codecs
+import os
 from flask import request, jsonify
 import logging
 from datetime import datetime, timedelta
@@ -8,6 +10,131 @@ import re
 import json   # Necessário para montar respostas JSON
 import io  # <-- ADICIONE ESTA LINHA
 
+# Corpo máximo analisado por requisição; o excedente segue para a aplicação sem análise
+INJECTION_SCAN_MAX_BYTES = int(os.getenv("INJECTION_SCAN_MAX_BYTES", 1024 * 1024))
+INJECTION_SCAN_CHUNK_SIZE = int(os.getenv("INJECTION_SCAN_CHUNK_SIZE", 64 * 1024))
+
+# Padrões de NoSQL Injection (focados em operadores perigosos e JS)
+NOSQL_PATTERNS = (
+    '$where',        # Operador $where, muito perigoso
+    'mapReduce',     # Comando MapReduce
+    'group',         # Operador de group
+    'sleep(',        # Tentativas de ataques de tempo (timing attacks)
+    'benchmark(',
+)
+
+# Padrões de SQL Injection (mantidos como defesa em profundidade)
+SQL_PATTERNS = ('--', '/*', 'xp_cmdshell')
+
+# Pares (a, b) equivalem a `a.*b`: `b` depois de `a` na mesma linha
+SQL_SEQUENCE_PATTERNS = (
+    ('union', 'select'), ('select', 'from'), ('insert', 'into'),
+    ('delete', 'from'), ('drop', 'table'), ('waitfor', 'delay'),
+)
+
+
+# Caracteres que re.IGNORECASE iguala a letras ASCII e que lower() não converte
+IGNORECASE_FOLDS = (('\u0130', 'i'), ('\u0131', 'i'), ('\u017f', 's'))
+
+
+class InjectionScanner:
+    """
+    Procura todos os padrões numa única passada: uma expressão regular com a
+    alternância de todos os termos, aplicada ao texto já em minúsculas (com
+    re.IGNORECASE o `re` perde o filtro rápido pelo primeiro caractere e fica
+    várias vezes mais lento). Os pares `a.*b` viram estado (onde cada `a`
+    terminou na linha atual), o que dispensa o retrocesso de `.*` e permite
+    analisar o texto em blocos.
+    """
+
+    def __init__(self, patterns, sequences=()):
+        self.patterns = {self.fold(p) for p in patterns}
+        self.heads = {self.fold(head) for head, _ in sequences}
+        self.tails = {}
+        for head, tail in sequences:
+            self.tails.setdefault(self.fold(tail), set()).add(self.fold(head))
+        terms = self.patterns | self.heads | set(self.tails) | {'\n'}
+        alternation = '|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+        self.regex = re.compile(alternation)
+        # Um termo pode começar no fim de um bloco e terminar no seguinte
+        self.overlap = max(len(t) for t in terms) - 1
+
+    @staticmethod
+    def fold(text):
+        """Minúsculas, com as mesmas equivalências de re.IGNORECASE para letras ASCII."""
+        if not text.isascii():
+            # str.translate é bem mais lento que estas buscas, que quase nunca acham nada
+            for char, replacement in IGNORECASE_FOLDS:
+                if char in text:
+                    text = text.replace(char, replacement)
+        return text.lower()
+
+    def session(self):
+        """Análise incremental de um texto entregue em partes."""
+        return InjectionScanSession(self)
+
+    def scan(self, text):
+        """Primeiro padrão encontrado em `text` (ou None)."""
+        return self.session().feed(text)
+
+
+class InjectionScanSession:
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self.carry = ''
+        self.offset = 0      # Posição absoluta do início de `carry`
+        self.head_ends = {}  # Termo inicial de um par -> onde terminou na linha atual
+
+    def feed(self, text):
+        scanner = self.scanner
+        buffer = self.carry + scanner.fold(text)
+        seen = len(self.carry)
+        search = scanner.regex.search
+        match = search(buffer)
+        while match:
+            term = match.group()
+            start = match.start()
+            # Recomeça no caractere seguinte: termos podem se sobrepor ("selectable")
+            match = search(buffer, start + 1)
+            if start + len(term) <= seen:
+                continue  # Já encontrado no bloco anterior
+            if term == '\n':
+                self.head_ends.clear()
+                continue
+            if term in scanner.patterns:
+                return term
+            position = self.offset + start
+            for head in scanner.tails.get(term, ()):
+                if self.head_ends.get(head, position + 1) <= position:
+                    return f'{head}...{term}'
+            if term in scanner.heads:
+                self.head_ends.setdefault(term, position + len(term))
+        keep = min(len(buffer), scanner.overlap)
+        self.carry = buffer[len(buffer) - keep:]
+        self.offset += len(buffer) - keep
+        return None
+
+
+class ReplayStream(io.RawIOBase):
+    """Reproduz os blocos já lidos do corpo e depois continua no stream original."""
+
+    def __init__(self, chunks, stream, remaining):
+        self.buffered = io.BytesIO(b''.join(chunks))
+        self.stream = stream
+        self.remaining = remaining
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.buffered.readinto(buffer)
+        if size or self.remaining <= 0:
+            return size
+        data = self.stream.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
 class SecurityMiddleware:
     """Middleware de segurança para proteção adicional
     - Bloqueia IPs com muitas falhas
@@ -16,7 +143,7 @@ class SecurityMiddleware:
     - Valida User-Agent
     """
 
-    def __init__(self, app):
+    def __init__(self, app, max_scan_bytes=None, scan_chunk_size=None):
         self.app = app
         self.failed_attempts = {}       # Contador de falhas por IP
         self.blocked_ips = {}           # IPs bloqueados com timestamp de desbloqueio
@@ -27,6 +154,13 @@ class SecurityMiddleware:
         self.BLOCK_TIME = 900          # Tempo de bloqueio em segundos (15 minutos)
         self.SUSPICIOUS_THRESHOLD = 5  # Limite de atividades suspeitas
 
+        # Detector de injeção compilado uma única vez
+        self.injection_scanner = InjectionScanner(
+            NOSQL_PATTERNS + SQL_PATTERNS, SQL_SEQUENCE_PATTERNS
+        )
+        self.max_scan_bytes = max_scan_bytes or INJECTION_SCAN_MAX_BYTES
+        self.scan_chunk_size = scan_chunk_size or INJECTION_SCAN_CHUNK_SIZE
+
     def __call__(self, environ, start_response):
         """Intercepta TODAS as requisições antes do Flask"""
         client_ip = self.get_client_ip(environ)
@@ -92,31 +226,11 @@ class SecurityMiddleware:
         Detecta tentativas de injeção (SQL e NoSQL), ignorando o corpo
         de requisições de upload de arquivos para evitar falsos positivos.
         """
-        # Padrões de NoSQL Injection (focados em operadores perigosos e JS)
-        nosql_patterns = [
-            r'\$where',          # Operador $where, muito perigoso
-            r'mapReduce',        # Comando MapReduce
-            r'group',            # Operador de group
-            r'sleep\(',          # Tentativas de ataques de tempo (timing attacks)
-            r'benchmark\('       
-        ]
-
-        # Padrões de SQL Injection (mantidos como defesa em profundidade)
-        sql_patterns = [
-            r'union.*select', r'select.*from', r'insert.*into',
-            r'delete.*from', r'drop.*table', r'--', r'/\*',
-            r'waitfor.*delay', r'xp_cmdshell'
-        ]
-        
-        # Combinamos ambas as listas para uma verificação completa
-        all_patterns = nosql_patterns + sql_patterns
-        
         # 1. Verifica a query string (parâmetros na URL)
         query_string = environ.get('QUERY_STRING', '')
-        for pattern in all_patterns:
-            if re.search(pattern, query_string, re.IGNORECASE):
-                logging.warning(f"Injection attempt detected in query string: {query_string}")
-                return True
+        if query_string and self.injection_scanner.scan(query_string):
+            logging.warning(f"Injection attempt detected in query string: {query_string}")
+            return True
 
         # 2. Verifica o corpo (body) da requisição, EXCETO para upload de arquivos
         if environ['REQUEST_METHOD'] in ['POST', 'PUT']:
@@ -128,24 +242,45 @@ class SecurityMiddleware:
                 return False
 
             try:
-                content_length = int(environ.get('CONTENT_LENGTH', 0))
-                if content_length > 0:
-                    request_body_bytes = environ['wsgi.input'].read(content_length)
+                content_length = int(environ.get('CONTENT_LENGTH') or 0)
+                if content_length > 0 and self.scan_request_body(environ, content_length):
+                    logging.warning("Injection attempt detected in request body.")
+                    return True
+            except Exception as e:
+                logging.error(f"Error reading request body in middleware: {e}")
 
-                    # SOLUÇÃO: Substitui o stream original por um novo, em memória
-                    environ['wsgi.input'] = io.BytesIO(request_body_bytes)
+        return False
 
-                    request_body_str = request_body_bytes.decode('utf-8', 'ignore')
+    def scan_request_body(self, environ, content_length):
+        """
+        Lê o corpo em blocos de `scan_chunk_size` bytes, no máximo
+        `max_scan_bytes`, analisando cada bloco assim que chega (para no
+        primeiro padrão encontrado). O que foi lido é devolvido à aplicação
+        por um stream que reproduz esses bytes e continua no restante do corpo.
+        """
+        stream = environ['wsgi.input']
+        session = self.injection_scanner.session()
+        decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        remaining = content_length
+        budget = min(content_length, self.max_scan_bytes)
+        chunks = []
+        while budget > 0:
+            chunk = stream.read(min(self.scan_chunk_size, budget))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            budget -= len(chunk)
+            remaining -= len(chunk)
+            if session.feed(decoder.decode(chunk)):
+                return True
 
-                    for pattern in all_patterns:
-                        if re.search(pattern, request_body_str, re.IGNORECASE):
-                            logging.warning("Injection attempt detected in request body.")
-                            return True
-            except Exception as e:
-                logging.error(f"Error reading request body in middleware: {e}")
-                pass
-        
+        if remaining > 0 and budget == 0:
+            logging.info(f"Request body above {self.max_scan_bytes} bytes: only the beginning was scanned.")
+            environ['wsgi.input'] = ReplayStream(chunks, stream, remaining)
+        else:
+            environ['wsgi.input'] = io.BytesIO(b"".join(chunks))
         return False
+
     def is_sensitive_path(self, path):
         """Define rotas críticas que merecem monitoramento mais rigoroso"""
         sensitive_paths = [
@@ -0,0 +1,142 @@
+# app/sequences.py
+
+import os
+import re
+import threading
+import logging
+from pymongo import ReturnDocument
+
+from app.models import Counter, Product
+
+PRODUCT_CODE_SEQUENCE = 'product_code'
+PRODUCT_CODE_PATTERN = re.compile(r'FDS(\d+)')
+
+
+def format_product_code(number):
+    """Formata o número sequencial no padrão FDSnnnnnn."""
+    return f"FDS{number:06d}"
+
+
+def max_product_code_number():
+    """
+    Maior número de código FDS já usado pelos produtos.
+    Usado apenas uma vez, para semear o contador quando ele ainda não existe.
+    """
+    highest = 0
+    cursor = Product.collection().find({"codigo": {"$regex": r"^FDS\d+"}}, {"codigo": 1, "_id": 0})
+    for doc in cursor:
+        match = PRODUCT_CODE_PATTERN.match(doc.get("codigo") or "")
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest
+
+
+class SequenceAllocator:
+    """
+    Aloca valores de uma sequência guardada na coleção `counters`.
+
+    - Cada alocação é um `find_one_and_update` com `$inc`, portanto duas
+      requisições concorrentes (mesmo em workers diferentes) nunca recebem
+      o mesmo valor.
+    - Com `block_size > 1`, o worker reserva N valores de uma vez e os entrega
+      localmente, reduzindo as idas ao banco em importações em massa. Valores
+      reservados e não usados (ex.: reinício do worker) ficam como lacunas.
+    - Se o contador ainda não existe, ele é semeado uma única vez com
+      `seed_fn()` (ex.: o maior código já cadastrado).
+    """
+
+    def __init__(self, name, seed_fn=None, block_size=1):
+        self.name = name
+        self.seed_fn = seed_fn
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._seeded = False
+        self._next = 0   # próximo valor do bloco local
+        self._end = -1   # último valor do bloco local
+        self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        # Um bloco herdado do processo pai seria entregue em dobro pelos filhos.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._next, self._end = 0, -1
+            self._seeded = False
+
+    def ensure_seeded(self):
+        """Cria o documento do contador com o valor inicial, se necessário."""
+        if self._seeded:
+            return
+        collection = Counter.collection()
+        if collection.find_one({"_id": self.name}, {"_id": 1}) is None:
+            seed = self.seed_fn() if self.seed_fn else 0
+            # $setOnInsert torna a semeadura segura mesmo se dois workers tentarem juntos
+            collection.update_one({"_id": self.name}, {"$setOnInsert": {"seq": seed}}, upsert=True)
+            logging.info(f"Contador '{self.name}' semeado com o valor {seed}.")
+        self._seeded = True
+
+    def _reserve(self, count):
+        doc = Counter.collection().find_one_and_update(
+            {"_id": self.name},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        last = int(doc["seq"])
+        return last - count + 1, last
+
+    def next(self):
+        """Retorna o próximo valor da sequência."""
+        with self._lock:
+            self._reset_after_fork()
+            if self._next > self._end:
+                self.ensure_seeded()
+                self._next, self._end = self._reserve(self.block_size)
+            value = self._next
+            self._next += 1
+            return value
+
+    def reserve(self, count):
+        """
+        Reserva `count` valores consecutivos com uma única ida ao banco
+        (útil em importações em massa). Retorna um `range`.
+        """
+        with self._lock:
+            self._reset_after_fork()
+            self.ensure_seeded()
+            start, end = self._reserve(count)
+            return range(start, end + 1)
+
+    def peek(self):
+        """
+        Valor que a próxima chamada a `next()` deste worker provavelmente
+        retornará. Não reserva nada: é uma leitura simples pelo _id.
+        """
+        with self._lock:
+            self._reset_after_fork()
+            if self._next <= self._end:
+                return self._next
+            self.ensure_seeded()
+            doc = Counter.collection().find_one({"_id": self.name}, {"seq": 1})
+            return int(doc["seq"]) + 1 if doc else 1
+
+
+product_code_allocator = SequenceAllocator(
+    PRODUCT_CODE_SEQUENCE,
+    seed_fn=max_product_code_number,
+    block_size=int(os.getenv("PRODUCT_CODE_BLOCK_SIZE", 1))
+)
+
+
+def next_product_code():
+    """Aloca atomicamente o próximo código FDS."""
+    return format_product_code(product_code_allocator.next())
+
+
+def reserve_product_codes(count):
+    """Aloca `count` códigos FDS consecutivos de uma vez."""
+    return [format_product_code(n) for n in product_code_allocator.reserve(count)]
+
+
+def peek_next_product_code():
+    """Mostra o próximo código FDS sem alocá-lo."""
+    return format_product_code(product_code_allocator.peek())
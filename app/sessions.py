@@ -0,0 +1,84 @@
+# app/sessions.py
+# Refresh tokens rotativos. O login cria uma sessão; cada uso em
+# /token/refresh troca o refresh token por um novo (o anterior deixa de
+# valer). Se um token já trocado for reapresentado, a sessão inteira é
+# revogada, pois ele provavelmente vazou.
+
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+
+from app.models import UserSession
+
+REFRESH_TOKEN_TTL = timedelta(days=int(os.getenv("REFRESH_TOKEN_TTL_DAYS", 7)))
+
+
+def _hash_token(token):
+    # O token é aleatório (256 bits): um hash rápido basta, sem KDF.
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def create_session(user_id, user_agent=None, ip=None):
+    """Abre uma sessão para o usuário e retorna (refresh_token, id_da_sessão)."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+    result = UserSession.collection().insert_one({
+        "user_id": ObjectId(user_id),
+        "token_hash": _hash_token(token),
+        "created_at": now,
+        "last_used_at": now,
+        "expires_at": now + REFRESH_TOKEN_TTL,
+        "user_agent": (user_agent or "")[:255],
+        "ip": ip,
+    })
+    return token, result.inserted_id
+
+
+def rotate_session(token):
+    """
+    Troca `token` por um novo refresh token. Retorna (novo_token, sessão) ou
+    (None, None) se o token for inválido, expirado ou já tiver sido usado.
+    """
+    if not token:
+        return None, None
+    token_hash = _hash_token(token)
+    new_token = secrets.token_urlsafe(32)
+    now = datetime.now(timezone.utc)
+
+    session = UserSession.collection().find_one_and_update(
+        {"token_hash": token_hash, "expires_at": {"$gt": now}},
+        {"$set": {
+            "token_hash": _hash_token(new_token),
+            "previous_hash": token_hash,
+            "last_used_at": now,
+            "expires_at": now + REFRESH_TOKEN_TTL,
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+    if session is None:
+        # Reuso de um token já rotacionado: revoga a sessão correspondente
+        UserSession.collection().delete_one({"previous_hash": token_hash})
+        return None, None
+    return new_token, session
+
+
+def list_sessions(user_id=None):
+    """Sessões ativas (sem os hashes), da mais recente para a mais antiga."""
+    query = {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+    if user_id is not None:
+        query["user_id"] = ObjectId(user_id)
+    projection = {"token_hash": 0, "previous_hash": 0}
+    return list(UserSession.collection().find(query, projection).sort("last_used_at", -1))
+
+
+def revoke_session(session_id):
+    """Revoga uma sessão. Retorna True se ela existia."""
+    return UserSession.collection().delete_one({"_id": ObjectId(session_id)}).deleted_count > 0
+
+
+def revoke_user_sessions(user_id):
+    """Revoga todas as sessões do usuário. Retorna quantas foram removidas."""
+    return UserSession.collection().delete_many({"user_id": ObjectId(user_id)}).deleted_count
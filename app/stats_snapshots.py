@@ -0,0 +1,122 @@
+# app/stats_snapshots.py
+# Séries históricas do painel (gráficos de tendência).
+#
+# Um job horário copia os documentos materializados de `dashboard_stats` (não
+# relê os produtos) para `stats_snapshots` em forma compacta: contagens por
+# status, por pictograma GHS e por estado físico, total de produtos e
+# quantidade armazenada total. Cada empresa (e o total geral) recebe um ponto
+# por hora, que expira após SNAPSHOT_HOURLY_RETENTION_DAYS, e um ponto por dia
+# (o último da data), mantido. Um gráfico de seis meses lê ~180 documentos.
+
+import os
+from datetime import datetime, timedelta, timezone
+from pymongo import ReplaceOne
+
+from app.dashboard_stats import (
+    GLOBAL_STATS_ID, empresa_from_stats_id, materialize_dashboard_stats, unescape_key,
+)
+from app.models import StatsSnapshot
+
+SNAPSHOT_HOURLY_RETENTION_DAYS = int(os.getenv("SNAPSHOT_HOURLY_RETENTION_DAYS", 14))
+
+# Intervalos aceitos pela série -> granularidade lida do banco
+SERIES_INTERVALS = {"hour": "hour", "day": "day", "week": "day", "month": "day"}
+
+
+def snapshot_rollup(document):
+    """Parte compacta de um documento de `dashboard_stats` guardada no histórico."""
+    storage = document.get("storage") or {}
+    return {
+        "total": document.get("total", 0),
+        "quantidade_total": sum(
+            quantidade for states in storage.values() for quantidade in states.values() if quantidade > 0
+        ),
+        "by_status": document.get("by_status") or {},
+        "by_pictogram": document.get("by_pictogram") or {},
+        "by_physical_state": document.get("by_physical_state") or {},
+    }
+
+
+def take_snapshot(stats, snapshots, products=None, now=None):
+    """
+    Grava o ponto da hora atual (e atualiza o do dia) para o total geral e
+    cada empresa. Idempotente dentro da mesma hora. Se as estatísticas ainda
+    não tiverem sido materializadas, elas são recalculadas antes.
+    Retorna quantas séries foram gravadas.
+    """
+    now = now or datetime.now(timezone.utc)
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    expires_at = hour + timedelta(days=SNAPSHOT_HOURLY_RETENTION_DAYS)
+
+    documents = list(stats.find({}))
+    marker = next((doc for doc in documents if doc["_id"] == GLOBAL_STATS_ID), None)
+    if (marker is None or not marker.get("computed_at")) and products is not None:
+        documents = list(materialize_dashboard_stats(products, stats)["documents_by_id"].values())
+
+    operations = []
+    for document in documents:
+        empresa = empresa_from_stats_id(document["_id"])
+        rollup = snapshot_rollup(document)
+        for granularity, bucket, extra in (("hour", hour, {"expires_at": expires_at}), ("day", day, {})):
+            key = {"empresa": empresa, "granularity": granularity, "bucket": bucket}
+            operations.append(ReplaceOne(key, {**key, **rollup, **extra, "taken_at": now}, upsert=True))
+    if operations:
+        snapshots.bulk_write(operations, ordered=False)
+    return len(documents)
+
+
+def _period_start(bucket, interval):
+    if interval == "week":
+        return bucket - timedelta(days=bucket.weekday())
+    if interval == "month":
+        return bucket.replace(day=1)
+    return bucket
+
+
+def _counts(mapping):
+    return {unescape_key(key): value for key, value in (mapping or {}).items() if value > 0}
+
+
+def load_series(empresa, start, end, interval):
+    """
+    Série de pontos entre `start` (inclusivo) e `end` (exclusivo). Semanas e
+    meses usam o último ponto diário de cada período (os valores são
+    contagens do momento, não somas).
+    """
+    granularity = SERIES_INTERVALS[interval]
+    cursor = StatsSnapshot.collection().find(
+        {"empresa": empresa, "granularity": granularity, "bucket": {"$gte": start, "$lt": end}},
+        {"_id": 0, "expires_at": 0, "empresa": 0, "granularity": 0, "taken_at": 0},
+    ).sort("bucket", 1)
+
+    points = {}
+    for snapshot in cursor:
+        bucket = snapshot["bucket"]
+        if bucket.tzinfo is None:
+            bucket = bucket.replace(tzinfo=timezone.utc)
+        # Ordenado por bucket: o último de cada período sobrescreve os anteriores
+        points[_period_start(bucket, interval)] = snapshot
+    return [
+        {
+            "bucket": period.isoformat(),
+            "total": snapshot.get("total", 0),
+            "quantidade_total": snapshot.get("quantidade_total", 0),
+            "by_status": _counts(snapshot.get("by_status")),
+            "by_pictogram": _counts(snapshot.get("by_pictogram")),
+            "by_physical_state": _counts(snapshot.get("by_physical_state")),
+        }
+        for period, snapshot in points.items()
+    ]
+
+
+def default_interval(start, end):
+    """Intervalo que mantém a série em algumas centenas de pontos."""
+    span = end - start
+    if span <= timedelta(days=2):
+        return "hour"
+    if span <= timedelta(days=190):
+        return "day"
+    if span <= timedelta(days=3 * 365):
+        return "week"
+    return "month"
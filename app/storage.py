@@ -0,0 +1,293 @@
+# app/storage.py
+# Serviço de armazenamento de arquivos (PDFs) compartilhado por todas as rotas.
+# O backend é escolhido pela variável STORAGE_BACKEND:
+# - "s3" (padrão): bucket AWS S3
+# - "local": diretório em disco (LOCAL_STORAGE_PATH), para instalações sem S3,
+#   testes e benchmarks
+
+import io
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote, urlencode
+from botocore.config import Config
+from flask import current_app, url_for
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from werkzeug.security import safe_join
+
+from app.utils import get_aws_client
+
+# Ajustes do cliente S3 (pool de conexões, tentativas e timeouts)
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 20))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 3))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", 5))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", 30))
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "s3").lower()
+LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH", os.path.join(os.getcwd(), "storage"))
+LOCAL_COPY_BUFFER = 1024 * 1024
+# Endereço público da API (ex.: https://api.exemplo.com.br) usado nos links do
+# backend local. Sem ele, os links usam o host da requisição atual. Em ambos os
+# casos são absolutos, como os do S3: o front-end roda em outra origem.
+LOCAL_STORAGE_BASE_URL = os.getenv("LOCAL_STORAGE_BASE_URL", "").rstrip("/")
+
+_storage = None
+_storage_pid = None
+_storage_lock = threading.Lock()
+
+
+class StorageBackend:
+    """
+    Interface comum dos backends de armazenamento.
+
+    Uma única instância existe por processo e é compartilhada por todas as
+    requisições do worker (ver get_storage).
+    """
+
+    def public_url(self, key):
+        raise NotImplementedError
+
+    def put_stream(self, fileobj, key, content_type="application/pdf", transfer_config=None):
+        """Grava o conteúdo lido sequencialmente de `fileobj` em `key`."""
+        raise NotImplementedError
+
+    def get_stream(self, key, start=None, end=None):
+        """Abre o objeto para leitura; `start`/`end` (inclusivos) limitam a faixa de bytes."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove um objeto. Retorna False em caso de erro, sem propagar."""
+        raise NotImplementedError
+
+    def delete_many(self, keys):
+        for key in keys:
+            if key:
+                self.delete(key)
+
+    def presign(self, key, expires_in=600, disposition="inline", content_type="application/pdf"):
+        """URL temporária para leitura do objeto."""
+        raise NotImplementedError
+
+    def head(self, key=None):
+        """Metadados do objeto ou, sem `key`, verificação do backend."""
+        raise NotImplementedError
+
+
+class S3Storage(StorageBackend):
+    """Backend sobre um bucket S3 (o cliente boto3 mantém o pool de conexões)."""
+
+    def __init__(self, client, bucket, region=None):
+        self.client = client
+        self.bucket = bucket
+        self.region = region
+
+    def public_url(self, key):
+        return f"https://{self.bucket}.s3.{self.region}.amazonaws.com/{key}"
+
+    def put_stream(self, fileobj, key, content_type="application/pdf", transfer_config=None):
+        """Envia um arquivo (lido sequencialmente) para o bucket."""
+        extra = {"ExtraArgs": {"ContentType": content_type}}
+        if transfer_config is not None:
+            extra["Config"] = transfer_config
+        self.client.upload_fileobj(fileobj, self.bucket, key, **extra)
+
+    def get_stream(self, key, start=None, end=None):
+        params = {"Bucket": self.bucket, "Key": key}
+        if start is not None or end is not None:
+            params["Range"] = f"bytes={start or 0}-{'' if end is None else end}"
+        return self.client.get_object(**params)["Body"]
+
+    def delete(self, key):
+        """Remove um objeto. Erros são registrados e não propagados (limpeza best-effort)."""
+        try:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao remover o objeto {key} do S3: {e}")
+            return False
+
+    def delete_many(self, keys):
+        """Remove vários objetos com uma chamada por lote de até 1000 chaves."""
+        keys = [k for k in keys if k]
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            try:
+                self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True}
+                )
+            except Exception as e:
+                logging.error(f"Erro ao remover {len(batch)} objeto(s) do S3: {e}")
+
+    def presign(self, key, expires_in=600, disposition="inline", content_type="application/pdf"):
+        """Gera uma URL temporária de leitura do objeto."""
+        return self.client.generate_presigned_url(
+            ClientMethod='get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': key,
+                'ResponseContentDisposition': disposition,
+                'ResponseContentType': content_type
+            },
+            ExpiresIn=expires_in
+        )
+
+    def head(self, key=None):
+        """Metadados de um objeto ou, sem `key`, verificação de acesso ao bucket."""
+        if key is None:
+            return self.client.head_bucket(Bucket=self.bucket)
+        return self.client.head_object(Bucket=self.bucket, Key=key)
+
+
+class LocalStorage(StorageBackend):
+    """
+    Backend em disco local. Os arquivos são servidos pela rota /files
+    (app/routes/file_routes.py) com `send_file`, que usa sendfile do sistema
+    operacional quando disponível e atende requisições com Range.
+    As URLs temporárias são assinadas com a SECRET_KEY da aplicação.
+    """
+
+    SIGNATURE_SALT = "local-storage-download"
+
+    def __init__(self, root, base_url=None):
+        self.root = os.path.abspath(root)
+        self.base_url = (base_url or "").rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key):
+        """Caminho absoluto de `key`, recusando chaves que escapem da raiz."""
+        path = safe_join(self.root, key)
+        if path is None:
+            raise ValueError(f"Chave de armazenamento inválida: {key}")
+        return path
+
+    def _file_url(self, key, **params):
+        if self.base_url:
+            query = f"?{urlencode(params)}" if params else ""
+            return f"{self.base_url}/files/{quote(key, safe='/')}{query}"
+        return url_for("files.serve_file", key=key, _external=True, **params)
+
+    def public_url(self, key):
+        return self._file_url(key)
+
+    def put_stream(self, fileobj, key, content_type="application/pdf", transfer_config=None):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escreve em arquivo temporário e renomeia: leitores nunca veem arquivo parcial
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter(lambda: fileobj.read(LOCAL_COPY_BUFFER), b""):
+                    out.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_stream(self, key, start=None, end=None):
+        handle = open(self.path_for(key), "rb")
+        if start is None and end is None:
+            return handle
+        handle.seek(start or 0)
+        if end is None:
+            return handle
+        try:
+            data = handle.read(end - (start or 0) + 1)
+        finally:
+            handle.close()
+        return io.BytesIO(data)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path_for(key))
+            return True
+        except FileNotFoundError:
+            return True
+        except Exception as e:
+            logging.error(f"Erro ao remover o arquivo local {key}: {e}")
+            return False
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=self.SIGNATURE_SALT)
+
+    def presign(self, key, expires_in=600, disposition="inline", content_type="application/pdf"):
+        token = self._serializer().dumps({"k": key, "d": disposition, "e": expires_in})
+        return self._file_url(key, token=token)
+
+    def verify_token(self, key, token):
+        """Valida o token de `presign`. Retorna a disposição pedida ou None."""
+        try:
+            payload, signed_at = self._serializer().loads(token, return_timestamp=True)
+        except BadSignature:
+            return None
+        if payload.get("k") != key:
+            return None
+        if datetime.now(timezone.utc) - signed_at > timedelta(seconds=payload.get("e", 600)):
+            return None
+        return payload.get("d", "inline")
+
+    def head(self, key=None):
+        if key is None:
+            if not os.access(self.root, os.W_OK):
+                raise OSError(f"Diretório de armazenamento sem permissão de escrita: {self.root}")
+            return {"root": self.root}
+        stat = os.stat(self.path_for(key))
+        return {
+            "ContentLength": stat.st_size,
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        }
+
+
+def _client_config():
+    return Config(
+        max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+        retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": "standard"},
+        connect_timeout=S3_CONNECT_TIMEOUT,
+        read_timeout=S3_READ_TIMEOUT,
+        tcp_keepalive=True
+    )
+
+
+def _build_storage():
+    if STORAGE_BACKEND == "local":
+        logging.info(f"Serviço de armazenamento local inicializado em '{LOCAL_STORAGE_PATH}'.")
+        return LocalStorage(LOCAL_STORAGE_PATH, base_url=LOCAL_STORAGE_BASE_URL)
+
+    bucket = os.getenv("AWS_BUCKET_NAME")
+    if not bucket:
+        logging.error("AWS_BUCKET_NAME não definido: serviço de armazenamento indisponível.")
+        return None
+    client = get_aws_client('s3', config=_client_config())
+    if client is None:
+        return None
+    logging.info("Serviço de armazenamento S3 inicializado.")
+    return S3Storage(client, bucket, os.getenv("AWS_REGION"))
+
+
+def get_storage():
+    """
+    Retorna o serviço de armazenamento do processo atual (ou None se não
+    configurado). É criado na primeira chamada de cada worker, depois do fork
+    do Gunicorn, porque clientes boto3 não devem ser compartilhados entre
+    processos.
+    """
+    global _storage, _storage_pid
+    pid = os.getpid()
+    if _storage is not None and _storage_pid == pid:
+        return _storage
+    with _storage_lock:
+        if _storage is None or _storage_pid != pid:
+            _storage = _build_storage()
+            _storage_pid = pid if _storage is not None else None
+    return _storage
+
+
+def set_storage(storage):
+    """Substitui o serviço do processo (usado em testes e benchmarks)."""
+    global _storage, _storage_pid
+    with _storage_lock:
+        _storage = storage
+        _storage_pid = os.getpid() if storage is not None else None
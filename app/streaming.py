@@ -0,0 +1,115 @@
+# app/streaming.py
+
+import json
+import logging
+import os
+from datetime import date, datetime
+from bson.objectid import ObjectId
+from flask import Response, stream_with_context
+
+# orjson é opcional: quando instalado, a serialização fica várias vezes mais
+# rápida; sem ele usamos o módulo json da biblioteca padrão.
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+# Documentos lidos do MongoDB por lote no modo streaming (?stream=1)
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))
+
+# Quantidade aproximada de bytes acumulados antes de enviar um pedaço ao cliente
+STREAM_FLUSH_BYTES = 64 * 1024
+
+
+def json_default(value):
+    """Converte os tipos do MongoDB/Python que o JSON não conhece."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Objeto do tipo {type(value).__name__} não é serializável em JSON")
+
+
+if orjson is not None:
+    def dumps(value):
+        """Serializa `value` em JSON (ObjectId e datetime tratados nativamente)."""
+        return orjson.dumps(value, default=json_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+else:
+    _encoder = json.JSONEncoder(default=json_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(value):
+        """Serializa `value` em JSON (ObjectId e datetime tratados nativamente)."""
+        return _encoder.encode(value)
+
+
+def wants_stream(args):
+    """Indica se a requisição pediu o modo streaming (?stream=1)."""
+    return (args.get('stream') or '').lower() in ('1', 'true', 'yes')
+
+
+def iter_json_array(items):
+    """
+    Gera um array JSON em pedaços, a partir de um iterável (ex.: cursor do
+    MongoDB), sem nunca materializar a lista completa em memória.
+    """
+    buffer = ['[']
+    size = 1
+    first = True
+    try:
+        for item in items:
+            chunk = dumps(item)
+            if not first:
+                buffer.append(',')
+                size += 1
+            buffer.append(chunk)
+            size += len(chunk)
+            first = False
+            if size >= STREAM_FLUSH_BYTES:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+    except Exception as e:
+        # O status 200 já foi enviado: encerramos sem fechar o array para que
+        # o cliente perceba o JSON incompleto em vez de receber dados truncados.
+        logging.error(f"Erro durante a serialização em streaming: {e}", exc_info=True)
+        if buffer:
+            yield ''.join(buffer)
+        return
+    buffer.append(']')
+    yield ''.join(buffer)
+
+
+def stream_json_array(items, headers=None):
+    """Retorna uma `Response` que envia `items` como array JSON incremental."""
+    response = Response(iter_json_array(items), mimetype='application/json')
+    response.headers['X-Accel-Buffering'] = 'no'  # evita buffer em proxies Nginx
+    for key, value in (headers or {}).items():
+        response.headers[key] = value
+    return response
+
+
+def stream_ndjson(items, headers=None):
+    """
+    Retorna uma `Response` NDJSON (um objeto JSON por linha), enviada à medida
+    que `items` é produzido. O contexto da requisição continua disponível para
+    o gerador (ex.: leitura do arquivo enviado).
+    """
+    def generate():
+        buffer = []
+        size = 0
+        for item in items:
+            line = dumps(item) + '\n'
+            buffer.append(line)
+            size += len(line)
+            if size >= STREAM_FLUSH_BYTES:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer)
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    for key, value in (headers or {}).items():
+        response.headers[key] = value
+    return response
@@ -0,0 +1,99 @@
+# app/token_versions.py
+# Revogação de tokens JWT sem consulta ao banco por requisição.
+#
+# O login grava no token a `token_version` atual do usuário (claim "tv").
+# Quando o papel, a senha ou a existência do usuário mudam, a versão é
+# incrementada e registrada na coleção `token_versions`. Cada worker mantém
+# essa coleção (pequena) em memória e a recarrega periodicamente; tokens com
+# versão menor que a registrada são recusados.
+
+import logging
+import os
+import threading
+import time
+from pymongo import ReturnDocument
+
+from app.models import TokenVersion, User
+from app.versioning import bump_version
+
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", 15))
+
+
+class TokenVersionRegistry:
+    """Versões mínimas de token por usuário, recarregadas a cada `refresh_interval` segundos."""
+
+    def __init__(self, refresh_interval=TOKEN_VERSION_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Recarrega todas as versões do banco. Em caso de erro mantém as atuais."""
+        try:
+            versions = {doc["_id"]: int(doc["v"]) for doc in TokenVersion.collection().find({}, {"v": 1})}
+        except Exception as e:
+            logging.error(f"Erro ao recarregar versões de token: {e}")
+            versions = None
+        with self._lock:
+            if versions is not None:
+                # Preserva revogações locais ainda não vistas pela leitura
+                for user_id, version in self._versions.items():
+                    if version > versions.get(user_id, 0):
+                        versions[user_id] = version
+                self._versions = versions
+            self._loaded_at = time.monotonic()
+
+    def _maybe_refresh(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.refresh_interval:
+            self.refresh()
+
+    def is_current(self, user_id, token_version):
+        """True se um token com `token_version` ainda é aceito para o usuário."""
+        self._maybe_refresh()
+        return int(token_version or 0) >= self._versions.get(str(user_id), 0)
+
+    def note(self, user_id, version):
+        """Registra localmente uma revogação recém-gravada (efeito imediato neste worker)."""
+        with self._lock:
+            user_id = str(user_id)
+            self._versions[user_id] = max(version, self._versions.get(user_id, 0))
+
+    def clear(self):
+        with self._lock:
+            self._versions = {}
+            self._loaded_at = None
+
+
+token_versions = TokenVersionRegistry()
+
+
+def revoke_tokens(user_id, version):
+    """Recusa tokens do usuário com versão menor que `version` em todos os workers."""
+    TokenVersion.collection().update_one(
+        {"_id": str(user_id)},
+        {"$max": {"v": int(version)}},
+        upsert=True
+    )
+    token_versions.note(user_id, int(version))
+
+
+def bump_token_version(user_id, update=None, query=None):
+    """
+    Aplica `update` ($set) ao usuário incrementando `token_version` (e a
+    versão de edição) na mesma escrita e revoga os tokens emitidos antes dela.
+    `query` substitui o filtro padrão por _id (ex.: com verificação de versão).
+    Retorna o documento atualizado ou None se nenhum usuário casar com o filtro.
+    """
+    operations = bump_version({"$inc": {"token_version": 1}})
+    if update:
+        operations["$set"] = update
+    doc = User.collection().find_one_and_update(
+        query or {"_id": user_id},
+        operations,
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is not None:
+        revoke_tokens(doc["_id"], doc["token_version"])
+    return doc
@@ -0,0 +1,122 @@
+# app/upload_pipeline.py
+# Pipeline de upload de PDFs em uma única passada: o arquivo é lido uma vez,
+# em blocos grandes, e cada bloco é validado, entra no hash SHA-256 e segue
+# direto para o serviço de armazenamento (app/storage.py).
+
+import hashlib
+import os
+from boto3.s3.transfer import TransferConfig
+
+from app.storage import get_storage
+
+PDF_MAGIC = b'%PDF-'
+
+# Tamanho dos blocos lidos do arquivo enviado e das partes do multipart do S3
+UPLOAD_READ_SIZE = 1024 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_PDF_UPLOAD_BYTES = int(os.getenv("MAX_PDF_UPLOAD_MB", 25)) * 1024 * 1024
+
+_transfer_config = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_SIZE,
+    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    io_chunksize=UPLOAD_READ_SIZE,
+)
+
+
+class UploadRejected(Exception):
+    """Arquivo recusado durante o upload (não é PDF, vazio ou grande demais)."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class HashingReader:
+    """
+    Envolve o stream do arquivo enviado e, a cada `read`, atualiza o SHA-256,
+    soma o tamanho e valida a assinatura `%PDF-` e o limite de tamanho.
+
+    Propositalmente não suporta `seek`: assim o boto3 lê o arquivo em ordem,
+    uma única vez, e o hash corresponde exatamente aos bytes enviados.
+    """
+
+    def __init__(self, stream, max_bytes=MAX_PDF_UPLOAD_BYTES):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self._sha256 = hashlib.sha256()
+        self._header = b''
+        self.size = 0
+
+    def seekable(self):
+        return False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = UPLOAD_READ_SIZE
+        data = self._stream.read(size)
+        if not data:
+            return data
+
+        if len(self._header) < len(PDF_MAGIC):
+            self._header += data[:len(PDF_MAGIC) - len(self._header)]
+            if not PDF_MAGIC.startswith(self._header):
+                raise UploadRejected("O arquivo enviado não é um PDF válido.")
+
+        self.size += len(data)
+        if self.size > self._max_bytes:
+            raise UploadRejected(
+                f"O arquivo excede o tamanho máximo de {self._max_bytes // (1024 * 1024)} MB.", 413
+            )
+        self._sha256.update(data)
+        return data
+
+    def finish(self):
+        """Confere o resultado final e retorna o hash hexadecimal."""
+        if self.size == 0:
+            raise UploadRejected("O arquivo enviado está vazio.")
+        if self._header != PDF_MAGIC:
+            raise UploadRejected("O arquivo enviado não é um PDF válido.")
+        return self._sha256.hexdigest()
+
+
+def upload_pdf(file_obj, key, storage=None):
+    """
+    Envia o PDF ao armazenamento calculando hash, tamanho e validação na
+    mesma leitura. Retorna {"key", "url", "file_hash", "size"}.
+
+    Lança UploadRejected se o arquivo for recusado; nesse caso o upload é
+    interrompido (um multipart já iniciado é abortado pelo boto3).
+    """
+    storage = storage or get_storage()
+    if storage is None:
+        raise RuntimeError("Serviço de armazenamento não configurado")
+
+    stream = getattr(file_obj, 'stream', file_obj)
+    reader = HashingReader(stream)
+    try:
+        storage.put_stream(reader, key, content_type="application/pdf", transfer_config=_transfer_config)
+    except UploadRejected:
+        raise
+    except Exception as e:
+        # O boto3 encapsula exceções lançadas pelo leitor; recuperamos a original.
+        cause = e.__cause__ or e.__context__
+        if isinstance(cause, UploadRejected):
+            raise cause
+        raise
+
+    try:
+        file_hash = reader.finish()
+    except UploadRejected:
+        storage.delete(key)
+        raise
+
+    return {
+        "key": key,
+        "url": storage.public_url(key),
+        "file_hash": file_hash,
+        "size": reader.size,
+    }
@@ -1,7 +1,7 @@
 # app/utils.py
 
-from flask import jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import jsonify, g, has_app_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from bson.objectid import ObjectId
 import functools
 import logging
@@ -10,6 +10,8 @@ import boto3
 
 # Importa a classe User do módulo models
 from app.models import User
+from app.cache import TTLCache
+from app.token_versions import token_versions
 
 # Define os papéis (roles) disponíveis na aplicação
 ROLES = {
@@ -26,6 +28,76 @@ def is_valid_objectid(oid):
     except Exception:
         return False
 
+# Cache de (username, role, active, empresa) por usuário, compartilhado entre requisições
+# do worker. `invalidate_principal` remove a entrada na hora em que o usuário é
+# alterado; nos demais workers a mudança vale em até PRINCIPAL_CACHE_TTL segundos.
+_principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", 4096)),
+    ttl=int(os.getenv("PRINCIPAL_CACHE_TTL", 30))
+)
+
+
+def load_principal(user_id):
+    """
+    Retorna {"id", "username", "role", "active", "empresa"} do usuário ou None se ele
+    não existir. O resultado fica em `g.principal` (reaproveitado pelo resto
+    da requisição) e no cache entre requisições.
+    """
+    user_id = str(user_id)
+    principal = g.get('principal')
+    if principal is not None and principal["id"] == user_id:
+        return principal
+
+    principal = _principal_cache.get(user_id)
+    if principal is None:
+        user_data = User.collection().find_one(
+            {"_id": ObjectId(user_id)},
+            {"username": 1, "role": 1, "active": 1, "empresa": 1}
+        )
+        if not user_data:
+            return None
+        principal = {
+            "id": user_id,
+            "username": user_data.get("username"),
+            "role": user_data.get("role"),
+            "active": user_data.get("active", True),
+            "empresa": user_data.get("empresa"),
+        }
+        _principal_cache.set(user_id, principal)
+
+    g.principal = principal
+    return principal
+
+
+def principal_from_claims(user_id):
+    """
+    Monta o principal a partir das claims do token (role, active, tv), sem
+    consultar o banco. Retorna None para tokens antigos, sem essas claims.
+    Lança PermissionError se o token foi revogado (versão ultrapassada).
+    """
+    claims = get_jwt()
+    if "role" not in claims or "tv" not in claims:
+        return None
+    if not token_versions.is_current(user_id, claims["tv"]):
+        raise PermissionError("Token revogado")
+    principal = {
+        "id": str(user_id),
+        "username": claims.get("username"),
+        "role": claims["role"],
+        "active": claims.get("active", True),
+        "empresa": claims.get("empresa"),
+    }
+    g.principal = principal
+    return principal
+
+
+def invalidate_principal(user_id):
+    """Descarta o papel/estado em cache do usuário (alteração, desativação ou exclusão)."""
+    _principal_cache.invalidate(str(user_id))
+    if has_app_context() and (g.get('principal') or {}).get("id") == str(user_id):
+        g.pop('principal')
+
+
 def role_required(required_roles):
     def decorator(fn):
         @functools.wraps(fn)
@@ -37,15 +109,20 @@ def role_required(required_roles):
                 if not current_user_id or not is_valid_objectid(current_user_id):
                     return jsonify({"msg": "Token inválido"}), 401
                 
-                user_collection = User.collection()
-                if user_collection is None:
-                    logging.error("A coleção de usuários não está inicializada. Verifique a conexão com o banco de dados na inicialização do app.")
-                    return jsonify({"msg": "Erro de serviço: A conexão com o banco de dados não está disponível."}), 503
+                # Tokens emitidos pelo login atual trazem papel e versão nas
+                # claims: a autorização não precisa ir ao banco.
+                try:
+                    user_data = principal_from_claims(current_user_id)
+                except PermissionError:
+                    return jsonify({"msg": "Sessão expirada. Faça login novamente."}), 401
+
+                if user_data is None:
+                    user_collection = User.collection()
+                    if user_collection is None:
+                        logging.error("A coleção de usuários não está inicializada. Verifique a conexão com o banco de dados na inicialização do app.")
+                        return jsonify({"msg": "Erro de serviço: A conexão com o banco de dados não está disponível."}), 503
 
-                user_data = user_collection.find_one(
-                    {"_id": ObjectId(current_user_id)},
-                    {"username": 1, "role": 1, "active": 1}
-                )
+                    user_data = load_principal(current_user_id)
 
                 if not user_data:
                     return jsonify({"msg": "Usuário não encontrado"}), 404
@@ -69,7 +146,7 @@ def role_required(required_roles):
         return wrapper
     return decorator
 
-def get_aws_client(service_name):
+def get_aws_client(service_name, config=None):
     """Obtém cliente AWS de forma segura"""
     aws_access_key_id = os.getenv('AWS_ACCESS_KEY_ID')
     aws_secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY')
@@ -83,7 +160,7 @@ def get_aws_client(service_name):
             aws_secret_access_key=aws_secret_access_key,
             region_name=aws_region
         )
-        return session.client(service_name)
+        return session.client(service_name, config=config)
     except Exception as e:
         logging.error(f"Erro ao inicializar cliente AWS: {type(e).__name__}")
         return None
\ No newline at end of file
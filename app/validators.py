@@ -0,0 +1,52 @@
+# app/validators.py
+# Sistema completo de validação e sanitização de dados de entrada.
+
+import re
+from email_validator import validate_email, EmailNotValidError
+
+
+def validate_email_address(email, check_deliverability=True):
+    """Valida endereço de email"""
+    try:
+        v = validate_email(email, check_deliverability=check_deliverability)
+        return v.email
+    except EmailNotValidError:
+        return None
+
+def validate_password(password):
+    """Valida força da senha"""
+    # 🎯 CORREÇÃO: Adicionada verificação para senha vazia
+    if not password or len(password) < 8:
+        return False
+    if not re.search(r'[A-Z]', password):
+        return False
+    if not re.search(r'[a-z]', password):
+        return False
+    if not re.search(r'[0-9]', password):
+        return False
+    return True
+
+def sanitize_input(input_str, max_length=255):
+    """Remove caracteres potencialmente perigosos e espaços em branco desnecessários"""
+    if not input_str or not isinstance(input_str, str):
+        return None
+    cleaned = re.sub(r'[<>\(\)\&\|\;\`\$]', '', input_str)
+    # 🎯 CORREÇÃO: Adicionado .strip() para remover espaços em branco
+    return cleaned[:max_length].strip() if cleaned else None
+
+
+def validate_cpf(cpf):
+    """
+    Valida o CPF (com ou sem máscara) pelos dígitos verificadores.
+    Retorna apenas os 11 dígitos, ou None se inválido.
+    """
+    digits = re.sub(r'\D', '', str(cpf or ''))
+    if len(digits) != 11 or digits == digits[0] * 11:
+        return None
+    numbers = [int(d) for d in digits]
+    for position in (9, 10):
+        total = sum(n * w for n, w in zip(numbers[:position], range(position + 1, 1, -1)))
+        check = (total * 10) % 11 % 10
+        if numbers[position] != check:
+            return None
+    return digits
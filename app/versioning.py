@@ -0,0 +1,46 @@
+# app/versioning.py
+# Controle de concorrência otimista para edições.
+#
+# Cada escrita incrementa o campo `version` do documento. O cliente devolve a
+# versão que leu; se outra edição aconteceu no meio, o filtro do
+# `find_one_and_update` não casa e a alteração é recusada (409), sem leituras
+# extras no caminho de sucesso. Documentos antigos, sem o campo, valem como
+# versão 0.
+
+VERSION_FIELD = "version"
+
+
+def parse_expected_version(value):
+    """
+    Converte a versão enviada pelo cliente. None/"" = sem verificação.
+    Levanta ValueError se não for um inteiro não negativo.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError("versão inválida")
+    version = int(value)
+    if version < 0:
+        raise ValueError("versão inválida")
+    return version
+
+
+def versioned_filter(query, expected_version):
+    """Acrescenta ao filtro a exigência de que o documento ainda esteja em `expected_version`."""
+    if expected_version is None:
+        return query
+    query = dict(query)
+    # `None` no $in também casa com documentos que ainda não têm o campo
+    query[VERSION_FIELD] = {"$in": [0, None]} if expected_version == 0 else expected_version
+    return query
+
+
+def bump_version(update):
+    """Acrescenta `$inc: {version: 1}` às operações de atualização."""
+    update = dict(update)
+    update["$inc"] = {**update.get("$inc", {}), VERSION_FIELD: 1}
+    return update
+
+
+def current_version(doc):
+    return (doc or {}).get(VERSION_FIELD) or 0
@@ -0,0 +1,106 @@
+# app/write_behind.py
+# Gravação adiada (write-behind) de `last_access` dos usuários.
+#
+# O login apenas registra o horário em memória; uma thread do worker grava
+# tudo periodicamente com um único `bulk_write` não ordenado. Logins repetidos
+# do mesmo usuário entre duas gravações viram uma única atualização.
+
+import atexit
+import logging
+import os
+import threading
+from pymongo import UpdateOne
+
+from app.models import User
+
+LAST_ACCESS_FLUSH_SECONDS = float(os.getenv("LAST_ACCESS_FLUSH_SECONDS", 10))
+LAST_ACCESS_MAX_PENDING = int(os.getenv("LAST_ACCESS_MAX_PENDING", 5000))
+
+
+class LastAccessBuffer:
+    """
+    Acumula {user_id: último acesso} e grava em lote.
+
+    - `$max` na gravação garante que um horário mais antigo nunca sobrescreve
+      um mais novo (ex.: dois workers gravando fora de ordem).
+    - Se a gravação falhar, os horários voltam para o buffer e são tentados
+      de novo na próxima rodada.
+    - A thread de gravação é criada sob demanda em cada processo (após o fork
+      do Gunicorn) e o buffer é esvaziado quando o worker encerra (atexit).
+    """
+
+    def __init__(self, flush_interval=LAST_ACCESS_FLUSH_SECONDS, max_pending=LAST_ACCESS_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, user_id, timestamp):
+        """Registra o acesso; a gravação acontece na próxima rodada."""
+        with self._lock:
+            current = self._pending.get(user_id)
+            if current is None or timestamp > current:
+                self._pending[user_id] = timestamp
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _merge_back(self, pending):
+        with self._lock:
+            for user_id, timestamp in pending.items():
+                current = self._pending.get(user_id)
+                if current is None or timestamp > current:
+                    self._pending[user_id] = timestamp
+
+    def flush(self):
+        """Grava os acessos pendentes. Retorna quantos usuários foram enviados."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        operations = [
+            UpdateOne({"_id": user_id}, {"$max": {"last_access": timestamp}})
+            for user_id, timestamp in pending.items()
+        ]
+        try:
+            User.collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            logging.error(f"Erro ao gravar last_access de {len(pending)} usuário(s): {e}")
+            self._merge_back(pending)
+            return 0
+        return len(pending)
+
+    def _ensure_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name="last-access-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+
+last_access_buffer = LastAccessBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        last_access_buffer.flush()
+    except Exception as e:
+        logging.error(f"Erro ao gravar last_access no encerramento: {e}")
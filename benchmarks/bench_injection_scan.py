@@ -0,0 +1,79 @@
+# benchmarks/bench_injection_scan.py
+# Mede quantos MB/s de corpo de requisição o detector de injeção do
+# SecurityMiddleware analisa, comparando com o laço antigo (um re.search por
+# padrão sobre o corpo inteiro). O corpo é um JSON limpo: o pior caso, em que
+# todo o texto precisa ser lido.
+#
+# Uso:
+#   python -m benchmarks.bench_injection_scan [--size-kb 256] [--rounds 20]
+
+import argparse
+import codecs
+import json
+import re
+import time
+
+from app.security_middleware import (
+    INJECTION_SCAN_CHUNK_SIZE, NOSQL_PATTERNS, SQL_PATTERNS, SQL_SEQUENCE_PATTERNS, InjectionScanner,
+)
+
+LEGACY_PATTERNS = [
+    r'\$where', r'mapReduce', r'group', r'sleep\(', r'benchmark\(',
+    r'union.*select', r'select.*from', r'insert.*into',
+    r'delete.*from', r'drop.*table', r'--', r'/\*',
+    r'waitfor.*delay', r'xp_cmdshell'
+]
+
+
+def make_body(size_kb):
+    item = {
+        "nome": "Ácido Sulfúrico", "fornecedor": "Química União Ltda", "empresa": "ACME",
+        "local_de_armazenamento": "Almoxarifado B", "estado_fisico": "liquido",
+        "pictogramas": ["GHS05", "GHS07"], "quantidade": 12.5, "observacao": "Manter afastado de bases",
+    }
+    items = []
+    body = b""
+    while len(body) < size_kb * 1024:
+        items.append(item)
+        body = json.dumps({"produtos": items}, ensure_ascii=False).encode("utf-8")
+    return body
+
+
+def legacy_scan(body):
+    text = body.decode("utf-8", "ignore")
+    return any(re.search(pattern, text, re.IGNORECASE) for pattern in LEGACY_PATTERNS)
+
+
+def chunked_scan(scanner, body):
+    session = scanner.session()
+    decoder = codecs.getincrementaldecoder("utf-8")("ignore")
+    for start in range(0, len(body), INJECTION_SCAN_CHUNK_SIZE):
+        if session.feed(decoder.decode(body[start:start + INJECTION_SCAN_CHUNK_SIZE])):
+            return True
+    return False
+
+
+def measure(label, fn, body, rounds):
+    assert not fn(body), "o corpo de benchmark não deveria ser sinalizado"
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(body)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {len(body) * rounds / elapsed / 1e6:8.1f} MB/s")
+
+
+def run(size_kb, rounds):
+    scanner = InjectionScanner(NOSQL_PATTERNS + SQL_PATTERNS, SQL_SEQUENCE_PATTERNS)
+    body = make_body(size_kb)
+    print(f"Corpo: {len(body) / 1024:.0f} KB | rodadas: {rounds} | bloco: {INJECTION_SCAN_CHUNK_SIZE // 1024} KB")
+    measure("Laço antigo (14 x re.search)", legacy_scan, body, rounds)
+    measure("Detector único (corpo inteiro)", lambda b: bool(scanner.scan(b.decode("utf-8", "ignore"))), body, rounds)
+    measure("Detector único (em blocos)", lambda b: chunked_scan(scanner, b), body, rounds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do detector de injeção")
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    run(args.size_kb, args.rounds)
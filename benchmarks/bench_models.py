@@ -0,0 +1,118 @@
+# benchmarks/bench_models.py
+# Compara a camada de modelos atual (esquema declarativo + __slots__) com a
+# implementação anterior (classes com __dict__ e conversões escritas à mão):
+# objetos/s em from_dict e to_dict, e bytes por instância.
+#
+# Uso:
+#   python -m benchmarks.bench_models [--objects 50000]
+
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from bson.objectid import ObjectId
+
+from app.models import User
+
+
+class LegacyUser:
+    """Cópia da classe User antes do esquema declarativo (linha de base)."""
+
+    def __init__(self, username, email, password_hash, role,
+                 cpf=None, empresa=None, setor=None, data_de_nascimento=None, planta=None,
+                 _id=None, created_at=None, last_access=None):
+        self.username = username
+        self.email = email
+        self.password_hash = password_hash
+        self.role = role
+        self.cpf = cpf
+        self.empresa = empresa
+        self.setor = setor
+        self.data_de_nascimento = data_de_nascimento
+        self.planta = planta
+        self._id = _id
+        self.created_at = created_at if created_at is not None else datetime.now(timezone.utc)
+        self.last_access = last_access
+
+    def to_dict(self):
+        user_dict = {
+            "username": self.username,
+            "email": self.email,
+            "password_hash": self.password_hash,
+            "role": self.role,
+            "cpf": self.cpf,
+            "empresa": self.empresa,
+            "setor": self.setor,
+            "data_de_nascimento": self.data_de_nascimento,
+            "planta": self.planta,
+            "created_at": self.created_at,
+            "last_access": self.last_access
+        }
+        if self._id:
+            user_dict["_id"] = str(self._id)
+        return user_dict
+
+    @classmethod
+    def from_dict(cls, data):
+        created_at_data = data.get("created_at")
+        if isinstance(created_at_data, str):
+            try:
+                created_at_data = datetime.fromisoformat(created_at_data)
+            except (ValueError, TypeError):
+                pass
+        last_access_data = data.get("last_access")
+        if isinstance(last_access_data, str):
+            try:
+                last_access_data = datetime.fromisoformat(last_access_data)
+            except (ValueError, TypeError):
+                pass
+        return cls(
+            username=data.get('username'), email=data.get('email'),
+            password_hash=data.get('password_hash'), role=data.get('role'),
+            cpf=data.get('cpf'), empresa=data.get('empresa'), setor=data.get('setor'),
+            data_de_nascimento=data.get('data_de_nascimento'), planta=data.get('planta'),
+            _id=data.get('_id'), created_at=created_at_data, last_access=last_access_data
+        )
+
+
+def _documents(count):
+    now = datetime.now(timezone.utc)
+    return [{
+        "_id": ObjectId(), "username": f"usuario{i}", "email": f"usuario{i}@example.com",
+        "password_hash": "scrypt:32768:8:1$salt$hash", "role": "analista", "cpf": "52998224725",
+        "empresa": "ACME", "setor": "Qualidade", "data_de_nascimento": "1990-01-01",
+        "planta": "Planta A", "created_at": now, "last_access": now,
+    } for i in range(count)]
+
+
+def _rate(fn, items):
+    started = time.perf_counter()
+    result = [fn(item) for item in items]
+    return len(items) / (time.perf_counter() - started), result
+
+
+def _bytes_per_instance(obj):
+    # Objeto + dicionário de atributos (quando existe); os valores são os
+    # mesmos nas duas versões e não entram na conta.
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def run(count):
+    docs = _documents(count)
+    print(f"{count} documentos de usuário")
+    print(f"{'':10} {'from_dict/s':>14} {'to_dict/s':>14} {'bytes/instância':>16}")
+    for label, cls in (("antes", LegacyUser), ("depois", User)):
+        decode_rate, objects = _rate(cls.from_dict, docs)
+        encode_rate, _ = _rate(lambda obj: obj.to_dict(), objects)
+        size = _bytes_per_instance(objects[0])
+        print(f"{label:10} {decode_rate:14,.0f} {encode_rate:14,.0f} {size:16,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da camada de modelos")
+    parser.add_argument("--objects", type=int, default=50000)
+    args = parser.parse_args()
+    run(args.objects)
@@ -0,0 +1,50 @@
+# benchmarks/bench_password_hashing.py
+# Mede quantos logins (verificações de senha) por segundo o pool de hashing
+# sustenta, no total e por núcleo.
+#
+# Uso:
+#   python -m benchmarks.bench_password_hashing [--logins 200] [--threads 16]
+# Variáveis respeitadas: PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS,
+# PASSWORD_HASH_QUEUE_LIMIT (ver app/passwords.py).
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import passwords
+
+
+def run(logins, threads):
+    password = "SenhaDeBenchmark123"
+    stored_hash = passwords.hash_password(password)
+    # Aquece o pool (criação dos processos não entra na medição)
+    passwords.verify_password(stored_hash, password)
+
+    def one_login(_):
+        try:
+            return passwords.verify_password(stored_hash, password)
+        except passwords.PasswordHasherBusy:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        completed = sum(executor.map(one_login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    shed = logins - completed
+    cores = max(passwords.PASSWORD_HASH_WORKERS, 1)
+    print(f"Método: {passwords.PASSWORD_HASH_METHOD}")
+    print(f"Processos de hashing: {passwords.PASSWORD_HASH_WORKERS} (CPUs: {os.cpu_count()})")
+    print(f"Logins concluídos: {completed} | recusados (503): {shed} | tempo: {elapsed:.2f}s")
+    print(f"Logins/s: {completed / elapsed:.1f} | logins/s por núcleo: {completed / elapsed / cores:.1f}")
+    passwords.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do hashing de senhas")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16,
+                        help="requisições simultâneas (threads do servidor)")
+    args = parser.parse_args()
+    run(args.logins, args.threads)
@@ -0,0 +1,31 @@
+# tests/conftest.py
+
+import pytest
+from unittest.mock import MagicMock
+
+from app.utils import _principal_cache
+from app.dashboard_stats import invalidate_dashboard_cache
+from app.token_versions import token_versions
+from app.write_behind import last_access_buffer
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """Cada teste define seus próprios usuários mockados: os caches não podem vazar entre testes."""
+    _principal_cache.clear()
+    token_versions.clear()
+    invalidate_dashboard_cache()
+    yield
+    _principal_cache.clear()
+    token_versions.clear()
+    last_access_buffer._pending.clear()
+    invalidate_dashboard_cache()
+
+
+@pytest.fixture(autouse=True)
+def change_versions(mocker):
+    """Versões de alteração (ETags) sempre em zero, salvo quando o teste as define."""
+    collection = MagicMock()
+    collection.find.return_value = []
+    mocker.patch('app.models.ChangeVersion.collection', return_value=collection)
+    return collection
@@ -0,0 +1,126 @@
+# tests/test_bulk_import.py
+
+import io
+import json
+import pytest
+from bson.objectid import ObjectId
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from pymongo.errors import BulkWriteError
+from unittest.mock import MagicMock
+
+from app import passwords
+from app.bulk_import import import_users, iter_rows
+from app.validators import validate_cpf
+
+CSV_CONTENT = (
+    "nome_do_usuario,email,senha,nivel,cpf,empresa\n"
+    "Ana,ana@example.com,SenhaForte1,analista,529.982.247-25,ACME\n"
+    "Bruno,bruno@example.com,fraca,,,ACME\n"
+    "Carla,ana@example.com,SenhaForte1,,,ACME\n"
+    "Davi,davi@example.com,SenhaForte1,,111.111.111-11,ACME\n"
+    "Eva,eva@example.com,SenhaForte1,,,ACME\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def inline_hashing(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_WORKERS', 0)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+
+
+@pytest.fixture
+def users(mocker):
+    collection = MagicMock()
+    collection.find.return_value = []
+    mocker.patch('app.models.User.collection', return_value=collection)
+    return collection
+
+
+def test_validate_cpf():
+    assert validate_cpf("529.982.247-25") == "52998224725"
+    assert validate_cpf("52998224724") is None
+    assert validate_cpf("111.111.111-11") is None
+
+
+def test_import_reports_each_row_and_inserts_in_one_call(users):
+    users.find.return_value = [{"email": "eva@example.com", "username": "Eva"}]
+
+    results = list(import_users(iter_rows(io.BytesIO(CSV_CONTENT.encode()), 'csv')))
+
+    by_row = {r["row"]: r for r in results if "row" in r}
+    assert by_row[1]["status"] == "created"
+    assert "Senha" in by_row[2]["msg"]
+    assert by_row[3]["msg"] == "Email repetido no arquivo"
+    assert by_row[4]["msg"] == "CPF inválido"
+    assert by_row[5]["msg"] == "Email já está em uso"
+    assert results[-1] == {"summary": {"created": 1, "errors": 4, "truncated": False}}
+
+    # Duplicados conferidos com uma única consulta $in por lote
+    users.find.assert_called_once()
+    docs = users.insert_many.call_args[0][0]
+    assert users.insert_many.call_args[1] == {"ordered": False}
+    assert len(docs) == 1
+    assert docs[0]["cpf"] == "52998224725"
+    assert docs[0]["password_hash"].startswith("pbkdf2:sha256:1000$")
+
+
+def test_import_maps_insert_errors_to_rows(users):
+    lines = [json.dumps({"nome_do_usuario": f"user{i}", "email": f"u{i}@example.com", "senha": "SenhaForte1"})
+             for i in range(3)]
+    users.insert_many.side_effect = BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "dup"}]})
+
+    results = list(import_users(iter_rows(io.BytesIO("\n".join(lines).encode()), 'jsonl'), batch_size=2))
+
+    assert [r.get("status") for r in results[:3]] == ["created", "error", "created"]
+    assert users.insert_many.call_count == 2
+
+
+def test_import_reports_non_text_fields_per_row(users):
+    lines = [
+        json.dumps({"nome_do_usuario": "ana", "email": "ana@example.com", "senha": 12345678}),
+        json.dumps({"nome_do_usuario": "bia", "email": 123, "senha": "SenhaForte1"}),
+        json.dumps({"nome_do_usuario": "caio", "email": "caio@example.com", "senha": "SenhaForte1"}),
+    ]
+
+    results = list(import_users(iter_rows(io.BytesIO("\n".join(lines).encode()), 'jsonl')))
+
+    assert results[0] == {"row": 1, "status": "error", "msg": "Campo 'senha' deve ser texto"}
+    assert results[1] == {"row": 2, "status": "error", "msg": "Campo 'email' deve ser texto"}
+    assert results[2]["status"] == "created"
+    assert results[-1] == {"summary": {"created": 1, "errors": 2, "truncated": False}}
+
+
+def test_import_stops_at_max_rows(users):
+    lines = [json.dumps({"nome_do_usuario": f"user{i}", "email": f"u{i}@example.com", "senha": "SenhaForte1"})
+             for i in range(3)]
+    results = list(import_users(iter_rows(io.BytesIO("\n".join(lines).encode()), 'jsonl'), max_rows=2))
+    assert results[-1]["summary"]["truncated"] is True
+    assert len(results) == 3
+
+
+def test_import_route_streams_ndjson(users, mocker):
+    from app.routes.user_routes import user_bp
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+    app.config['TESTING'] = True
+    JWTManager(app)
+    app.register_blueprint(user_bp)
+
+    admin_id = ObjectId()
+    users.find_one.return_value = {"_id": admin_id, "role": "administrador"}
+    with app.app_context():
+        token = create_access_token(identity=str(admin_id))
+
+    response = app.test_client().post(
+        '/users/import',
+        data={"file": (io.BytesIO(CSV_CONTENT.encode()), "funcionarios.csv")},
+        headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 6
+    assert lines[-1]["summary"]["created"] == 2
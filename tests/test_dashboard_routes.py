@@ -0,0 +1,139 @@
+# tests/test_dashboard_routes.py
+
+import pytest
+from datetime import datetime, timezone
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from bson.objectid import ObjectId
+
+from app.routes.dashboard_routes import dashboard_bp
+from app.utils import ROLES
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'super-secret-test-key'
+    app.config['TESTING'] = True
+    JWTManager(app)
+    app.register_blueprint(dashboard_bp, url_prefix='/dashboard')
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def collections(mocker):
+    stats = mocker.patch('app.models.DashboardStats.collection').return_value
+    products = mocker.patch('app.models.Product.collection').return_value
+    stats.find_one.side_effect = lambda query, *args: {
+        "_id": query["_id"], "total": 4, "computed_at": datetime.now(timezone.utc)
+    }
+    products.aggregate.return_value = iter([{"counts": [
+        {"_id": {"empresa": "ACME", "status": "aprovado", "estado_fisico": "Líquido"}, "count": 2},
+    ]}])
+    return {"stats": stats, "products": products}
+
+
+def _headers(app, empresa="ACME", role=ROLES['2']):
+    with app.app_context():
+        token = create_access_token(identity=str(ObjectId()),
+                                    additional_claims={"role": role, "tv": 0, "empresa": empresa})
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_defaults_to_callers_company(client, app, collections, mocker):
+    mocker.patch('app.models.TokenVersion.collection').return_value.find.return_value = []
+
+    response = client.get('/dashboard/stats', headers=_headers(app))
+
+    assert response.status_code == 200
+    assert response.get_json()["scope"]["empresa"] == "ACME"
+    collections["stats"].find_one.assert_called_once_with({"_id": "empresa:ACME"})
+    collections["products"].aggregate.assert_not_called()
+
+
+def test_all_companies_reads_global_document(client, app, collections, mocker):
+    mocker.patch('app.models.TokenVersion.collection').return_value.find.return_value = []
+
+    response = client.get('/dashboard/stats?empresa=*', headers=_headers(app))
+
+    assert response.status_code == 200
+    assert response.get_json()["total_products"] == 4
+    collections["stats"].find_one.assert_called_once_with({"_id": "global"})
+
+
+def test_local_and_period_filters_lead_the_pipeline(client, app, collections, mocker):
+    mocker.patch('app.models.TokenVersion.collection').return_value.find.return_value = []
+
+    response = client.get('/dashboard/stats?local=Almoxarifado&from=2024-01-01&to=2024-01-31',
+                          headers=_headers(app))
+
+    assert response.status_code == 200
+    assert response.get_json()["total_products"] == 2
+    pipeline = collections["products"].aggregate.call_args[0][0]
+    assert pipeline[0] == {"$match": {
+        "empresa": "ACME",
+        "local_de_armazenamento": "Almoxarifado",
+        "created_at": {
+            "$gte": datetime(2024, 1, 1, tzinfo=timezone.utc),
+            "$lt": datetime(2024, 2, 1, tzinfo=timezone.utc),
+        },
+    }}
+    collections["stats"].find_one.assert_not_called()
+
+
+@pytest.mark.parametrize("query_string", ["from=ontem", "from=2024-02-01&to=2024-01-01"])
+def test_invalid_period_returns_400(client, app, collections, mocker, query_string):
+    mocker.patch('app.models.TokenVersion.collection').return_value.find.return_value = []
+    response = client.get(f'/dashboard/stats?{query_string}', headers=_headers(app))
+    assert response.status_code == 400
+
+
+def test_trends_serves_snapshot_series(client, app, mocker):
+    mocker.patch('app.models.TokenVersion.collection').return_value.find.return_value = []
+    snapshots = mocker.patch('app.models.StatsSnapshot.collection').return_value
+    snapshots.find.return_value.sort.return_value = [
+        {"bucket": datetime(2024, 1, 2, tzinfo=timezone.utc), "total": 5, "quantidade_total": 12.0},
+    ]
+
+    response = client.get('/dashboard/trends?from=2024-01-01&to=2024-03-31', headers=_headers(app))
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["interval"] == "day" and body["empresa"] == "ACME"
+    assert body["points"][0]["total"] == 5
+    query = snapshots.find.call_args[0][0]
+    assert query["bucket"] == {
+        "$gte": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "$lt": datetime(2024, 4, 1, tzinfo=timezone.utc),
+    }
+
+
+def test_trends_rejects_unknown_interval(client, app, mocker):
+    mocker.patch('app.models.TokenVersion.collection').return_value.find.return_value = []
+    response = client.get('/dashboard/trends?interval=minute', headers=_headers(app))
+    assert response.status_code == 400
+
+
+def test_stats_if_none_match_returns_304_without_reading_stats(client, app, collections, change_versions):
+    change_versions.find.return_value = [{"_id": "products:ACME", "v": 7}]
+    headers = _headers(app)
+
+    first = client.get('/dashboard/stats', headers=headers)
+    etag = first.headers['ETag']
+    collections["stats"].find_one.reset_mock()
+
+    second = client.get('/dashboard/stats', headers={**headers, 'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.data == b""
+    collections["stats"].find_one.assert_not_called()
+
+    # Uma escrita nos produtos da empresa muda o ETag
+    change_versions.find.return_value = [{"_id": "products:ACME", "v": 8}]
+    third = client.get('/dashboard/stats', headers={**headers, 'If-None-Match': etag})
+    assert third.status_code == 200
+    assert third.headers['ETag'] != etag
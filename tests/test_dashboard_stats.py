@@ -0,0 +1,194 @@
+# tests/test_dashboard_stats.py
+
+import threading
+import time
+from bson.objectid import ObjectId
+
+from app.dashboard_stats import (
+    apply_product_change, build_stats_documents, dashboard_facet_pipeline, escape_key,
+    format_dashboard_stats, invalidate_dashboard_cache, load_dashboard_stats,
+    product_contribution, unescape_key,
+)
+
+
+def _product(**fields):
+    doc = {"_id": ObjectId(), "status": "pendente", "empresa": "ACME", "estado_fisico": "Líquido"}
+    doc.update(fields)
+    return doc
+
+
+def test_escape_key_roundtrip():
+    for value in ["a.b", "$set", "100%", "%2E", "", None, "Líquido"]:
+        key = escape_key(value)
+        assert "." not in key and not key.startswith("$")
+        assert unescape_key(key) == value
+
+
+def test_product_contribution_counts_each_hazard_once():
+    doc = _product(
+        perigos_fisicos=["GHS02"], perigos_saude=["GHS02", "GHS07"], quantidade_armazenada="2.5"
+    )
+    contribution = product_contribution(doc)
+    assert contribution["total"] == 1
+    assert contribution["by_pictogram.GHS02"] == 1
+    assert contribution["danger.fisico"] == 1 and contribution["danger.saude"] == 1
+    assert "danger.meio_ambiente" not in contribution
+    assert contribution["storage.ACME.LÍQUIDO"] == 2.5
+
+
+def test_apply_change_moves_product_between_companies(mocker):
+    stats = mocker.patch('app.models.DashboardStats.collection').return_value
+    before = _product(empresa="ACME")
+    after = {**before, "empresa": "Beta"}
+
+    apply_product_change(before, after)
+
+    updates = {op._filter["_id"]: op._doc for op in stats.bulk_write.call_args[0][0]}
+    assert updates["global"]["$inc"] == {"by_company.Beta": 1, "by_company.ACME": -1}
+    assert updates["empresa:ACME"]["$inc"]["total"] == -1
+    assert updates["empresa:Beta"]["$inc"]["total"] == 1
+
+
+def test_unapproving_last_approved_refreshes_it(mocker):
+    stats = mocker.patch('app.models.DashboardStats.collection').return_value
+    products = mocker.patch('app.models.Product.collection').return_value
+    previous = {"_id": ObjectId(), "nome_do_produto": "Acetona"}
+    products.find_one.return_value = previous
+    before = _product(status="aprovado", empresa=None)
+
+    apply_product_change(before, {**before, "status": "rejeitado"})
+
+    stats.update_one.assert_called_once_with(
+        {"_id": "global", "last_approved.id": before["_id"]},
+        {"$set": {"last_approved": {"id": previous["_id"], "nome": "Acetona"}}}
+    )
+
+
+def _facets():
+    """Resultado do $facet para: 2 produtos da ACME (um aprovado) e 1 da Beta."""
+    approved_id = ObjectId()
+    return approved_id, {
+        "counts": [
+            {"_id": {"empresa": "ACME", "status": "pendente", "estado_fisico": "Líquido"},
+             "count": 1, "fisico": 0, "saude": 1, "meio_ambiente": 0},
+            {"_id": {"empresa": "ACME", "status": "aprovado", "estado_fisico": "Líquido"},
+             "count": 1, "fisico": 0, "saude": 0, "meio_ambiente": 0},
+            {"_id": {"empresa": "Beta", "status": "pendente", "estado_fisico": "Sólido"},
+             "count": 1, "fisico": 0, "saude": 0, "meio_ambiente": 0},
+        ],
+        "pictograms": [{"_id": {"empresa": "ACME", "pictograma": "GHS07"}, "count": 1}],
+        "storage": [
+            {"_id": {"empresa": "ACME", "estado_fisico": "Líquido"}, "quantidade": 6.0},
+            {"_id": {"empresa": "ACME", "estado_fisico": "líquido"}, "quantidade": 4.0},
+        ],
+        "last_approved": [{"_id": "ACME", "id": approved_id, "nome": "Tolueno"}],
+    }
+
+
+def test_build_and_format_match_dashboard_shape():
+    approved_id, facets = _facets()
+    docs = build_stats_documents(facets)
+
+    assert set(docs) == {"global", "empresa:ACME", "empresa:Beta"}
+    assert docs["empresa:ACME"]["last_approved"]["id"] == approved_id
+    assert docs["empresa:Beta"]["last_approved"] is None
+    stats = format_dashboard_stats(docs["global"])
+    assert stats["total_products"] == 3
+    assert stats["last_approved_product"] == "Tolueno"
+    assert stats["products_by_company"] == [{"_id": "ACME", "count": 2}, {"_id": "Beta", "count": 1}]
+    assert stats["products_by_status"][0] == {"_id": "pendente", "count": 2}
+    assert stats["products_by_pictogram"] == [{"pictograma": "GHS07", "quantidade_produtos": 1}]
+    assert stats["storage_by_company_and_state"] == [
+        {"empresa": "ACME", "dados_por_estado": [{"estado_fisico": "LÍQUIDO", "quantidade": 10.0}]}
+    ]
+    assert {"tipo": "À Saúde", "quantidade": 1} in stats["danger_classification"]
+
+
+def test_incremental_contributions_match_full_recompute():
+    """Os caminhos gravados pelo $inc são os mesmos produzidos pelo recálculo."""
+    _, facets = _facets()
+    recomputed = build_stats_documents(facets)["empresa:Beta"]
+    contribution = product_contribution({"_id": ObjectId(), "empresa": "Beta", "status": "pendente",
+                                         "estado_fisico": "Sólido"})
+    for path, value in contribution.items():
+        node = recomputed
+        for part in path.split("."):
+            node = node[part]
+        assert node == value
+
+
+def test_accented_state_keeps_one_bucket_after_recompute():
+    """Incrementos depois de um recálculo caem no mesmo balde de armazenamento."""
+    _, facets = _facets()
+    document = build_stats_documents(facets)["empresa:ACME"]
+    contribution = product_contribution(_product(quantidade_armazenada="5"))
+
+    for path, value in contribution.items():
+        *parents, leaf = path.split(".")
+        node = document
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = node.get(leaf, 0) + value
+
+    assert document["storage"] == {"ACME": {"LÍQUIDO": 15.0}}
+    assert format_dashboard_stats(document)["storage_by_company_and_state"] == [
+        {"empresa": "ACME", "dados_por_estado": [{"estado_fisico": "LÍQUIDO", "quantidade": 15.0}]}
+    ]
+
+
+def test_facet_pipeline_projects_once_and_filters_first():
+    pipeline = dashboard_facet_pipeline({"empresa": "ACME"})
+    assert pipeline[0] == {"$match": {"empresa": "ACME"}}
+    assert "$project" in pipeline[1]
+    assert set(pipeline[2]["$facet"]) == {"counts", "pictograms", "storage", "last_approved"}
+    assert "$match" not in dashboard_facet_pipeline()[0]
+
+
+def test_load_recomputes_until_materialized(mocker):
+    stats = mocker.patch('app.models.DashboardStats.collection').return_value
+    products = mocker.patch('app.models.Product.collection').return_value
+    # Documento criado só por incrementos (sem recálculo completo)
+    stats.find_one.return_value = {"_id": "global", "total": 1}
+    products.aggregate.return_value = iter([_facets()[1]])
+
+    document = load_dashboard_stats()
+
+    assert document["total"] == 3
+    products.aggregate.assert_called_once()
+    stats.bulk_write.assert_called_once()
+
+    # Já materializado: uma leitura por _id, servida do cache por alguns segundos
+    invalidate_dashboard_cache()
+    stats.find_one.return_value = {**document}
+    products.aggregate.reset_mock()
+    assert load_dashboard_stats()["total"] == 3
+    assert load_dashboard_stats()["total"] == 3
+    products.aggregate.assert_not_called()
+    assert stats.find_one.call_count == 2
+
+
+def test_concurrent_loads_share_one_computation(mocker):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_load(empresa):
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"_id": "global", "total": 7}
+
+    mocker.patch('app.dashboard_stats._load_materialized', side_effect=slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load_dashboard_stats())) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [doc["total"] for doc in results] == [7] * 5
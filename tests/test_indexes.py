@@ -0,0 +1,139 @@
+# tests/test_indexes.py
+
+import pytest
+from unittest.mock import MagicMock
+
+from app.indexes import ensure_indexes, verify_indexes, index_registry
+
+
+def _index(name, key, **options):
+    return {"name": name, "key": key, **options}
+
+
+def _declared(model):
+    """Índice como o banco o lista depois de criado a partir do registro."""
+    return {**model.document, "key": dict(model.document["key"])}
+
+
+@pytest.fixture
+def database():
+    """Simula um banco cujas coleções têm apenas os índices informados em `existing`."""
+    collections = {}
+    existing = {}
+
+    def get_collection(name):
+        if name not in collections:
+            collection = MagicMock()
+            collection.list_indexes.side_effect = lambda n=name: [_index("_id_", {"_id": 1})] + existing.get(n, [])
+            collection.create_indexes.side_effect = lambda models: [m.document["name"] for m in models]
+            collections[name] = collection
+        return collections[name]
+
+    db = MagicMock()
+    db.__getitem__.side_effect = get_collection
+    db.existing = existing
+    db.collections = collections
+    return db
+
+
+def test_ensure_indexes_creates_only_missing(database):
+    """Índices já presentes não são recriados; os ausentes são criados de uma vez."""
+    database.existing['users'] = [_index("email_1", {"email": 1})]
+
+    created = ensure_indexes(database)
+
+    assert "email_1" not in created['users']
+    assert "username_1__id_1" in created['users']
+    assert set(created['products']) == {m.document["name"] for m in index_registry()['products']}
+
+
+def test_every_user_sort_key_has_a_keyset_index():
+    """Cada chave de ordenação da listagem de usuários tem índice (campo, _id)."""
+    from app.routes.user_routes import USER_SORT_KEYS
+    keys = [list(dict(m.document["key"])) for m in index_registry()['users']]
+    for field in USER_SORT_KEYS.values():
+        if field != "_id":
+            assert [field, "_id"] in keys
+
+
+def test_ensure_indexes_creates_each_index_separately(database):
+    """Um índice que falha (ex.: único sobre duplicados) não impede os demais."""
+    from pymongo.errors import OperationFailure
+    users = database['users']
+
+    def create(models):
+        if models[0].document["name"] == "email_1":
+            raise OperationFailure("E11000 duplicate key error")
+        return [m.document["name"] for m in models]
+    users.create_indexes.side_effect = create
+
+    failed = {}
+    created = ensure_indexes(database, failed=failed)
+
+    assert all(len(call[0][0]) == 1 for call in users.create_indexes.call_args_list)
+    assert "email_1" not in created['users']
+    assert {"email_1__id_1", "username_1__id_1"} <= set(created['users'])
+    assert list(failed) == ['users'] and "E11000" in failed['users']['email_1']
+
+
+def test_ensure_indexes_is_idempotent(database):
+    for collection_name, models in index_registry().items():
+        database.existing[collection_name] = [_index(m.document["name"], dict(m.document["key"])) for m in models]
+
+    assert ensure_indexes(database) == {}
+    for collection in database.collections.values():
+        collection.create_indexes.assert_not_called()
+
+
+def test_verify_indexes_reports_missing_mismatched_and_extra(database):
+    for collection_name, models in index_registry().items():
+        database.existing[collection_name] = [_declared(m) for m in models]
+    database.existing['users'] = [
+        _index("email_1", {"email": -1}),         # definição divergente
+        _index("legado_1", {"legado": 1}),        # índice que não está no registro
+    ]
+
+    report = verify_indexes(database)
+
+    assert report["ok"] is False
+    assert report["collections"]["users"] == {
+        "missing": ["email_1__id_1", "empresa_1_username_1__id_1", "role_1_username_1__id_1",
+                    "username_1__id_1"],
+        "mismatched": ["email_1"],
+        "extra": ["legado_1"],
+    }
+    assert report["collections"]["products"]["missing"] == []
+
+
+def test_verify_indexes_flags_option_drift(database):
+    """Mesma chave com unique, filtro parcial ou TTL diferentes é divergência."""
+    for collection_name, models in index_registry().items():
+        database.existing[collection_name] = [_declared(m) for m in models]
+    products = [i for i in database.existing['products'] if i["name"] != "nome_normalizado_1"]
+    database.existing['products'] = products + [
+        _index("nome_normalizado_1", {"nome_normalizado": 1}, unique=True),  # sem filtro parcial
+    ]
+    users = [i for i in database.existing['users'] if i["name"] != "email_1"]
+    database.existing['users'] = users + [_index("email_1", {"email": 1})]  # sem unique
+    database.existing['stats_snapshots'] = [
+        {**i, "expireAfterSeconds": 3600} if i["name"] == "expires_at_1" else i
+        for i in database.existing['stats_snapshots']
+    ]
+
+    report = verify_indexes(database)
+
+    assert report["ok"] is False
+    assert report["collections"]["products"]["mismatched"] == ["nome_normalizado_1"]
+    assert report["collections"]["users"]["mismatched"] == ["email_1"]
+    assert report["collections"]["stats_snapshots"]["mismatched"] == ["expires_at_1"]
+
+
+def test_verify_indexes_accepts_matching_options(database):
+    for collection_name, models in index_registry().items():
+        # O servidor devolve expireAfterSeconds como double
+        database.existing[collection_name] = [
+            {**_declared(m), **({"expireAfterSeconds": 0.0} if "expireAfterSeconds" in m.document else {})}
+            for m in models
+        ]
+
+    assert verify_indexes(database)["ok"] is True
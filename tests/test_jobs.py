@@ -0,0 +1,89 @@
+# tests/test_jobs.py
+
+from unittest.mock import MagicMock
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.jobs import backfill_normalized_names
+from app.models import Product
+
+
+def test_normalize_name():
+    assert Product.normalize_name("  Álcool   ETÍLICO ") == "alcool etilico"
+    assert Product.normalize_name("Acetona") == Product.normalize_name("ACETONA")
+    assert Product.normalize_name("") is None
+    assert Product.normalize_name(None) is None
+
+
+def test_backfill_normalized_names_updates_in_batches_and_reports_duplicates():
+    """O backfill grava a chave em lotes e aponta nomes que passam a colidir."""
+    ids = [ObjectId() for _ in range(3)]
+    collection = MagicMock()
+    collection.find.side_effect = [
+        # 1ª consulta: produtos sem a chave
+        [
+            {"_id": ids[0], "nome_do_produto": "Acetona"},
+            {"_id": ids[1], "nome_do_produto": "ACETONA "},
+            {"_id": ids[2], "nome_do_produto": "Tolueno"},
+        ],
+        # 2ª consulta: verificação de duplicados
+        [
+            {"_id": ids[0], "nome_normalizado": "acetona"},
+            {"_id": ids[1], "nome_normalizado": "acetona"},
+            {"_id": ids[2], "nome_normalizado": "tolueno"},
+        ],
+    ]
+    collection.bulk_write.return_value.modified_count = 2
+    database = {Product.collection_name: collection}
+
+    result = backfill_normalized_names(database, batch_size=2)
+
+    assert collection.bulk_write.call_count == 2
+    operations = collection.bulk_write.call_args_list[0][0][0]
+    assert operations[0]._doc == {"$set": {"nome_normalizado": "acetona"}}
+    assert collection.bulk_write.call_args_list[0][1] == {"ordered": False}
+    assert result["updated"] == 4
+    assert result["duplicates"] == {"acetona": [str(ids[0]), str(ids[1])]}
+
+
+def test_backfill_reports_collisions_rejected_by_unique_index():
+    """Com o índice único já criado, nomes que colidem não interrompem o backfill."""
+    existing, legacy, other = ObjectId(), ObjectId(), ObjectId()
+    collection = MagicMock()
+    collection.find.side_effect = [
+        [{"_id": legacy, "nome_do_produto": "ACETONA"}, {"_id": other, "nome_do_produto": "Tolueno"}],
+        [{"_id": existing, "nome_normalizado": "acetona"}, {"_id": other, "nome_normalizado": "tolueno"}],
+    ]
+    collection.bulk_write.side_effect = BulkWriteError({
+        "nModified": 1,
+        "writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}],
+    })
+    database = {Product.collection_name: collection}
+
+    result = backfill_normalized_names(database)
+
+    assert result["updated"] == 1
+    assert result["collisions"] == [
+        {"_id": str(legacy), "nome_do_produto": "ACETONA", "nome_normalizado": "acetona"}
+    ]
+    assert result["duplicates"] == {"acetona": [str(existing), str(legacy)]}
+
+
+def test_recompute_dashboard_stats_replaces_documents_and_drops_stale():
+    from app.jobs import recompute_dashboard_stats
+    from app.models import DashboardStats
+    products = MagicMock()
+    products.aggregate.return_value = iter([{
+        "counts": [{"_id": {"empresa": "ACME", "status": "aprovado", "estado_fisico": "Líquido"}, "count": 1}],
+        "last_approved": [{"_id": "ACME", "id": ObjectId(), "nome": "Acetona"}],
+    }])
+    stats = MagicMock()
+    stats.delete_many.return_value.deleted_count = 1
+    database = {Product.collection_name: products, DashboardStats.collection_name: stats}
+
+    result = recompute_dashboard_stats(database)
+
+    assert result["documents"] == 2 and result["removed"] == 1 and result["total_products"] == 1
+    operations = stats.bulk_write.call_args[0][0]
+    assert {op._filter["_id"] for op in operations} == {"global", "empresa:ACME"}
+    stats.delete_many.assert_called_once_with({"_id": {"$nin": ["global", "empresa:ACME"]}})
@@ -0,0 +1,63 @@
+# tests/test_models.py
+
+import pytest
+from datetime import datetime, timezone
+from bson.objectid import ObjectId
+
+from app.models import User, Product
+
+
+def test_models_are_slotted():
+    user = User("ana", "ana@example.com", "hash", "analista")
+    assert not hasattr(user, "__dict__")
+    with pytest.raises(AttributeError):
+        user.campo_inexistente = 1
+
+
+def test_user_constructor_defaults_and_required_fields():
+    user = User("ana", "ana@example.com", "hash", "analista", empresa="ACME")
+    assert user.empresa == "ACME"
+    assert user.cpf is None and user._id is None
+    assert isinstance(user.created_at, datetime)
+
+    with pytest.raises(TypeError):
+        User("ana", "ana@example.com")
+    with pytest.raises(TypeError):
+        User("ana", "ana@example.com", "hash", "analista", apelido="x")
+
+
+def test_user_roundtrip_parses_datetime_strings():
+    oid = ObjectId()
+    user = User.from_dict({
+        "_id": oid, "username": "ana", "email": "ana@example.com", "password_hash": "h",
+        "role": "analista", "created_at": "2024-01-02T03:04:05+00:00", "last_access": None
+    })
+    assert user.created_at == datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+    doc = user.to_dict()
+    assert doc["_id"] == str(oid)
+    assert doc["created_at"] == user.created_at
+    assert "last_access" in doc and doc["last_access"] is None
+
+
+def test_product_to_dict_encodes_fields():
+    creator = ObjectId()
+    product = Product(
+        codigo="FDS000001", nome_do_produto="  Álcool  Etílico ", fornecedor="F",
+        estado_fisico="liquido", local_de_armazenamento="A1", substancias=None,
+        palavra_de_perigo="Perigo", categoria="Inflamável", status="pendente",
+        created_by_user_id=creator,
+    )
+    doc = product.to_dict()
+    assert doc["created_by_user_id"] == str(creator)
+    assert doc["nome_normalizado"] == "alcool etilico"
+    assert doc["substancias"] == [] and doc["perigos_saude"] == []
+    assert isinstance(doc["created_at"], str)
+    assert "_id" not in doc
+
+
+def test_projection_is_driven_by_schema():
+    assert User.projection("username", "email") == {"username": 1, "email": 1}
+    assert "password_hash" not in User.projection(exclude=("password_hash",))
+    with pytest.raises(ValueError):
+        User.projection("senha")
@@ -0,0 +1,135 @@
+# tests/test_passwords.py
+
+import threading
+import pytest
+from concurrent.futures import Future
+
+from app import passwords
+from app.passwords import PasswordHasherBusy, hash_password, verify_password, needs_rehash
+
+
+@pytest.fixture
+def inline_hashing(monkeypatch):
+    """Executa o KDF na própria thread, com parâmetros baratos."""
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_WORKERS', 0)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+
+
+def test_hash_and_verify_roundtrip(inline_hashing):
+    hashed = hash_password("SenhaForte123")
+    assert hashed.startswith("pbkdf2:sha256:1000$")
+    assert verify_password(hashed, "SenhaForte123")
+    assert not verify_password(hashed, "outra")
+
+
+def test_needs_rehash_when_parameters_change(inline_hashing, monkeypatch):
+    hashed = hash_password("SenhaForte123")
+    assert not needs_rehash(hashed)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:2000')
+    assert needs_rehash(hashed)
+
+
+def test_needs_rehash_compares_parsed_parameters(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Mesmo algoritmo, custo menor
+    assert needs_rehash("scrypt:16384:8:1$salt$abc")
+    # Parâmetros omitidos valem como os padrões do Werkzeug
+    assert not needs_rehash("scrypt$salt$abc")
+
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+    assert needs_rehash("pbkdf2:sha256:1000$salt$abc")
+    assert not needs_rehash(f"pbkdf2:sha256:{passwords.DEFAULT_PBKDF2_ITERATIONS}$salt$abc")
+    assert needs_rehash("scrypt:32768:8:1$salt$abc")
+    assert needs_rehash("sha256$salt$abc")
+    assert needs_rehash("pbkdf2:sha256:muitas$salt$abc")
+
+
+def test_full_queue_sheds_load(inline_hashing, monkeypatch):
+    monkeypatch.setattr(passwords, '_slots', threading.BoundedSemaphore(1))
+    passwords._slots.acquire()
+
+    with pytest.raises(PasswordHasherBusy) as exc:
+        hash_password("SenhaForte123")
+    assert exc.value.retry_after == passwords.PASSWORD_HASH_RETRY_AFTER
+
+
+class _StalledPool:
+    """Pool cujas tarefas nunca terminam sozinhas (KDF travado ou fila cheia)."""
+
+    def __init__(self, started=False):
+        self.started = started
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        if self.started:
+            future.set_running_or_notify_cancel()
+        self.futures.append(future)
+        return future
+
+
+@pytest.fixture
+def stalled_pool(monkeypatch):
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_WORKERS', 2)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_TIMEOUT', 0.01)
+    monkeypatch.setattr(passwords, '_slots', threading.BoundedSemaphore(1))
+
+    def install(started=False):
+        pool = _StalledPool(started)
+        monkeypatch.setattr(passwords, '_get_pool', lambda: pool)
+        return pool
+    return install
+
+
+def test_timeout_cancels_queued_hash_and_frees_slot(stalled_pool):
+    pool = stalled_pool()
+
+    with pytest.raises(PasswordHasherBusy):
+        hash_password("SenhaForte123")
+
+    assert pool.futures[0].cancelled()
+    assert passwords._slots.acquire(blocking=False)
+
+
+def test_slot_stays_taken_until_running_hash_finishes(stalled_pool):
+    pool = stalled_pool(started=True)
+
+    with pytest.raises(PasswordHasherBusy):
+        passwords.hash_passwords(["SenhaForte1", "SenhaForte2"])
+    # Ainda executando: a vaga continua ocupada e novos pedidos são recusados
+    with pytest.raises(PasswordHasherBusy):
+        hash_password("SenhaForte123")
+
+    for future in pool.futures:
+        future.set_result("hash")
+    assert passwords._slots.acquire(blocking=False)
+
+
+def test_batch_hashing_takes_one_slot_per_sub_batch(monkeypatch):
+    """Sub-lotes do tamanho do pool: a fila nunca recebe o lote inteiro de uma vez."""
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_WORKERS', 2)
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    monkeypatch.setattr(passwords, '_slots', threading.BoundedSemaphore(1))
+    submitted = []
+
+    class InlinePool:
+        def submit(self, fn, *args):
+            # Cada sub-lote só é enviado depois que o anterior devolveu a vaga
+            assert not passwords._slots.acquire(blocking=False)
+            submitted.append(args[0])
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+    monkeypatch.setattr(passwords, '_get_pool', lambda: InlinePool())
+
+    hashes = passwords.hash_passwords([f"SenhaForte{i}" for i in range(5)])
+
+    assert len(submitted) == 5
+    assert len(hashes) == 5 and verify_password(hashes[4], "SenhaForte4")
+    assert passwords._slots.acquire(blocking=False)
+
+
+def test_process_pool_hashing():
+    hashed = hash_password("SenhaForte123")
+    assert verify_password(hashed, "SenhaForte123")
+    passwords.shutdown()
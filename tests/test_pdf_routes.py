@@ -30,9 +30,9 @@ def client(app):
 
 @pytest.fixture
 def mocker_aws_and_db(mocker):
-    """Fixture para mockar o cliente S3 e as coleções do MongoDB."""
-    mock_s3_client = MagicMock()
-    mocker.patch('app.routes.pdf_routes.boto3.Session.client', return_value=mock_s3_client)
+    """Fixture para mockar o serviço de armazenamento (S3) e as coleções do MongoDB."""
+    mock_storage = MagicMock()
+    mocker.patch('app.routes.pdf_routes.get_storage', return_value=mock_storage)
     
     mock_pdf_metadata_collection = MagicMock()
     mock_user_collection = MagicMock()
@@ -42,11 +42,8 @@ def mocker_aws_and_db(mocker):
     mocker.patch('app.models.User.collection', return_value=mock_user_collection)
     mocker.patch('app.models.Product.collection', return_value=mock_product_collection)
     
-    mocker.patch('app.routes.pdf_routes.s3_client', mock_s3_client)
-    mocker.patch('app.routes.pdf_routes.s3_bucket_name', 'test-bucket')
-    
     return {
-        's3': mock_s3_client,
+        's3': mock_storage,
         'pdf_metadata': mock_pdf_metadata_collection,
         'users': mock_user_collection,
         'products': mock_product_collection
@@ -94,6 +91,25 @@ def test_upload_file_no_file(client, app, mocker_aws_and_db):
     assert response.status_code == 400
     assert "Nenhum arquivo enviado" in response.get_json()['error']
 
+def test_upload_to_product_bumps_version(client, app, mocker_aws_and_db, mocker):
+    """Trocar o PDF incrementa a versão: edições baseadas na versão anterior recebem 409."""
+    admin_id, product_id = ObjectId(), ObjectId()
+    headers = get_auth_headers(app, admin_id, ROLES['1'])
+    mocker_aws_and_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    mocker.patch('app.routes.pdf_routes.upload_pdf', return_value={
+        "url": "https://bucket/uploads/x.pdf", "file_hash": "abc", "size": 8
+    })
+    mocker_aws_and_db['products'].update_one.return_value.matched_count = 1
+
+    response = client.post(f'/upload/{product_id}', headers=headers, content_type='multipart/form-data',
+                           data={'file': (io.BytesIO(b"%PDF-1.4"), 'ficha.pdf')})
+
+    assert response.status_code == 200
+    query, update = mocker_aws_and_db['products'].update_one.call_args[0]
+    assert query == {"_id": product_id}
+    assert update["$inc"] == {"version": 1}
+    assert update["$set"]["file_hash"] == "abc"
+
 def test_get_pdfs_as_viewer(client, app, mocker_aws_and_db):
     """Testa se um usuário 'visualizador' vê apenas produtos aprovados com PDF."""
     viewer_id = ObjectId()
@@ -111,4 +127,23 @@ def test_get_pdfs_as_viewer(client, app, mocker_aws_and_db):
     assert response.status_code == 200
     data = response.get_json()
     assert len(data) == 1
-    assert data[0]['nome_do_produto'] == 'PDF Aprovado'
\ No newline at end of file
+    assert data[0]['nome_do_produto'] == 'PDF Aprovado'
+
+def test_get_pdfs_stream_mode(client, app, mocker_aws_and_db):
+    """Com ?stream=1 a listagem é enviada incrementalmente a partir do cursor."""
+    admin_id = ObjectId()
+    headers = get_auth_headers(app, admin_id, ROLES['1'])
+
+    mocker_aws_and_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1'], "active": True}
+    mock_products = [
+        {"_id": ObjectId(), "nome_do_produto": "PDF A", "pdf_url": "http://s3.com/a.pdf"},
+        {"_id": ObjectId(), "nome_do_produto": "PDF B", "pdf_url": "http://s3.com/b.pdf"},
+    ]
+    mocker_aws_and_db['products'].find.return_value.batch_size.return_value = mock_products
+
+    response = client.get('/pdfs?stream=1', headers=headers)
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    data = response.get_json()
+    assert [p['url_download'] for p in data] == ["http://s3.com/a.pdf", "http://s3.com/b.pdf"]
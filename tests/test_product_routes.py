@@ -6,10 +6,13 @@ from flask_jwt_extended import JWTManager, create_access_token
 from bson.objectid import ObjectId
 from unittest.mock import MagicMock, ANY
 from datetime import datetime, timezone
+import io
+import json
 
 # Importar o blueprint que queremos testar
 from app.routes.product_routes import product_bp
 from app.utils import ROLES
+from app.sequences import SequenceAllocator, PRODUCT_CODE_SEQUENCE, max_product_code_number
 
 # ============================================================
 # SETUP DO AMBIENTE DE TESTE (Fixtures) - Sem alterações aqui
@@ -40,12 +43,25 @@ def mocker_db(mocker):
     
     mock_user_collection = MagicMock()
     mocker.patch('app.models.User.collection', return_value=mock_user_collection)
+
+    mock_stats_collection = MagicMock()
+    mocker.patch('app.models.DashboardStats.collection', return_value=mock_stats_collection)
     
     return {
         'products': mock_product_collection,
-        'users': mock_user_collection
+        'users': mock_user_collection,
+        'dashboard_stats': mock_stats_collection
     }
 
+@pytest.fixture
+def mocker_counters(mocker):
+    """Mocka a coleção `counters` e usa um alocador de códigos novo em cada teste."""
+    mock_counter_collection = MagicMock()
+    mocker.patch('app.models.Counter.collection', return_value=mock_counter_collection)
+    mocker.patch('app.sequences.product_code_allocator',
+                 SequenceAllocator(PRODUCT_CODE_SEQUENCE, seed_fn=max_product_code_number))
+    return mock_counter_collection
+
 # ============================================================
 # HELPERS DE AUTENTICAÇÃO - Sem alterações aqui
 # ============================================================
@@ -114,37 +130,264 @@ def test_create_product_missing_fields(client, app, mocker_db):
     assert "Campos obrigatórios faltando" in response.get_json()['msg']
 
 
+def test_create_product_allocates_code_from_counter(client, app, mocker_db, mocker_counters, mocker):
+    """O código FDS vem de um $inc atômico na coleção counters, sem ler o último produto."""
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    mocker_db['products'].find_one.return_value = None  # sem duplicidade de nome/hash
+    mocker_db['products'].insert_one.return_value.inserted_id = ObjectId()
+    mocker.patch('app.routes.product_routes.upload_pdf', return_value={
+        "key": "uploads/acetona.pdf", "url": "http://s3/acetona.pdf", "file_hash": "abc123", "size": 17
+    })
+
+    mocker_counters.find_one.return_value = {"_id": PRODUCT_CODE_SEQUENCE}
+    mocker_counters.find_one_and_update.return_value = {"_id": PRODUCT_CODE_SEQUENCE, "seq": 42}
+
+    product_data = {
+        "nome_do_produto": "Acetona",
+        "fornecedor": "Fornecedor Teste",
+        "estado_fisico": "Líquido",
+        "local_de_armazenamento": "Armazém A",
+        "empresa": "Empresa Teste"
+    }
+    response = client.post('/products', headers=headers, content_type='multipart/form-data', data={
+        'productData': json.dumps(product_data),
+        'file': (io.BytesIO(b"%PDF-1.4 conteudo"), 'Acetona.pdf'),
+    })
+
+    assert response.status_code == 201
+    assert response.get_json()['product']['codigo'] == 'FDS000042'
+    update = mocker_counters.find_one_and_update.call_args[0][1]
+    assert update == {"$inc": {"seq": 1}}
+    mocker_db['products'].find_one.assert_any_call({"file_hash": "abc123"}, {"_id": 1})
+    inserted = mocker_db['products'].insert_one.call_args[0][0]
+    assert inserted['file_hash'] == "abc123"
+    assert inserted['pdf_s3_key'] == "uploads/acetona.pdf"
+
+def test_create_product_duplicate_file_removes_upload(client, app, mocker_db, mocker_counters, mocker):
+    """Se o hash calculado durante o upload já existe, o objeto enviado é removido."""
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    mocker_db['products'].find_one.side_effect = [None, {"_id": ObjectId()}]  # nome livre, hash repetido
+    mocker.patch('app.routes.product_routes.upload_pdf', return_value={
+        "key": "uploads/acetona.pdf", "url": "http://s3/acetona.pdf", "file_hash": "abc123", "size": 17
+    })
+    mock_delete = mocker.patch('app.routes.product_routes._discard_upload')
+
+    product_data = {
+        "nome_do_produto": "Acetona",
+        "fornecedor": "Fornecedor Teste",
+        "estado_fisico": "Líquido",
+        "local_de_armazenamento": "Armazém A",
+        "empresa": "Empresa Teste"
+    }
+    response = client.post('/products', headers=headers, content_type='multipart/form-data', data={
+        'productData': json.dumps(product_data),
+        'file': (io.BytesIO(b"%PDF-1.4 conteudo"), 'Acetona.pdf'),
+    })
+
+    assert response.status_code == 409
+    mock_delete.assert_called_once_with("uploads/acetona.pdf")
+    mocker_counters.find_one_and_update.assert_not_called()
+
+def test_create_product_duplicate_name_uses_normalized_key(client, app, mocker_db, mocker_counters):
+    """Nomes que diferem só por caixa, acentos ou espaços são considerados duplicados."""
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    mocker_db['products'].find_one.return_value = {"_id": ObjectId()}
+
+    product_data = {
+        "nome_do_produto": "Álcool  Etílico",
+        "fornecedor": "Fornecedor Teste",
+        "estado_fisico": "Líquido",
+        "local_de_armazenamento": "Armazém A",
+        "empresa": "Empresa Teste"
+    }
+    response = client.post('/products', headers=headers, content_type='multipart/form-data', data={
+        'productData': json.dumps(product_data),
+        'file': (io.BytesIO(b"%PDF-1.4"), 'Álcool  Etílico.pdf'),
+    })
+
+    assert response.status_code == 409
+    mocker_db['products'].find_one.assert_called_with({"nome_normalizado": "alcool etilico"}, {"_id": 1})
+    mocker_counters.find_one_and_update.assert_not_called()
+
+def test_create_product_checks_legacy_names_without_key(client, app, mocker_db, mocker_counters, mocker):
+    """Antes do backfill, produtos sem `nome_normalizado` ainda bloqueiam nomes repetidos."""
+    mocker.patch('app.routes.product_routes._legacy_names_pending', True)
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    legacy = {"_id": ObjectId()}
+    mocker_db['products'].find_one.side_effect = [None, legacy, legacy]
+
+    product_data = {
+        "nome_do_produto": "Acetona",
+        "fornecedor": "Fornecedor Teste",
+        "estado_fisico": "Líquido",
+        "local_de_armazenamento": "Armazém A",
+        "empresa": "Empresa Teste"
+    }
+    response = client.post('/products', headers=headers, content_type='multipart/form-data', data={
+        'productData': json.dumps(product_data),
+        'file': (io.BytesIO(b"%PDF-1.4"), 'Acetona.pdf'),
+    })
+
+    assert response.status_code == 409
+    mocker_db['products'].find_one.assert_called_with(
+        {"nome_normalizado": {"$exists": False}, "nome_do_produto": {"$regex": "^Acetona$", "$options": "i"}},
+        {"_id": 1}
+    )
+
+def test_next_code_is_a_peek(client, app, mocker_db, mocker_counters):
+    """GET /products/next-code apenas lê o contador, sem incrementá-lo."""
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    mocker_counters.find_one.return_value = {"_id": PRODUCT_CODE_SEQUENCE, "seq": 7}
+
+    response = client.get('/products/next-code', headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['next_code'] == 'FDS000008'
+    mocker_counters.find_one_and_update.assert_not_called()
+
 # 🎯 CORREÇÃO FINAL DOS TESTES QUE FALHAVAM
 def test_list_products(client, app, mocker_db):
     logged_in_user_id = ObjectId()
     product_creator_id = ObjectId()
     headers = get_auth_headers(app, logged_in_user_id)
     
-    # Esta rota precisa de 2 buscas: 1 do decorador, 1 do serializador
-    mocker_db['users'].find_one.side_effect = [
-        {"_id": logged_in_user_id, "role": ROLES['1']},
-        {"_id": product_creator_id, "username": "criador_produto"}
-    ]
+    # 1 busca do decorador; os criadores são resolvidos em lote via find($in)
+    mocker_db['users'].find_one.return_value = {"_id": logged_in_user_id, "role": ROLES['1']}
+    mocker_db['users'].find.return_value = [{"_id": product_creator_id, "username": "criador_produto"}]
 
     mock_products = [{"_id": ObjectId(), "nome_do_produto": "Produto A", "created_by_user_id": product_creator_id}]
-    mocker_db['products'].find.return_value.sort.return_value = mock_products
+    mocker_db['products'].find.return_value.sort.return_value.limit.return_value = mock_products
     
     response = client.get('/products', headers=headers)
 
     assert response.status_code == 200
     assert response.get_json()[0]['created_by'] == 'criador_produto'
 
+def test_list_products_resolves_creators_in_one_query(client, app, mocker_db):
+    """Vários produtos de vários criadores devem gerar uma única consulta de usuários."""
+    logged_in_user_id = ObjectId()
+    creator_a, creator_b = ObjectId(), ObjectId()
+    headers = get_auth_headers(app, logged_in_user_id)
+
+    mocker_db['users'].find_one.return_value = {"_id": logged_in_user_id, "role": ROLES['1']}
+    mocker_db['users'].find.return_value = [
+        {"_id": creator_a, "username": "ana"},
+        {"_id": creator_b, "username": "bruno"},
+    ]
+    mock_products = [
+        {"_id": ObjectId(), "nome_do_produto": "P1", "created_by_user_id": creator_a},
+        {"_id": ObjectId(), "nome_do_produto": "P2", "created_by_user_id": str(creator_b)},
+        {"_id": ObjectId(), "nome_do_produto": "P3", "created_by_user_id": creator_a},
+    ]
+    mocker_db['products'].find.return_value.sort.return_value.limit.return_value = mock_products
+
+    response = client.get('/products', headers=headers)
+
+    assert response.status_code == 200
+    assert [p['created_by'] for p in response.get_json()] == ['ana', 'bruno', 'ana']
+    mocker_db['users'].find.assert_called_once()
+    assert set(mocker_db['users'].find.call_args[0][0]['_id']['$in']) == {creator_a, creator_b}
+
+def test_creator_lookup_failure_is_not_cached(mocker_db):
+    """Uma falha momentânea do banco não deixa o ID cru como nome por todo o TTL."""
+    from app.routes.product_routes import _creator_name_cache, _resolve_creator_names
+    creator = ObjectId()
+    _creator_name_cache.invalidate(str(creator))
+    mocker_db['users'].find.side_effect = [Exception("timeout"), [{"_id": creator, "username": "ana"}]]
+
+    assert _resolve_creator_names([creator]) == {str(creator): str(creator)}
+    assert _resolve_creator_names([creator]) == {str(creator): "ana"}
+    assert mocker_db['users'].find.call_count == 2
+
+def test_list_products_keyset_pagination(client, app, mocker_db):
+    """Com limit=1 e dois documentos retornados, deve haver cursor para a próxima página."""
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+
+    newest, older = ObjectId(), ObjectId()
+    find_chain = mocker_db['products'].find.return_value.sort.return_value.limit
+    find_chain.return_value = [
+        {"_id": newest, "nome_do_produto": "Novo"},
+        {"_id": older, "nome_do_produto": "Antigo"},
+    ]
+
+    # Primeira página
+    response = client.get('/products?limit=1&fields=nome_do_produto', headers=headers)
+    assert response.status_code == 200
+    assert [p['nome_do_produto'] for p in response.get_json()] == ['Novo']
+    next_cursor = response.headers['X-Next-Cursor']
+    find_chain.assert_called_with(2)
+    query, projection = mocker_db['products'].find.call_args[0]
+    assert query == {}
+    assert projection == {"nome_do_produto": 1, "_id": 1}
+
+    # Segunda página: o cursor vira um filtro de keyset em _id
+    find_chain.return_value = [{"_id": older, "nome_do_produto": "Antigo"}]
+    response = client.get(f'/products?limit=1&next={next_cursor}', headers=headers)
+    assert response.status_code == 200
+    assert 'X-Next-Cursor' not in response.headers
+    query = mocker_db['products'].find.call_args[0][0]
+    assert query == {"_id": {"$lt": newest}}
+
+@pytest.mark.parametrize("query_string", [
+    "sort=fornecedor",
+    "fields=password_hash",
+    "limit=abc",
+    "next=nao-e-um-cursor",
+])
+def test_list_products_invalid_parameters(client, app, mocker_db, query_string):
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+
+    response = client.get(f'/products?{query_string}', headers=headers)
+
+    assert response.status_code == 400
+
+def test_list_products_stream_mode(client, app, mocker_db):
+    """Com ?stream=1 o catálogo inteiro é enviado como array JSON incremental."""
+    user_id = ObjectId()
+    creator_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    mocker_db['users'].find.return_value = [{"_id": creator_id, "username": "criador"}]
+
+    created_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    mock_products = [
+        {"_id": ObjectId(), "nome_do_produto": f"Produto {i}", "created_by_user_id": creator_id, "created_at": created_at}
+        for i in range(3)
+    ]
+    mocker_db['products'].find.return_value.sort.return_value.batch_size.return_value = mock_products
+
+    response = client.get('/products?stream=1', headers=headers)
+
+    assert response.status_code == 200
+    assert response.is_streamed
+    data = response.get_json()
+    assert [p['nome_do_produto'] for p in data] == ["Produto 0", "Produto 1", "Produto 2"]
+    assert data[0]['created_by'] == "criador"
+    assert data[0]['created_at'] == created_at.isoformat()
+    mocker_db['products'].find.return_value.sort.return_value.limit.assert_not_called()
+
 def test_get_product_by_id_found(client, app, mocker_db):
     logged_in_user_id = ObjectId()
     product_creator_id = ObjectId()
     product_id = ObjectId()
     headers = get_auth_headers(app, logged_in_user_id)
     
-    # Esta rota também precisa de 2 buscas: 1 do decorador, 1 do serializador
-    mocker_db['users'].find_one.side_effect = [
-        {"_id": logged_in_user_id, "role": ROLES['1']},
-        {"_id": product_creator_id, "username": "criador_produto"}
-    ]
+    mocker_db['users'].find_one.return_value = {"_id": logged_in_user_id, "role": ROLES['1']}
+    mocker_db['users'].find.return_value = [{"_id": product_creator_id, "username": "criador_produto"}]
     
     mock_product = {"_id": product_id, "nome_do_produto": "Específico", "created_by_user_id": product_creator_id}
     mocker_db['products'].find_one.return_value = mock_product
@@ -196,4 +439,220 @@ def test_delete_product_by_admin(client, app, mocker_db):
     mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
     mocker_db['products'].delete_one.return_value.deleted_count = 1
     response = client.delete(f'/products/{product_id}', headers=headers)
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+@pytest.fixture
+def download_caches():
+    """Esvazia os caches de download antes e depois de cada teste."""
+    from app.routes import product_routes
+    product_routes._presigned_url_cache.clear()
+    product_routes._product_key_cache.clear()
+    yield product_routes
+    product_routes._presigned_url_cache.clear()
+    product_routes._product_key_cache.clear()
+
+def test_download_reuses_cached_presigned_url(client, app, mocker_db, mocker, download_caches):
+    user_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['products'].find_one.return_value = {"_id": product_id, "pdf_s3_key": "fds/a.pdf"}
+    storage = MagicMock()
+    storage.presign.return_value = "https://bucket/fds/a.pdf?assinatura"
+    mocker.patch('app.routes.product_routes.get_storage', return_value=storage)
+
+    first = client.get(f'/products/{product_id}/download', headers=headers)
+    second = client.get(f'/products/{product_id}/download', headers=headers)
+
+    assert first.get_json() == second.get_json() == {"download_url": "https://bucket/fds/a.pdf?assinatura"}
+    mocker_db['products'].find_one.assert_called_once()
+    storage.presign.assert_called_once_with("fds/a.pdf", expires_in=600, disposition='inline')
+
+    stats = download_caches._presigned_url_cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["ttl"] == 600 - download_caches.DOWNLOAD_URL_SAFETY_MARGIN
+
+def test_download_cache_invalidated_on_delete(client, app, mocker_db, mocker, download_caches):
+    admin_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, admin_id)
+    mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    mocker_db['products'].find_one.return_value = {"_id": product_id, "pdf_s3_key": "fds/b.pdf"}
+    mocker_db['products'].delete_one.return_value.deleted_count = 1
+    storage = MagicMock()
+    storage.presign.return_value = "https://bucket/fds/b.pdf?assinatura"
+    mocker.patch('app.routes.product_routes.get_storage', return_value=storage)
+
+    client.get(f'/products/{product_id}/download', headers=headers)
+    client.delete(f'/products/{product_id}', headers=headers)
+
+    mocker_db['products'].find_one.return_value = None
+    response = client.get(f'/products/{product_id}/download', headers=headers)
+    assert response.status_code == 404
+
+def test_download_cache_stats_admin_only(client, app, mocker_db, download_caches):
+    analyst_id = ObjectId()
+    mocker_db['users'].find_one.return_value = {"_id": analyst_id, "role": ROLES['2']}
+    response = client.get('/products/download/cache-stats', headers=get_auth_headers(app, analyst_id))
+    assert response.status_code == 403
+
+    admin_id = ObjectId()
+    mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    response = client.get('/products/download/cache-stats', headers=get_auth_headers(app, admin_id))
+    assert response.status_code == 200
+    assert set(response.get_json()) == {"presigned_urls", "product_keys"}
+
+
+def _product_form(**data):
+    return {"productData": json.dumps(data)}
+
+
+def test_update_product_analyst_predicates_in_filter(client, app, mocker_db):
+    analyst_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, analyst_id)
+    mocker_db['users'].find_one.return_value = {"_id": analyst_id, "role": ROLES['2']}
+    mocker_db['users'].find.return_value = [{"_id": analyst_id, "username": "ana"}]
+    mocker_db['products'].find_one_and_update.return_value = {
+        "_id": product_id, "nome_do_produto": "Novo", "created_by_user_id": analyst_id, "version": 1
+    }
+
+    response = client.put(f'/products/{product_id}', data=_product_form(fornecedor="X", version=1), headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["product"]["version"] == 2
+    query, update = mocker_db['products'].find_one_and_update.call_args[0]
+    assert query == {
+        "_id": product_id,
+        "created_by_user_id": {"$in": [analyst_id, str(analyst_id)]},
+        "status": {"$ne": "aprovado"},
+        "version": 1,
+    }
+    assert update["$inc"] == {"version": 1}
+    assert update["$set"]["fornecedor"] == "X"
+    mocker_db['products'].find_one.assert_not_called()
+
+
+def test_update_product_unexpected_error_removes_new_upload(client, app, mocker_db, mocker):
+    """Se a gravação falha por um erro inesperado, o novo PDF não fica órfão no S3."""
+    admin_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, admin_id)
+    mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    mocker_db['products'].find_one.return_value = {
+        "_id": product_id, "nome_do_produto": "Acetona", "pdf_s3_key": "uploads/antigo.pdf",
+        "status": "pendente", "version": 1,
+    }
+    mocker_db['products'].find_one_and_update.side_effect = Exception("conexão perdida")
+    mocker.patch('app.routes.product_routes.upload_pdf', return_value={
+        "key": "uploads/acetona.pdf", "url": "http://s3/acetona.pdf", "file_hash": "abc123", "size": 17
+    })
+    mock_delete = mocker.patch('app.routes.product_routes._discard_upload')
+
+    data = _product_form(fornecedor="X", version=1)
+    data['file'] = (io.BytesIO(b"%PDF-1.4 conteudo"), 'Acetona.pdf')
+    response = client.put(f'/products/{product_id}', data=data, headers=headers,
+                          content_type='multipart/form-data')
+
+    assert response.status_code == 500
+    mock_delete.assert_called_once_with("uploads/acetona.pdf")
+
+
+@pytest.mark.parametrize("current, expected_status", [
+    (None, 404),
+    ({"created_by_user_id": "outro", "status": "pendente", "version": 1}, 403),
+    ({"status": "aprovado", "version": 1}, 403),
+    ({"status": "pendente", "version": 7}, 409),
+])
+def test_update_product_failure_reasons(client, app, mocker_db, current, expected_status):
+    analyst_id = ObjectId()
+    headers = get_auth_headers(app, analyst_id)
+    mocker_db['users'].find_one.return_value = {"_id": analyst_id, "role": ROLES['2']}
+    mocker_db['products'].find_one_and_update.return_value = None
+    if current is not None:
+        current.setdefault("created_by_user_id", analyst_id)
+    mocker_db['products'].find_one.return_value = current
+
+    response = client.put(f'/products/{ObjectId()}', data=_product_form(fornecedor="X", version=1), headers=headers)
+
+    assert response.status_code == expected_status
+
+
+def test_update_product_status_single_round_trip(client, app, mocker_db):
+    admin_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, admin_id)
+    mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    mocker_db['products'].find_one_and_update.return_value = {
+        "_id": product_id, "status": "pendente", "empresa": "ACME", "version": 1
+    }
+
+    response = client.put(f'/products/{product_id}/status', json={"status": "aprovado"}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["product"]["status"] == "aprovado"
+    assert response.get_json()["product"]["version"] == 2
+    query, update = mocker_db['products'].find_one_and_update.call_args[0]
+    assert query == {"_id": product_id}
+    assert update["$inc"] == {"version": 1}
+    mocker_db['products'].find_one.assert_not_called()
+
+    # Estatísticas do painel: status sai de pendente para aprovado (global e empresa)
+    operations = mocker_db['dashboard_stats'].bulk_write.call_args[0][0]
+    updates = {op._filter["_id"]: op._doc for op in operations}
+    assert set(updates) == {"global", "empresa:ACME"}
+    assert updates["global"]["$inc"] == {"by_status.aprovado": 1, "by_status.pendente": -1}
+    assert updates["global"]["$max"]["last_approved"]["id"] == product_id
+
+
+def test_delete_product_removes_it_from_dashboard_stats(client, app, mocker_db):
+    admin_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, admin_id)
+    mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    mocker_db['products'].find_one.return_value = {
+        "_id": product_id, "status": "pendente", "estado_fisico": "Líquido", "perigos_saude": ["GHS07"]
+    }
+    mocker_db['products'].delete_one.return_value.deleted_count = 1
+
+    response = client.delete(f'/products/{product_id}', headers=headers)
+
+    assert response.status_code == 200
+    (operation,) = mocker_db['dashboard_stats'].bulk_write.call_args[0][0]
+    assert operation._doc["$inc"] == {
+        "total": -1, "by_status.pendente": -1, "by_company.%null": -1,
+        "by_physical_state.Líquido": -1, "danger.saude": -1, "by_pictogram.GHS07": -1,
+    }
+
+
+def test_list_products_conditional_get(client, app, mocker_db, change_versions):
+    user_id = ObjectId()
+    headers = get_auth_headers(app, user_id)
+    mocker_db['users'].find_one.return_value = {"_id": user_id, "role": ROLES['1']}
+    mocker_db['products'].find.return_value.sort.return_value.limit.return_value = []
+    change_versions.find.return_value = [{"_id": "products", "v": 3}]
+
+    first = client.get('/products?limit=10', headers=headers)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    mocker_db['products'].find.reset_mock()
+
+    cached = client.get('/products?limit=10', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    mocker_db['products'].find.assert_not_called()
+
+    # Outros parâmetros, outro ETag
+    other = client.get('/products?limit=20', headers={**headers, 'If-None-Match': etag})
+    assert other.status_code == 200
+
+
+def test_product_writes_bump_change_versions(client, app, mocker_db, change_versions):
+    admin_id = ObjectId()
+    product_id = ObjectId()
+    headers = get_auth_headers(app, admin_id)
+    mocker_db['users'].find_one.return_value = {"_id": admin_id, "role": ROLES['1']}
+    mocker_db['products'].find_one_and_update.return_value = {"_id": product_id, "status": "pendente", "empresa": "ACME"}
+
+    response = client.put(f'/products/{product_id}', data=_product_form(empresa="Beta"), headers=headers)
+
+    assert response.status_code == 200
+    operations = change_versions.bulk_write.call_args[0][0]
+    assert {op._filter["_id"] for op in operations} == {"products", "products:ACME", "products:Beta"}
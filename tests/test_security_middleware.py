@@ -3,7 +3,7 @@
 import pytest
 import time
 import json
-from flask import Flask
+from flask import Flask, request
 from unittest.mock import MagicMock
 from werkzeug.test import Client
 from app.security_middleware import SecurityMiddleware
@@ -125,4 +125,57 @@ def test_high_frequency_is_suspicious(client, middleware, mocker):
     
     # Assert
     assert response.status_code == 400
-    assert b"Atividade suspeita detectada" in response.data
\ No newline at end of file
+    assert b"Atividade suspeita detectada" in response.data
+
+# --- Detector de injeção ---
+
+@pytest.fixture
+def echo_app():
+    """App que devolve o corpo recebido, para conferir que o middleware não o consome."""
+    app = Flask(__name__)
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return request.get_data(), 200
+    return app
+
+
+def test_injection_in_body_is_suspicious(client):
+    response = client.post('/', data=json.dumps({"filtro": {"$where": "sleep(5000)"}}),
+                           content_type='application/json', headers={'User-Agent': 'Valid User Agent'})
+    assert response.status_code == 400
+
+
+def test_injection_split_across_chunks_is_detected(dummy_app):
+    # Blocos de 4 bytes: "union" e "select" chegam quebrados em vários pedaços
+    client = Client(SecurityMiddleware(dummy_app.wsgi_app, scan_chunk_size=4))
+    response = client.post('/', data='{"nome": "x UNION ALL SELECT senha"}',
+                           content_type='application/json', headers={'User-Agent': 'Valid User Agent'})
+    assert response.status_code == 400
+
+
+def test_sequence_patterns_respect_order_and_lines(middleware):
+    scanner = middleware.injection_scanner
+    assert scanner.scan("drop selectable")           # termos sobrepostos
+    assert scanner.scan("SeLeCt * FrOm users")
+    assert not scanner.scan("from x select")          # ordem invertida
+    assert not scanner.scan("select x\nfrom y")       # linhas diferentes
+    assert not scanner.scan('{"nome": "Ácido Sulfúrico", "empresa": "União"}')
+
+
+def test_clean_body_is_replayed_to_app(echo_app):
+    body = json.dumps({"nome": "Ácido Sulfúrico", "quantidade": 10}).encode()
+    client = Client(SecurityMiddleware(echo_app.wsgi_app, scan_chunk_size=7))
+    response = client.post('/echo', data=body, content_type='application/json',
+                           headers={'User-Agent': 'Valid User Agent'})
+    assert response.status_code == 200
+    assert response.data == body
+
+
+def test_body_above_scan_cap_is_passed_through_unscanned(echo_app):
+    body = b'{"nome": "' + b"a" * 64 + b' drop table produtos"}'
+    client = Client(SecurityMiddleware(echo_app.wsgi_app, max_scan_bytes=32, scan_chunk_size=8))
+    response = client.post('/echo', data=body, content_type='application/json',
+                           headers={'User-Agent': 'Valid User Agent'})
+    # Só os primeiros 32 bytes são analisados; o corpo chega inteiro à aplicação
+    assert response.status_code == 200
+    assert response.data == body
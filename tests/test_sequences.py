@@ -0,0 +1,80 @@
+# tests/test_sequences.py
+
+import pytest
+from unittest.mock import MagicMock
+
+from app.sequences import SequenceAllocator
+
+
+@pytest.fixture
+def counters(mocker):
+    """Simula a coleção `counters` com um $inc em memória."""
+    state = {}
+    collection = MagicMock()
+
+    def find_one(query, projection=None):
+        if query["_id"] in state:
+            return {"_id": query["_id"], "seq": state[query["_id"]]}
+        return None
+
+    def update_one(query, update, upsert=False):
+        state.setdefault(query["_id"], update["$setOnInsert"]["seq"])
+
+    def find_one_and_update(query, update, upsert=False, return_document=None):
+        state[query["_id"]] = state.get(query["_id"], 0) + update["$inc"]["seq"]
+        return {"_id": query["_id"], "seq": state[query["_id"]]}
+
+    collection.find_one.side_effect = find_one
+    collection.update_one.side_effect = update_one
+    collection.find_one_and_update.side_effect = find_one_and_update
+    mocker.patch('app.models.Counter.collection', return_value=collection)
+    return collection
+
+
+def test_counter_is_seeded_once_from_existing_codes(counters):
+    """Na primeira alocação o contador é semeado com o maior código existente."""
+    seed_fn = MagicMock(return_value=120)
+    allocator = SequenceAllocator('teste', seed_fn=seed_fn)
+
+    assert allocator.next() == 121
+    assert allocator.next() == 122
+    seed_fn.assert_called_once()
+
+
+def test_block_reservation_reduces_round_trips(counters):
+    """Com block_size=10, dez valores saem de uma única ida ao banco."""
+    allocator = SequenceAllocator('bloco', block_size=10)
+
+    values = [allocator.next() for _ in range(10)]
+
+    assert values == list(range(1, 11))
+    assert counters.find_one_and_update.call_count == 1
+    assert allocator.next() == 11
+    assert counters.find_one_and_update.call_count == 2
+
+
+def test_two_allocators_never_share_values(counters):
+    """Dois workers com blocos próprios recebem faixas disjuntas."""
+    worker_a = SequenceAllocator('compartilhado', block_size=5)
+    worker_b = SequenceAllocator('compartilhado', block_size=5)
+
+    a = [worker_a.next() for _ in range(3)]
+    b = [worker_b.next() for _ in range(3)]
+
+    assert not set(a) & set(b)
+
+
+def test_peek_does_not_allocate(counters):
+    allocator = SequenceAllocator('espiar')
+
+    assert allocator.peek() == 1
+    assert allocator.peek() == 1
+    counters.find_one_and_update.assert_not_called()
+    assert allocator.next() == 1
+
+
+def test_reserve_returns_consecutive_range(counters):
+    allocator = SequenceAllocator('lote')
+
+    assert list(allocator.reserve(3)) == [1, 2, 3]
+    assert allocator.next() == 4
@@ -0,0 +1,80 @@
+# tests/test_stats_snapshots.py
+
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+
+from app.stats_snapshots import default_interval, load_series, take_snapshot
+
+
+def _stats_doc(stats_id, total, computed=True):
+    doc = {
+        "_id": stats_id,
+        "total": total,
+        "by_status": {"aprovado": total, "pendente": 0},
+        "by_pictogram": {"GHS07": 1},
+        "by_physical_state": {"Líquido": total},
+        "storage": {"ACME": {"LÍQUIDO": 2.5, "SÓLIDO": 1.0}},
+    }
+    if computed:
+        doc["computed_at"] = datetime.now(timezone.utc)
+    return doc
+
+
+def test_take_snapshot_writes_hourly_and_daily_points_per_series():
+    stats = MagicMock()
+    stats.find.return_value = [_stats_doc("global", 3), _stats_doc("empresa:ACME", 2)]
+    snapshots = MagicMock()
+    now = datetime(2024, 5, 10, 14, 37, tzinfo=timezone.utc)
+
+    assert take_snapshot(stats, snapshots, products=MagicMock(), now=now) == 2
+
+    operations = snapshots.bulk_write.call_args[0][0]
+    keys = {(op._filter["empresa"], op._filter["granularity"], op._filter["bucket"]) for op in operations}
+    assert keys == {
+        (None, "hour", datetime(2024, 5, 10, 14, tzinfo=timezone.utc)),
+        (None, "day", datetime(2024, 5, 10, tzinfo=timezone.utc)),
+        ("ACME", "hour", datetime(2024, 5, 10, 14, tzinfo=timezone.utc)),
+        ("ACME", "day", datetime(2024, 5, 10, tzinfo=timezone.utc)),
+    }
+    hourly = next(op._doc for op in operations if op._filter["granularity"] == "hour")
+    assert hourly["quantidade_total"] == 3.5
+    assert "storage" not in hourly and "expires_at" in hourly
+    assert all("expires_at" not in op._doc for op in operations if op._filter["granularity"] == "day")
+
+
+def test_take_snapshot_materializes_stats_first_when_missing():
+    stats = MagicMock()
+    stats.find.return_value = []
+    products = MagicMock()
+    products.aggregate.return_value = iter([{"counts": [
+        {"_id": {"empresa": "ACME", "status": "pendente", "estado_fisico": "Sólido"}, "count": 4},
+    ]}])
+    snapshots = MagicMock()
+
+    assert take_snapshot(stats, snapshots, products=products) == 2
+    products.aggregate.assert_called_once()
+
+
+def test_load_series_keeps_last_daily_point_of_each_week(mocker):
+    collection = mocker.patch('app.models.StatsSnapshot.collection').return_value
+    monday = datetime(2024, 5, 6, tzinfo=timezone.utc)
+    collection.find.return_value.sort.return_value = [
+        {"bucket": monday + timedelta(days=i), "total": 10 + i, "by_status": {"aprovado": 10 + i, "pendente": 0}}
+        for i in range(9)
+    ]
+
+    points = load_series("ACME", monday, monday + timedelta(days=9), "week")
+
+    assert [p["bucket"] for p in points] == [monday.isoformat(), (monday + timedelta(days=7)).isoformat()]
+    assert [p["total"] for p in points] == [16, 18]
+    assert points[0]["by_status"] == {"aprovado": 16}
+    query = collection.find.call_args[0][0]
+    assert query["granularity"] == "day" and query["empresa"] == "ACME"
+
+
+def test_default_interval_bounds_number_of_points():
+    now = datetime.now(timezone.utc)
+    assert default_interval(now - timedelta(days=1), now) == "hour"
+    assert default_interval(now - timedelta(days=180), now) == "day"
+    assert default_interval(now - timedelta(days=700), now) == "week"
+    assert default_interval(now - timedelta(days=2000), now) == "month"
@@ -0,0 +1,164 @@
+# tests/test_storage.py
+
+import io
+import os
+import pytest
+from unittest.mock import MagicMock
+
+from app import storage as storage_module
+from app.storage import S3Storage, get_storage, set_storage
+
+
+@pytest.fixture(autouse=True)
+def reset_storage():
+    set_storage(None)
+    yield
+    set_storage(None)
+
+
+def test_get_storage_builds_one_client_per_process(mocker, monkeypatch):
+    """O cliente boto3 é criado uma única vez e reaproveitado pelas chamadas seguintes."""
+    monkeypatch.setenv("AWS_BUCKET_NAME", "bucket-teste")
+    monkeypatch.setenv("AWS_REGION", "sa-east-1")
+    mock_get_client = mocker.patch('app.storage.get_aws_client', return_value=MagicMock())
+
+    first = get_storage()
+    second = get_storage()
+
+    assert first is second
+    assert first.bucket == "bucket-teste"
+    mock_get_client.assert_called_once()
+    config = mock_get_client.call_args[1]['config']
+    assert config.max_pool_connections == storage_module.S3_MAX_POOL_CONNECTIONS
+    assert config.retries == {"max_attempts": storage_module.S3_MAX_ATTEMPTS, "mode": "standard"}
+
+
+def test_get_storage_is_rebuilt_after_fork(mocker, monkeypatch):
+    """Um processo filho (worker do Gunicorn) não reutiliza o cliente do processo pai."""
+    monkeypatch.setenv("AWS_BUCKET_NAME", "bucket-teste")
+    mock_get_client = mocker.patch('app.storage.get_aws_client', side_effect=[MagicMock(), MagicMock()])
+
+    parent = get_storage()
+    mocker.patch('app.storage.os.getpid', return_value=-1)
+    child = get_storage()
+
+    assert parent is not child
+    assert mock_get_client.call_count == 2
+
+
+def test_delete_many_batches_keys():
+    client = MagicMock()
+    service = S3Storage(client, "bucket")
+
+    service.delete_many([f"uploads/{i}.pdf" for i in range(1500)] + [None])
+
+    assert client.delete_objects.call_count == 2
+    first_batch = client.delete_objects.call_args_list[0][1]['Delete']['Objects']
+    assert len(first_batch) == 1000
+
+
+def test_delete_does_not_raise():
+    client = MagicMock()
+    client.delete_object.side_effect = Exception("falha de rede")
+
+    assert S3Storage(client, "bucket").delete("uploads/x.pdf") is False
+
+
+# ==========================
+# Backend local
+# ==========================
+
+@pytest.fixture
+def local_app(tmp_path):
+    from flask import Flask
+    from app.routes.file_routes import file_bp
+    from app.storage import LocalStorage
+
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SECRET_KEY'] = 'test_secret'
+    app.register_blueprint(file_bp)
+    storage = LocalStorage(str(tmp_path))
+    set_storage(storage)
+    return app, storage
+
+
+def test_get_storage_selects_local_backend(mocker, tmp_path):
+    mocker.patch('app.storage.STORAGE_BACKEND', 'local')
+    mocker.patch('app.storage.LOCAL_STORAGE_PATH', str(tmp_path))
+    mock_get_client = mocker.patch('app.storage.get_aws_client')
+
+    storage = get_storage()
+
+    assert storage.root == str(tmp_path)
+    mock_get_client.assert_not_called()
+
+
+def test_local_put_get_range_and_delete(local_app):
+    _, storage = local_app
+
+    storage.put_stream(io.BytesIO(b"%PDF-1.4 conteudo"), "uploads/a.pdf")
+
+    assert storage.get_stream("uploads/a.pdf").read() == b"%PDF-1.4 conteudo"
+    assert storage.get_stream("uploads/a.pdf", start=5, end=7).read() == b"1.4"
+    assert storage.head("uploads/a.pdf")["ContentLength"] == 17
+    assert storage.delete("uploads/a.pdf") is True
+    with pytest.raises(FileNotFoundError):
+        storage.head("uploads/a.pdf")
+
+
+def test_local_put_discards_partial_file_on_error(local_app):
+    _, storage = local_app
+    stream = MagicMock()
+    stream.read.side_effect = [b"%PDF-", RuntimeError("conexão interrompida")]
+
+    with pytest.raises(RuntimeError):
+        storage.put_stream(stream, "uploads/b.pdf")
+
+    assert os.listdir(os.path.join(storage.root, "uploads")) == []
+
+
+def test_local_rejects_path_traversal(local_app):
+    _, storage = local_app
+    with pytest.raises(ValueError):
+        storage.path_for("../fora.pdf")
+
+
+def test_serve_file_with_signed_url_and_range(local_app):
+    app, storage = local_app
+    storage.put_stream(io.BytesIO(b"%PDF-1.4 conteudo"), "uploads/c.pdf")
+
+    with app.test_request_context(base_url="https://api.exemplo.com.br"):
+        url = storage.presign("uploads/c.pdf", disposition="inline")
+    # Absoluta: o front-end roda em outra origem
+    assert url.startswith("https://api.exemplo.com.br/files/uploads/c.pdf?token=")
+
+    client = app.test_client()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == b"%PDF-1.4 conteudo"
+    assert response.headers["Content-Disposition"] == "inline"
+
+    partial = client.get(url, headers={"Range": "bytes=0-4"})
+    assert partial.status_code == 206
+    assert partial.data == b"%PDF-"
+
+
+def test_local_urls_use_configured_base_url(tmp_path):
+    from app.storage import LocalStorage
+    storage = LocalStorage(str(tmp_path), base_url="https://arquivos.exemplo.com.br/")
+
+    assert storage.public_url("uploads/Ácido.pdf") == "https://arquivos.exemplo.com.br/files/uploads/%C3%81cido.pdf"
+
+
+def test_serve_file_rejects_invalid_token(local_app):
+    app, storage = local_app
+    storage.put_stream(io.BytesIO(b"%PDF-1.4"), "uploads/d.pdf")
+
+    with app.test_request_context():
+        other_url = storage.presign("uploads/outro.pdf")
+    token = other_url.split("token=")[1]
+
+    client = app.test_client()
+    assert client.get("/files/uploads/d.pdf?token=invalido").status_code == 403
+    assert client.get(f"/files/uploads/d.pdf?token={token}").status_code == 403
@@ -0,0 +1,67 @@
+# tests/test_upload_pipeline.py
+
+import hashlib
+import io
+import pytest
+from unittest.mock import MagicMock
+
+from app.storage import S3Storage
+from app.upload_pipeline import HashingReader, UploadRejected, upload_pdf
+
+
+def _fake_s3_client():
+    """Cliente S3 falso que consome o arquivo como o boto3 faria (leituras sequenciais)."""
+    client = MagicMock()
+    received = io.BytesIO()
+
+    def upload_fileobj(fileobj, bucket, key, ExtraArgs=None, Config=None):
+        assert not fileobj.seekable()
+        for chunk in iter(lambda: fileobj.read(1024), b""):
+            received.write(chunk)
+
+    client.upload_fileobj.side_effect = upload_fileobj
+    client.received = received
+    return client
+
+
+def test_upload_pdf_hashes_while_streaming():
+    """O hash é calculado sobre os mesmos bytes enviados, em uma só leitura."""
+    content = b"%PDF-1.7\n" + b"x" * 5000
+    client = _fake_s3_client()
+
+    result = upload_pdf(io.BytesIO(content), "uploads/teste.pdf", storage=S3Storage(client, "bucket", "sa-east-1"))
+
+    assert result["file_hash"] == hashlib.sha256(content).hexdigest()
+    assert result["size"] == len(content)
+    assert result["key"] == "uploads/teste.pdf"
+    assert result["url"] == "https://bucket.s3.sa-east-1.amazonaws.com/uploads/teste.pdf"
+    assert client.received.getvalue() == content
+
+
+def test_upload_pdf_rejects_non_pdf_before_sending():
+    client = _fake_s3_client()
+
+    with pytest.raises(UploadRejected) as exc:
+        upload_pdf(io.BytesIO(b"MZ\x90\x00 executavel"), "uploads/x.pdf", storage=S3Storage(client, "bucket", "sa-east-1"))
+
+    assert exc.value.status_code == 400
+    assert client.received.getvalue() == b""
+
+
+def test_upload_pdf_rejects_empty_file_and_cleans_up():
+    client = _fake_s3_client()
+
+    with pytest.raises(UploadRejected):
+        upload_pdf(io.BytesIO(b""), "uploads/vazio.pdf", storage=S3Storage(client, "bucket", "sa-east-1"))
+
+    client.delete_object.assert_called_once_with(Bucket="bucket", Key="uploads/vazio.pdf")
+
+
+def test_hashing_reader_enforces_size_limit():
+    reader = HashingReader(io.BytesIO(b"%PDF-" + b"0" * 100), max_bytes=50)
+
+    with pytest.raises(UploadRejected) as exc:
+        while reader.read(32):
+            pass
+
+    assert exc.value.status_code == 413
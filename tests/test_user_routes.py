@@ -134,13 +134,25 @@ def test_login_sucesso(client, mocker):
     mocker.patch('app.routes.user_routes.validate_email_address', return_value=valid_user_data['email'])
     mock_collection = mocker.patch('app.routes.user_routes.User.collection')
     mock_collection.return_value.find_one.return_value = user_from_db
-    mocker.patch('app.routes.user_routes.create_access_token', return_value="fake_jwt_token")
+    mock_token = mocker.patch('app.routes.user_routes.create_access_token', return_value="fake_jwt_token")
+    mock_sessions = mocker.patch('app.models.UserSession.collection').return_value
 
     login_data = {"email": valid_user_data['email'], "senha": valid_user_data['senha']}
     response = client.post('/login', json=login_data)
 
     assert response.status_code == 200
     assert json.loads(response.data)["access_token"] == "fake_jwt_token"
+    claims = mock_token.call_args[1]['additional_claims']
+    assert claims == {"username": "testuser", "role": "visualizador", "active": True, "empresa": None, "tv": 0}
+    # last_access vai para o buffer de gravação adiada, não para o banco
+    mock_collection.return_value.update_one.assert_not_called()
+    from app.write_behind import last_access_buffer
+    assert user_from_db["_id"] in last_access_buffer._pending
+    # O refresh token é devolvido ao cliente, mas só o hash é gravado
+    refresh_token = json.loads(response.data)["refresh_token"]
+    session_doc = mock_sessions.insert_one.call_args[0][0]
+    assert session_doc["token_hash"] != refresh_token
+    assert session_doc["user_id"] == user_from_db["_id"]
 
 
 @pytest.mark.parametrize("payload", [
@@ -276,4 +288,221 @@ def test_update_user_email_duplicado(client, mocker):
 
     # A verificação agora vai funcionar, pois o teste chegará até a validação de email duplicado.
     assert response.status_code == 409
-    assert "Email já está em uso por outro usuário" in response.get_json()["msg"]
\ No newline at end of file
+    assert "Email já está em uso por outro usuário" in response.get_json()["msg"]
+
+# ---------------------------
+# TESTES PARA /token/refresh
+# ---------------------------
+
+def test_refresh_token_rotates_and_issues_access_token(client, mocker):
+    user_id = ObjectId()
+    mock_sessions = mocker.patch('app.models.UserSession.collection').return_value
+    mock_sessions.find_one_and_update.return_value = {"_id": ObjectId(), "user_id": user_id}
+    mock_users = mocker.patch('app.routes.user_routes.User.collection').return_value
+    mock_users.find_one.return_value = {"_id": user_id, "username": "testuser", "role": "analista", "token_version": 2}
+    mock_token = mocker.patch('app.routes.user_routes.create_access_token', return_value="novo_jwt")
+    mock_check = mocker.patch('app.routes.user_routes.verify_password')
+
+    response = client.post('/token/refresh', json={"refresh_token": "token-antigo"})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["access_token"] == "novo_jwt"
+    assert body["refresh_token"] != "token-antigo"
+    assert mock_token.call_args[1]['additional_claims']["tv"] == 2
+    mock_check.assert_not_called()
+
+
+def test_refresh_token_reuse_revokes_session(client, mocker):
+    mock_sessions = mocker.patch('app.models.UserSession.collection').return_value
+    mock_sessions.find_one_and_update.return_value = None
+
+    response = client.post('/token/refresh', json={"refresh_token": "token-ja-usado"})
+
+    assert response.status_code == 401
+    revoked_query = mock_sessions.delete_one.call_args[0][0]
+    assert set(revoked_query) == {"previous_hash"}
+
+
+def test_admin_revokes_session(client, app, mocker):
+    admin_id = ObjectId()
+    session_id = ObjectId()
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    mock_users.find_one.return_value = {"_id": admin_id, "role": "administrador"}
+    mock_sessions = mocker.patch('app.models.UserSession.collection').return_value
+    mock_sessions.delete_one.return_value.deleted_count = 1
+
+    with app.app_context():
+        token = create_access_token(identity=str(admin_id))
+    response = client.delete(f'/sessions/{session_id}', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    mock_sessions.delete_one.assert_called_once_with({"_id": session_id})
+
+
+def test_login_overloaded_returns_503_with_retry_after(client, mocker):
+    from app.passwords import PasswordHasherBusy
+    mock_collection = mocker.patch('app.routes.user_routes.User.collection')
+    mock_collection.return_value.find_one.return_value = {"_id": ObjectId(), "password_hash": "scrypt:32768:8:1$x$y"}
+    mocker.patch('app.routes.user_routes.verify_password', side_effect=PasswordHasherBusy(retry_after=3))
+
+    response = client.post('/login', json={"email": valid_user_data['email'], "senha": "qualquer"})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == "3"
+
+
+def test_login_rehashes_outdated_hash(client, mocker):
+    user_id = ObjectId()
+    mock_collection = mocker.patch('app.routes.user_routes.User.collection')
+    mock_collection.return_value.find_one.return_value = {
+        "_id": user_id, "username": "testuser", "email": valid_user_data['email'],
+        "password_hash": "pbkdf2:sha256:1000$salt$hash", "role": "visualizador"
+    }
+    mocker.patch('app.routes.user_routes.verify_password', return_value=True)
+    mocker.patch('app.routes.user_routes.hash_password', return_value="scrypt:32768:8:1$novo$hash")
+    mocker.patch('app.routes.user_routes.create_access_token', return_value="fake_jwt_token")
+    mocker.patch('app.models.UserSession.collection')
+
+    response = client.post('/login', json={"email": valid_user_data['email'], "senha": valid_user_data['senha']})
+
+    assert response.status_code == 200
+    update = mock_collection.return_value.update_one.call_args[0][1]["$set"]
+    assert update["password_hash"] == "scrypt:32768:8:1$novo$hash"
+
+
+# ---------------------------
+# TESTES PARA GET /users
+# ---------------------------
+
+def _admin_headers(app, mocker, users_collection):
+    admin_id = ObjectId()
+    users_collection.find_one.return_value = {"_id": admin_id, "role": "administrador"}
+    with app.app_context():
+        token = create_access_token(identity=str(admin_id))
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_get_users_paginates_with_projection(client, app, mocker):
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    docs = [{"_id": ObjectId(), "username": f"user{i}", "email": f"u{i}@x.com", "role": "analista"} for i in range(3)]
+    mock_users.find.return_value.sort.return_value.limit.return_value = docs
+
+    response = client.get('/users?limit=2', headers=headers)
+
+    assert response.status_code == 200
+    rows = response.get_json()
+    assert [row["username"] for row in rows] == ["user0", "user1"]
+    assert response.headers.get('X-Next-Cursor')
+    query, projection = mock_users.find.call_args[0]
+    assert query == {}
+    assert "password_hash" not in projection and projection["username"] == 1
+    mock_users.find.return_value.sort.assert_called_once_with([("username", 1), ("_id", 1)])
+    mock_users.find.return_value.sort.return_value.limit.assert_called_once_with(3)
+
+
+def test_get_users_prefix_search_and_filters(client, app, mocker):
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    mock_users.find.return_value.sort.return_value.limit.return_value = []
+
+    response = client.get('/users?q=jo.o&role=analista&empresa=ACME', headers=headers)
+
+    assert response.status_code == 200
+    query = mock_users.find.call_args[0][0]
+    assert query["role"] == "analista"
+    assert query["empresa"] == "ACME"
+    assert {"username": {"$regex": r"^jo\.o"}} in query["$or"]
+    assert len(query["$or"]) == 3
+
+
+@pytest.mark.parametrize("query_string", ["role=superuser", "sort=password_hash", "fields=password_hash", "limit=0"])
+def test_get_users_invalid_parameters(client, app, mocker, query_string):
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    response = client.get(f'/users?{query_string}', headers=headers)
+    assert response.status_code == 400
+
+
+# ---------------------------
+# TESTES PARA PUT /users/<id>
+# ---------------------------
+
+def test_update_user_single_round_trip(client, app, mocker):
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    target_id = ObjectId()
+    mock_users.find_one_and_update.return_value = {
+        "_id": target_id, "username": "novo", "email": "a@x.com", "role": "analista", "version": 4
+    }
+
+    response = client.put(f'/users/{target_id}', json={"setor": "TI", "version": 3}, headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()["user"]["version"] == 4
+    query, update = mock_users.find_one_and_update.call_args[0]
+    assert query == {"_id": target_id, "version": 3}
+    assert update == {"$set": {"setor": "TI"}, "$inc": {"version": 1}}
+    # Só a busca do usuário autenticado (role_required); nada de reler o alvo
+    assert mock_users.find_one.call_count == 1
+
+
+@pytest.mark.parametrize("payload", [{"empresa": "Beta"}, {"nome_do_usuario": "novo"}])
+def test_update_user_claim_fields_revoke_tokens(client, app, mocker, payload):
+    """Empresa e nome vão nas claims: mudá-los invalida os tokens já emitidos."""
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    target_id = ObjectId()
+    mock_users.find_one_and_update.return_value = {"_id": target_id, "username": "novo", "token_version": 3}
+    mock_revoke = mocker.patch('app.token_versions.revoke_tokens')
+
+    response = client.put(f'/users/{target_id}', json=payload, headers=headers)
+
+    assert response.status_code == 200
+    update = mock_users.find_one_and_update.call_args[0][1]
+    assert update["$inc"] == {"token_version": 1, "version": 1}
+    mock_revoke.assert_called_once_with(target_id, 3)
+
+
+def test_update_user_version_conflict(client, app, mocker):
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    target_id = ObjectId()
+    mock_users.find_one_and_update.return_value = None
+    mock_users.find_one.side_effect = [{"_id": ObjectId(), "role": "administrador"}, {"_id": target_id, "version": 5}]
+
+    response = client.put(f'/users/{target_id}', json={"setor": "TI", "version": 3}, headers=headers)
+
+    assert response.status_code == 409
+    assert response.get_json()["version"] == 5
+
+
+def test_update_user_duplicate_email_from_unique_index(client, app, mocker):
+    from pymongo.errors import DuplicateKeyError
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    mocker.patch('app.routes.user_routes.validate_email_address', return_value="dup@x.com")
+    # A consulta prévia não vê o outro usuário (corrida): o índice único barra a escrita
+    mock_users.find_one.side_effect = [mock_users.find_one.return_value, None]
+    mock_users.find_one_and_update.side_effect = DuplicateKeyError("email_1")
+
+    response = client.put(f'/users/{ObjectId()}', json={"email": "dup@x.com"}, headers=headers)
+
+    assert response.status_code == 409
+    assert "Email já está em uso" in response.get_json()["msg"]
+
+
+def test_update_user_duplicate_email_precheck(client, app, mocker):
+    """Sem depender do índice único: e-mail de outro usuário é recusado antes da escrita."""
+    mock_users = mocker.patch('app.models.User.collection').return_value
+    headers = _admin_headers(app, mocker, mock_users)
+    mocker.patch('app.routes.user_routes.validate_email_address', return_value="dup@x.com")
+    target_id = ObjectId()
+    mock_users.find_one.side_effect = [mock_users.find_one.return_value, {"_id": ObjectId()}]
+
+    response = client.put(f'/users/{target_id}', json={"email": "dup@x.com"}, headers=headers)
+
+    assert response.status_code == 409
+    assert mock_users.find_one.call_args[0][0] == {"email": "dup@x.com", "_id": {"$ne": target_id}}
+    mock_users.find_one_and_update.assert_not_called()
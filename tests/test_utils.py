@@ -0,0 +1,119 @@
+# tests/test_utils.py
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+from bson.objectid import ObjectId
+from unittest.mock import MagicMock
+
+from app.utils import ROLES, role_required, load_principal, invalidate_principal
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'super-secret-test-key'
+    app.config['TESTING'] = True
+    JWTManager(app)
+
+    @app.route('/protegida')
+    @role_required([ROLES['1']])
+    def protegida():
+        # Segunda leitura na mesma requisição vem de flask.g
+        principal = load_principal(app.config["USER_ID"])
+        return jsonify({"role": principal["role"]})
+
+    return app
+
+
+@pytest.fixture
+def users(mocker):
+    collection = MagicMock()
+    mocker.patch('app.models.User.collection', return_value=collection)
+    return collection
+
+
+def _headers(app, user_id):
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+
+def test_role_required_caches_principal_between_requests(app, users):
+    user_id = ObjectId()
+    app.config['USER_ID'] = str(user_id)
+    users.find_one.return_value = {"_id": user_id, "role": ROLES['1'], "active": True}
+    client = app.test_client()
+
+    assert client.get('/protegida', headers=_headers(app, user_id)).status_code == 200
+    assert client.get('/protegida', headers=_headers(app, user_id)).status_code == 200
+
+    users.find_one.assert_called_once()
+
+
+def test_invalidate_principal_applies_deactivation_immediately(app, users):
+    user_id = ObjectId()
+    app.config['USER_ID'] = str(user_id)
+    users.find_one.return_value = {"_id": user_id, "role": ROLES['1'], "active": True}
+    client = app.test_client()
+    assert client.get('/protegida', headers=_headers(app, user_id)).status_code == 200
+
+    users.find_one.return_value = {"_id": user_id, "role": ROLES['1'], "active": False}
+    with app.app_context():
+        invalidate_principal(user_id)
+
+    response = client.get('/protegida', headers=_headers(app, user_id))
+    assert response.status_code == 403
+    assert response.get_json()["msg"] == "Usuário desativado"
+
+
+def _claims_headers(app, user_id, role=ROLES['1'], active=True, tv=0):
+    with app.app_context():
+        token = create_access_token(identity=str(user_id),
+                                    additional_claims={"role": role, "active": active, "tv": tv})
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def versions(mocker):
+    collection = MagicMock()
+    collection.find.return_value = []
+    mocker.patch('app.models.TokenVersion.collection', return_value=collection)
+    return collection
+
+
+def test_role_required_authorizes_from_claims_without_users_query(app, users, versions):
+    user_id = ObjectId()
+    app.config['USER_ID'] = str(user_id)
+    client = app.test_client()
+
+    assert client.get('/protegida', headers=_claims_headers(app, user_id)).status_code == 200
+    assert client.get('/protegida', headers=_claims_headers(app, user_id, role=ROLES['3'])).status_code == 403
+    assert client.get('/protegida', headers=_claims_headers(app, user_id, active=False)).status_code == 403
+
+    users.find_one.assert_not_called()
+    # As versões revogadas são lidas uma vez e reaproveitadas até o próximo refresh
+    versions.find.assert_called_once()
+
+
+def test_role_required_rejects_revoked_token_version(app, users, versions):
+    user_id = ObjectId()
+    app.config['USER_ID'] = str(user_id)
+    versions.find.return_value = [{"_id": str(user_id), "v": 2}]
+    client = app.test_client()
+
+    assert client.get('/protegida', headers=_claims_headers(app, user_id, tv=1)).status_code == 401
+    assert client.get('/protegida', headers=_claims_headers(app, user_id, tv=2)).status_code == 200
+
+
+def test_bump_token_version_revokes_immediately(app, users, versions):
+    from app.token_versions import bump_token_version, token_versions
+    user_id = ObjectId()
+    users.find_one_and_update.return_value = {"_id": user_id, "token_version": 3}
+
+    bump_token_version(user_id, {"role": ROLES['3']})
+
+    update = users.find_one_and_update.call_args[0][1]
+    assert update == {"$inc": {"token_version": 1, "version": 1}, "$set": {"role": ROLES['3']}}
+    versions.update_one.assert_called_once_with({"_id": str(user_id)}, {"$max": {"v": 3}}, upsert=True)
+    assert not token_versions.is_current(user_id, 2)
+    assert token_versions.is_current(user_id, 3)
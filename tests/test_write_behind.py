@@ -0,0 +1,60 @@
+# tests/test_write_behind.py
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from bson.objectid import ObjectId
+
+from app.write_behind import LastAccessBuffer
+
+
+@pytest.fixture
+def users(mocker):
+    collection = MagicMock()
+    mocker.patch('app.models.User.collection', return_value=collection)
+    return collection
+
+
+@pytest.fixture
+def buffer(mocker):
+    buffer = LastAccessBuffer(flush_interval=3600)
+    mocker.patch.object(buffer, '_ensure_thread')
+    return buffer
+
+
+def test_repeated_logins_are_coalesced(buffer, users):
+    user_a, user_b = ObjectId(), ObjectId()
+    t0 = datetime.now(timezone.utc)
+    buffer.record(user_a, t0)
+    buffer.record(user_a, t0 + timedelta(seconds=5))
+    buffer.record(user_a, t0 - timedelta(seconds=5))
+    buffer.record(user_b, t0)
+
+    assert buffer.flush() == 2
+
+    operations, = users.bulk_write.call_args[0]
+    assert users.bulk_write.call_args[1] == {"ordered": False}
+    by_user = {op._filter["_id"]: op._doc for op in operations}
+    assert by_user[user_a] == {"$max": {"last_access": t0 + timedelta(seconds=5)}}
+    assert len(buffer) == 0
+
+
+def test_failed_flush_keeps_pending_updates(buffer, users):
+    user_id = ObjectId()
+    users.bulk_write.side_effect = Exception("primário indisponível")
+    buffer.record(user_id, datetime.now(timezone.utc))
+
+    assert buffer.flush() == 0
+    assert len(buffer) == 1
+
+    users.bulk_write.side_effect = None
+    assert buffer.flush() == 1
+
+
+def test_full_buffer_wakes_writer(buffer, users):
+    buffer.max_pending = 2
+    buffer.record(ObjectId(), datetime.now(timezone.utc))
+    assert not buffer._wakeup.is_set()
+    buffer.record(ObjectId(), datetime.now(timezone.utc))
+    assert buffer._wakeup.is_set()